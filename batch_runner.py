@@ -0,0 +1,200 @@
+# batch_runner.py - Count a whole directory (or glob) of archived videos on a process pool
+
+import argparse
+import csv
+import glob
+import multiprocessing
+import os
+import sys
+import time
+from datetime import datetime
+import config as cfg
+
+# Columns of summary.csv
+SUMMARY_FIELDS = ['video', 'status', 'frames', 'seconds', 'fps', 'unique_sitting_count', 'time_to_first_frame',
+                  'events', 'error']
+
+# Pose model of this worker process, loaded once by init_worker and reused for every file
+_worker_model = None
+# Why the model could not be loaded (a failing pool initializer would be restarted forever)
+_worker_error = None
+
+
+def find_videos(pattern):
+    """Video files of a directory (VIDEO_EXTENSIONS, recursive) or of a glob pattern, sorted."""
+    if os.path.isdir(pattern):
+        paths = [os.path.join(root, name)
+                 for root, _, names in os.walk(pattern)
+                 for name in names
+                 if os.path.splitext(name)[1].lower() in cfg.VIDEO_EXTENSIONS]
+    else:
+        paths = [path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path)]
+    return sorted(paths)
+
+
+def events_paths_for(videos, events_dir):
+    """One event log per video, named after the file (numbered when two videos share a name)."""
+    seen = {}
+    paths = []
+    for video in videos:
+        stem = os.path.splitext(os.path.basename(video))[0]
+        seen[stem] = seen.get(stem, 0) + 1
+        name = stem if seen[stem] == 1 else f"{stem}_{seen[stem]}"
+        paths.append(os.path.join(events_dir, f"{name}.{cfg.EVENTS_FORMAT}"))
+    return paths
+
+
+def threads_per_worker(workers):
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+def init_worker(backend, threads):
+    """
+    Pool initializer: caps the decoder/framework thread pools at this worker's share of the
+    cores (so N workers don't oversubscribe the machine) and loads the pose model once.
+    """
+    global _worker_model, _worker_error
+    import cv2
+    from inference_backend import create_backend
+
+    cv2.setNumThreads(threads)
+    backend = backend or cfg.INFERENCE_BACKEND
+    if (cfg.CASCADE_BASE_BACKEND if backend == 'cascade' else backend) == 'torch':
+        # Only the PyTorch backend pays for importing torch
+        import torch
+        torch.set_num_threads(threads)
+    cfg.ONNX_INTRA_OP_THREADS = threads
+    cfg.FFMPEG_THREADS = threads
+
+    try:
+        _worker_model = create_backend(backend)
+    except Exception as exc:
+        _worker_error = f"Model could not be loaded: {type(exc).__name__}: {exc}"
+
+
+def worker_model():
+    """The pose model init_worker loaded in this process (RuntimeError if loading failed)."""
+    if _worker_error:
+        raise RuntimeError(_worker_error)
+    return _worker_model
+
+
+def _process_video(job):
+    """Counts one video in a worker. Never raises: failures are returned as a summary row."""
+    video, events_path, options = job
+    if _worker_error:
+        return dict(_summary_row(video, events_path), status='failed', events='', error=_worker_error)
+    return count_video(video, events_path, _worker_model, **options)
+
+
+def _summary_row(video, events_path):
+    return {'video': video, 'status': 'ok', 'frames': 0, 'seconds': 0.0, 'fps': 0.0,
+            'unique_sitting_count': '', 'time_to_first_frame': '', 'events': events_path, 'error': ''}
+
+
+def count_video(video, events_path, pose_model, **options):
+    """
+    Counts one video in --no-render mode with an already loaded pose model (also used by
+    worker.py); 'options' are passed on to analyze_video_for_sitting. Never raises:
+    failures are returned as a summary row (SUMMARY_FIELDS).
+    """
+    from main_pipeline import analyze_video_for_sitting
+
+    row = _summary_row(video, events_path)
+    try:
+        summary = analyze_video_for_sitting(render=False, events_path=events_path,
+                                            video_source=video, pose_model=pose_model, **options)
+        row.update(frames=summary.frames, seconds=round(summary.seconds, 2),
+                   fps=round(summary.frames / max(summary.seconds, 1e-9), 1),
+                   unique_sitting_count=summary.unique_count,
+                   time_to_first_frame=round(summary.time_to_first_frame, 3) if summary.time_to_first_frame is not None else '')
+        if summary.frames == 0:
+            row.update(status='failed', error="No frames could be decoded")
+    except SystemExit:
+        # analyze_video_for_sitting exits on missing or unreadable files
+        row.update(status='failed', error="Could not open video")
+    except Exception as exc:
+        row.update(status='failed', error=f"{type(exc).__name__}: {exc}")
+
+    if row['status'] != 'ok' and not os.path.exists(events_path):
+        row['events'] = ''
+    return row
+
+
+def camera_for(video):
+    """Camera name of a video in the event store: the name of the folder it is in."""
+    return os.path.basename(os.path.dirname(os.path.abspath(video))) or cfg.EVENT_STORE_CAMERA
+
+
+def run_batch(videos, output_dir, workers=None, backend=None, store_path=None, camera=None):
+    """
+    Counts every video on a pool of 'workers' processes (default cfg.BATCH_WORKERS) and
+    writes <output_dir>/summary.csv plus one event log per video. With store_path, every
+    video is also added to that event store, under 'camera' (default: camera_for(video)).
+    Returns the summary rows in input order.
+    """
+    workers = max(1, min(workers or cfg.BATCH_WORKERS, len(videos)))
+    events_dir = os.path.join(output_dir, 'events')
+    os.makedirs(events_dir, exist_ok=True)
+    options = [{'store_path': store_path, 'camera': camera or camera_for(video)} if store_path else {}
+               for video in videos]
+    jobs = list(zip(videos, events_paths_for(videos, events_dir), options))
+
+    # 'spawn' so no worker inherits the parent's framework or GPU state
+    context = multiprocessing.get_context('spawn')
+    rows = {}
+    with context.Pool(workers, initializer=init_worker, initargs=(backend, threads_per_worker(workers))) as pool:
+        for done, row in enumerate(pool.imap_unordered(_process_video, jobs), start=1):
+            rows[row['video']] = row
+            state = row['error'] or f"{row['unique_sitting_count']} unique sitting, {row['fps']} FPS"
+            print(f"[{done}/{len(jobs)}] {row['video']}: {state}")
+
+    ordered = [rows[video] for video in videos]
+    with open(os.path.join(output_dir, 'summary.csv'), 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS)
+        writer.writeheader()
+        writer.writerows(ordered)
+    return ordered
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count unique sitting people in many videos on a process pool.")
+    parser.add_argument("videos", help="Directory (searched recursively) or glob pattern, e.g. 'archive/2024-05-*/*.mkv'.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (defaults to BATCH_WORKERS).")
+    parser.add_argument("--output", default=None, help="Output directory (defaults to OUTPUT_DIR/batch_<timestamp>).")
+    parser.add_argument("--backend", choices=['torch', 'onnx', 'cascade'], default=None,
+                        help="Pose inference backend (defaults to INFERENCE_BACKEND).")
+    parser.add_argument("--store", nargs='?', const=cfg.EVENT_STORE_PATH, default=None,
+                        help="Also add every video to this SQLite event store (defaults to EVENT_STORE_PATH "
+                             "when given without a path).")
+    parser.add_argument("--camera", default=None,
+                        help="Camera name of the stored events (defaults to each video's folder name).")
+    args = parser.parse_args()
+
+    videos = find_videos(args.videos)
+    if not videos:
+        print(f"Error: No videos found for {args.videos}")
+        sys.exit(1)
+
+    output_dir = args.output or os.path.join(cfg.OUTPUT_DIR, datetime.now().strftime("batch_%Y%m%d_%H%M%S"))
+    start_time = time.perf_counter()
+    rows = run_batch(videos, output_dir, args.workers, args.backend, args.store, args.camera)
+    elapsed = time.perf_counter() - start_time
+
+    failed = [row for row in rows if row['status'] != 'ok']
+    total_frames = sum(row['frames'] for row in rows)
+    print(f"\n--- Batch Complete ---")
+    print(f"{len(rows) - len(failed)}/{len(rows)} videos, {total_frames} frames in {elapsed:.1f}s "
+          f"({total_frames / max(elapsed, 1e-9):.1f} FPS overall)")
+    print(f"{'video':<50} {'frames':>8} {'fps':>8} {'count':>6}")
+    for row in rows:
+        print(f"{row['video']:<50} {row['frames']:>8} {row['fps']:>8} {str(row['unique_sitting_count']):>6}"
+              + (f"  FAILED: {row['error']}" if row['error'] else ""))
+    print(f"Summary saved to: {os.path.join(output_dir, 'summary.csv')}")
+    if args.store:
+        print(f"Events stored in: {args.store}")
+    print("-------------------------\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,512 @@
+# benchmark.py - Benchmark suite on synthetic workloads (generated videos and keypoint streams with ground truth)
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from datetime import datetime
+import cv2
+import numpy as np
+import config as cfg
+import keypoint_cache
+import utils
+
+# Benchmark modes, in run order: the heuristic + tracking code alone on a synthetic keypoint
+# stream, the same split into chunks (chunked.py), the YOLO pipeline (main_pipeline.py) and the
+# MediaPipe counter (main.py) on the synthetic video
+MODES = ('counting', 'chunked', 'yolo', 'mediapipe')
+
+# Standing pose as (dx, dy) offsets from the mid-hip in body heights, COCO 17 order
+# (nose, eyes, ears, shoulders, elbows, wrists, hips, knees, ankles; left before right)
+STANDING_POSE = np.array([
+    [0.02, -0.47], [0.03, -0.49], [0.01, -0.49], [0.02, -0.48], [-0.02, -0.48],
+    [0.04, -0.30], [-0.04, -0.30], [0.05, -0.15], [-0.05, -0.15], [0.05, -0.02], [-0.05, -0.02],
+    [0.03, 0.0], [-0.03, 0.0], [0.03, 0.25], [-0.03, 0.25], [0.03, 0.5], [-0.03, 0.5],
+], dtype=np.float32)
+
+# Limbs drawn for the synthetic video (keypoint index pairs)
+LIMBS = [(5, 7), (7, 9), (6, 8), (8, 10), (11, 13), (13, 15), (12, 14), (14, 16), (5, 11), (6, 12)]
+
+LOWER_BODY = [cfg.LEFT_KNEE_IDX, cfg.RIGHT_KNEE_IDX, cfg.LEFT_ANKLE_IDX, cfg.RIGHT_ANKLE_IDX]
+
+# One generated person: where they sit (None for a passer-by), the frames of the visit and of the sit
+SyntheticPerson = namedtuple('SyntheticPerson', ['person_id', 'seat_x', 'enter', 'sit_start', 'sit_end', 'leave', 'height', 'ground_y', 'color'])
+
+
+# --- Synthetic Workload ---
+
+def synthetic_pose(hip_x, hip_y, height, sitting, facing=1, phase=0.0):
+    """
+    Normalized (17, 2) keypoints of a side-view person. Sitting bends both knees to 90
+    degrees (thighs horizontal); walking swings the straight legs with 'phase'.
+    """
+    offsets = STANDING_POSE.copy()
+    offsets[:, 0] *= facing
+    if sitting:
+        offsets[[cfg.LEFT_KNEE_IDX, cfg.RIGHT_KNEE_IDX]] = [[0.22 * facing, 0.01], [0.20 * facing, 0.0]]
+        offsets[[cfg.LEFT_ANKLE_IDX, cfg.RIGHT_ANKLE_IDX]] = [[0.22 * facing, 0.26], [0.20 * facing, 0.25]]
+    else:
+        swing = 0.06 * np.sin(phase)
+        offsets[[cfg.LEFT_KNEE_IDX, cfg.RIGHT_KNEE_IDX], 0] += [swing, -swing]
+        offsets[[cfg.LEFT_ANKLE_IDX, cfg.RIGHT_ANKLE_IDX], 0] += [2 * swing, -2 * swing]
+    return np.array([hip_x, hip_y], dtype=np.float32) + offsets * height
+
+
+def plan_people(num_people, num_frames, seed=0, sit_fraction=0.6):
+    """
+    Random visits: sitters walk in from one side to a seat inside the bench zone, sit and
+    walk out; passers-by cross the frame. A third of the sits are clearly too short to count
+    (0.3-0.7x FRAMES_TO_CONFIRM_SITTING), the others clearly long enough (1.5-4x), so the
+    ground truth does not hinge on a frame or two.
+    """
+    rng = np.random.default_rng(seed)
+    num_sitters = int(round(num_people * sit_fraction))
+    seats = np.linspace(cfg.BENCH_X_MIN + 0.04, cfg.BENCH_X_MAX - 0.04, max(num_sitters, 1))
+    walk_frames = 60
+    confirm = max(cfg.FRAMES_TO_CONFIRM_SITTING, 1)
+
+    people = []
+    for person_id in range(num_people):
+        height = rng.uniform(0.30, 0.36)
+        color = tuple(int(c) for c in rng.integers(40, 220, size=3))
+        if person_id < num_sitters:
+            sit_frames = int(rng.uniform(0.3, 0.7) * confirm if rng.random() < 1 / 3 else rng.uniform(1.5, 4.0) * confirm)
+            duration = min(2 * walk_frames + sit_frames, num_frames)
+            enter = int(rng.integers(0, max(num_frames - duration, 0) + 1))
+            sit_start = enter + walk_frames
+            sit_end = min(sit_start + sit_frames, num_frames)
+            # Feet on the ground below the bench, so the seated hips land inside the bench zone
+            ground_y = min(cfg.BENCH_Y_MAX - 0.02 + 0.25 * height, 0.98)
+            people.append(SyntheticPerson(person_id, float(seats[person_id]), enter, sit_start, sit_end,
+                                          min(sit_end + walk_frames, num_frames), height, ground_y, color))
+        else:
+            duration = min(2 * walk_frames, num_frames)
+            enter = int(rng.integers(0, max(num_frames - duration, 0) + 1))
+            people.append(SyntheticPerson(person_id, None, enter, None, None, enter + duration,
+                                          height, rng.uniform(0.90, 0.98), color))
+    return people
+
+
+def person_at(person, frame_idx, from_left):
+    """Normalized pose and sitting state of one person in one frame."""
+    seat_x = person.seat_x
+    progress = (frame_idx - person.enter) / max(person.leave - person.enter, 1)
+    if seat_x is None:
+        start_x, end_x = (-0.05, 1.05) if from_left else (1.05, -0.05)
+        hip_x = start_x + (end_x - start_x) * progress
+        facing = 1 if end_x > start_x else -1
+        sitting = False
+    elif frame_idx < person.sit_start:
+        start_x = -0.05 if from_left else 1.05
+        hip_x = start_x + (seat_x - start_x) * (frame_idx - person.enter) / max(person.sit_start - person.enter, 1)
+        facing = 1 if seat_x > start_x else -1
+        sitting = False
+    elif frame_idx < person.sit_end:
+        hip_x, facing, sitting = seat_x, 1, True
+    else:
+        end_x = 1.05 if from_left else -0.05
+        hip_x = seat_x + (end_x - seat_x) * (frame_idx - person.sit_end) / max(person.leave - person.sit_end, 1)
+        facing = 1 if end_x > seat_x else -1
+        sitting = False
+
+    hip_y = person.ground_y - (0.25 if sitting else 0.5) * person.height
+    pose = synthetic_pose(hip_x, hip_y, person.height, sitting, facing, phase=frame_idx * 0.3)
+    return pose, sitting
+
+
+def ground_truth_count(people):
+    """Sitters whose sit lasts at least FRAMES_TO_CONFIRM_SITTING frames (and are not masked)."""
+    return sum(1 for person in people
+               if person.seat_x is not None
+               and person.seat_x >= cfg.MONUMENT_MASK_X_MAX
+               and person.sit_end - person.sit_start >= cfg.FRAMES_TO_CONFIRM_SITTING)
+
+
+def generate_frames(people, num_frames, seed=0, occlusion_rate=0.0, noise=0.002):
+    """
+    Yields (visible people, normalized keypoints (N, 17, 2), keypoint visibility (N, 17)) per
+    frame. Occlusions start with probability occlusion_rate per person and frame and last
+    3-15 frames; half of them hide the person completely (a missed detection), the others
+    hide the legs (knee/ankle keypoints missing). Keypoints get Gaussian detector noise.
+    """
+    rng = np.random.default_rng(seed + 1)
+    sides = rng.integers(0, 2, size=len(people)).astype(bool)
+    occluded_until = np.full(len(people), -1)
+    occlusion_kind = np.zeros(len(people), dtype=bool)   # True = whole person hidden
+
+    for frame_idx in range(num_frames):
+        visible, kpts, vis = [], [], []
+        for i, person in enumerate(people):
+            if not person.enter <= frame_idx < person.leave:
+                continue
+            if occluded_until[i] < frame_idx and rng.random() < occlusion_rate:
+                occluded_until[i] = frame_idx + rng.integers(3, 16)
+                occlusion_kind[i] = rng.random() < 0.5
+            occluded = frame_idx <= occluded_until[i]
+            if occluded and occlusion_kind[i]:
+                continue
+
+            pose, _ = person_at(person, frame_idx, sides[i])
+            pose = pose + rng.normal(0.0, noise, pose.shape).astype(np.float32)
+            keypoint_visible = (pose[:, 0] > 0) & (pose[:, 0] < 1) & (pose[:, 1] > 0) & (pose[:, 1] < 1)
+            if occluded:
+                keypoint_visible[LOWER_BODY] = False
+            visible.append(person)
+            kpts.append(pose)
+            vis.append(keypoint_visible)
+
+        if kpts:
+            yield visible, np.stack(kpts), np.stack(vis)
+        else:
+            yield visible, np.zeros((0, 17, 2), dtype=np.float32), np.zeros((0, 17), dtype=bool)
+
+
+def to_detections(kpts, visible, width, height):
+    """utils.FrameDetections of synthetic keypoints; hidden keypoints are (0, 0) with conf 0, as the models report them."""
+    xyn = np.where(visible[..., None], kpts, 0.0).astype(np.float32)
+    xy = xyn * np.array([width, height], dtype=np.float32)
+    conf = np.where(visible, 0.9, 0.0).astype(np.float32)
+    boxes = np.full((len(kpts), 4), np.nan, dtype=np.float32)
+    for i, (person_xy, person_visible) in enumerate(zip(xy, visible)):
+        if person_visible.any():
+            points = person_xy[person_visible]
+            boxes[i] = [*(points.min(axis=0) - 10), *(points.max(axis=0) + 10)]
+    return utils.FrameDetections(xy, xyn, conf, boxes)
+
+
+def write_keypoint_stream(path, people, num_frames, width, height, fps, seed=0, occlusion_rate=0.0):
+    """Writes the synthetic detections as a keypoint cache (replayable like a real one)."""
+    writer = keypoint_cache.KeypointCacheWriter(path, meta={
+        'video_source': 'synthetic', 'model_name': 'synthetic', 'backend': 'synthetic',
+        'frame_width': width, 'frame_height': height, 'fps': fps, 'src_fps': fps, 'frame_stride': 1,
+        'ground_truth_count': ground_truth_count(people),
+    })
+    for _, kpts, visible in generate_frames(people, num_frames, seed, occlusion_rate):
+        writer.append(to_detections(kpts, visible, width, height))
+    writer.close()
+    return path
+
+
+def draw_person(image, pose_xy, visible, color, height_px):
+    """Filled body shapes (not just a skeleton) so pose models have something person-like to detect."""
+    thickness = max(int(height_px * 0.07), 2)
+    points = pose_xy.astype(np.int32)
+    for start, end in LIMBS:
+        if visible[start] and visible[end]:
+            cv2.line(image, tuple(points[start]), tuple(points[end]), color, thickness, cv2.LINE_AA)
+    if visible[[5, 6, 11, 12]].all():
+        cv2.fillConvexPoly(image, points[[5, 6, 12, 11]], color, cv2.LINE_AA)
+    cv2.circle(image, tuple(points[0]), max(int(height_px * 0.06), 2), (150, 180, 220), -1, cv2.LINE_AA)
+
+
+def write_video(path, people, num_frames, width, height, fps, seed=0, occlusion_rate=0.0):
+    """
+    Renders the same timelines as the keypoint stream into an mp4: a plain scene with the
+    bench, and the people as filled stick figures. Hidden legs are painted over by a box.
+    """
+    background = np.full((height, width, 3), 170, dtype=np.uint8)
+    cv2.rectangle(background, (0, int(0.85 * height)), (width, height), (120, 130, 120), -1)
+    bench = (int(cfg.BENCH_X_MIN * width), int(cfg.BENCH_Y_MAX * height) - 6,
+             int(cfg.BENCH_X_MAX * width), int(cfg.BENCH_Y_MAX * height) + 6)
+    cv2.rectangle(background, bench[:2], bench[2:], (40, 70, 110), -1)
+
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    frame = np.empty_like(background)
+    scale = np.array([width, height], dtype=np.float32)
+    for visible_people, kpts, visible in generate_frames(people, num_frames, seed, occlusion_rate, noise=0.0):
+        np.copyto(frame, background)
+        for person, pose, person_visible in zip(visible_people, kpts, visible):
+            pose_xy = pose * scale
+            draw_person(frame, pose_xy, np.ones(17, dtype=bool), person.color, person.height * height)
+            if not person_visible[LOWER_BODY].all():
+                x, y = pose_xy[[cfg.LEFT_HIP_IDX, cfg.RIGHT_HIP_IDX]].mean(axis=0).astype(int)
+                size = int(person.height * height * 0.6)
+                cv2.rectangle(frame, (x - size // 2, y + 5), (x + size // 2, y + size), (90, 90, 90), -1)
+        out.write(frame)
+    out.release()
+    return path
+
+
+# --- Benchmark Modes (each runs in a fresh process) ---
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB (None where the resource module is missing)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _bench_counting(workload):
+    """Heuristics + tracking + counting alone, replayed from the synthetic keypoint stream."""
+    import metrics
+    from counter import create_counter
+    from main_pipeline import FrameOutputs, run_replay
+
+    cache = keypoint_cache.open_cache(workload['keypoints'])
+    counter = create_counter()
+    profiler = metrics.enable()
+    start_time = time.perf_counter()
+    frames = run_replay(cache, counter, FrameOutputs())
+    return frames, time.perf_counter() - start_time, counter.count, profiler.summary()
+
+
+def _bench_chunked(workload):
+    """
+    chunked.py's chunk, stitch and merge logic on the synthetic keypoint stream, split into
+    each of BENCH_CHUNKS chunks. Fails when a merged count differs from the serial count;
+    the timing reported is the one of the largest split.
+    """
+    from chunked import run_chunked_replay
+    from counter import create_counter
+    from main_pipeline import FrameOutputs, run_replay
+
+    cache = keypoint_cache.open_cache(workload['keypoints'])
+    serial = create_counter()
+    run_replay(cache, serial, FrameOutputs())
+    for chunks in sorted(cfg.BENCH_CHUNKS):
+        start_time = time.perf_counter()
+        frames, count = run_chunked_replay(cache, chunks)
+        seconds = time.perf_counter() - start_time
+        if count != serial.count:
+            raise RuntimeError(f"merged count {count} of {chunks} chunks differs from the serial count {serial.count}")
+    return frames, seconds, count, {}
+
+
+def _bench_yolo(workload):
+    """main_pipeline.py in --no-render mode on the synthetic video (needs local weights, never downloads)."""
+    import metrics
+    from inference_backend import backend_model_name
+    from main_pipeline import analyze_video_for_sitting
+
+    backend = workload['backend'] or cfg.INFERENCE_BACKEND
+    # The cascade runs two models ('light+heavy')
+    for model_path in backend_model_name(backend).split('+'):
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"model file {model_path} not found (benchmarks never download weights)")
+
+    profiler = metrics.enable()
+    summary = analyze_video_for_sitting(render=False, events_path=os.devnull, pipelined=False,
+                                        video_source=workload['video'], backend=backend)
+    return summary.frames, summary.seconds, summary.unique_count, profiler.summary()
+
+
+def _bench_mediapipe(workload):
+    """main.py (MediaPipe Pose, bundled model) in --no-render mode on the synthetic video."""
+    import main as mediapipe_main
+
+    mediapipe_main.VIDEO_SOURCE = workload['video']
+    mediapipe_main.OUTPUT_DIR = workload['dir']
+    start_time = time.perf_counter()
+    count = mediapipe_main.analyze_video_for_sitting(render=False, events_path=os.devnull)
+    return workload['frames'], time.perf_counter() - start_time, count, {}
+
+
+_BENCH_FUNCTIONS = {'counting': _bench_counting, 'chunked': _bench_chunked, 'yolo': _bench_yolo,
+                    'mediapipe': _bench_mediapipe}
+
+
+def _run_mode(mode, workload):
+    """
+    Runs one mode 'repeats' times in a pool worker and keeps the fastest run (the least
+    disturbed by the rest of the machine). Never raises: failures and skips are returned as results.
+    """
+    try:
+        runs = [_BENCH_FUNCTIONS[mode](workload) for _ in range(workload['repeats'])]
+    except (ImportError, FileNotFoundError) as exc:
+        return {'status': 'skipped', 'reason': f"{type(exc).__name__}: {exc}"}
+    except Exception as exc:
+        return {'status': 'failed', 'reason': f"{type(exc).__name__}: {exc}"}
+
+    frames, seconds, count, stages = min(runs, key=lambda run: run[1])
+    ground_truth = workload['ground_truth_count']
+    return {
+        'status': 'ok',
+        'frames': frames,
+        'seconds': round(seconds, 4),
+        'runs_seconds': [round(run[1], 4) for run in runs],
+        'fps': round(frames / max(seconds, 1e-9), 2),
+        'stages': stages,
+        'peak_rss_mb': peak_rss_mb(),
+        'count': count,
+        'ground_truth_count': ground_truth,
+        'count_error': count - ground_truth,
+    }
+
+
+def environment():
+    """Machine and version details stored with every result file."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    from inference_backend import resolve_device
+    try:
+        device = resolve_device()
+    except ImportError:
+        device = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'device': device,
+    }
+
+
+def run_benchmarks(modes=MODES, num_people=None, num_frames=None, frame_size=None, fps=None,
+                   occlusion_rate=None, seed=None, backend=None, workload_dir=None, repeats=None):
+    """
+    Generates the synthetic workload (keypoint stream, plus a video for the video modes) and
+    runs every mode in its own 'spawn' process, so peak memory is per mode and no framework
+    state is shared. Returns the result document (see README).
+    """
+    num_people = cfg.BENCH_PEOPLE if num_people is None else num_people
+    num_frames = num_frames or cfg.BENCH_FRAMES
+    width, height = frame_size or cfg.BENCH_FRAME_SIZE
+    fps = fps or cfg.BENCH_FPS
+    occlusion_rate = cfg.BENCH_OCCLUSION_RATE if occlusion_rate is None else occlusion_rate
+    seed = cfg.BENCH_SEED if seed is None else seed
+    repeats = max(repeats or cfg.BENCH_REPEATS, 1)
+
+    with tempfile.TemporaryDirectory(prefix='sitting_bench_') as tmp_dir:
+        workload_dir = workload_dir or tmp_dir
+        os.makedirs(workload_dir, exist_ok=True)
+        people = plan_people(num_people, num_frames, seed)
+        workload = {
+            'dir': workload_dir,
+            'frames': num_frames,
+            'backend': backend,
+            'repeats': repeats,
+            'ground_truth_count': ground_truth_count(people),
+            'keypoints': write_keypoint_stream(os.path.join(workload_dir, 'keypoints'), people, num_frames,
+                                               width, height, fps, seed, occlusion_rate),
+            'video': None,
+        }
+        if any(mode != 'counting' for mode in modes):
+            workload['video'] = write_video(os.path.join(workload_dir, 'synthetic.mp4'), people, num_frames,
+                                            width, height, fps, seed, occlusion_rate)
+
+        context = multiprocessing.get_context('spawn')
+        results = {}
+        for mode in modes:
+            print(f"Benchmarking {mode}...")
+            with context.Pool(1) as pool:
+                results[mode] = pool.apply(_run_mode, (mode, workload))
+
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'environment': environment(),
+        'workload': {
+            'people': num_people, 'frames': num_frames, 'width': width, 'height': height, 'fps': fps,
+            'occlusion_rate': occlusion_rate, 'seed': seed,
+            'frames_to_confirm': cfg.FRAMES_TO_CONFIRM_SITTING,
+            'ground_truth_count': workload['ground_truth_count'],
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current, tolerance=None):
+    """
+    Prints FPS, peak memory and count error of every mode against a baseline result document.
+    Returns the modes whose FPS dropped by more than 'tolerance' (default BENCH_REGRESSION_TOLERANCE);
+    nothing is flagged when the two runs used different workloads.
+    """
+    tolerance = cfg.BENCH_REGRESSION_TOLERANCE if tolerance is None else tolerance
+    comparable = baseline.get('workload') == current.get('workload')
+    if not comparable:
+        print("Warning: the baseline was run on a different workload; regressions are not flagged.")
+
+    regressions = []
+    print(f"{'mode':<10} {'base fps':>9} {'fps':>9} {'change':>8} {'base MB':>8} {'MB':>8} {'base err':>8} {'err':>5}")
+    for mode, result in current['results'].items():
+        base = baseline.get('results', {}).get(mode, {})
+        if result.get('status') != 'ok' or base.get('status') != 'ok':
+            print(f"{mode:<10} {'-':>9} {'-':>9} {'-':>8}  ({base.get('status', 'missing')} -> {result.get('status')})")
+            continue
+        change = result['fps'] / max(base['fps'], 1e-9) - 1
+        flag = ''
+        if comparable and change < -tolerance:
+            regressions.append(mode)
+            flag = '  REGRESSION'
+        print(f"{mode:<10} {base['fps']:>9.1f} {result['fps']:>9.1f} {change:>+8.1%} {str(base['peak_rss_mb']):>8} "
+              f"{str(result['peak_rss_mb']):>8} {base['count_error']:>8} {result['count_error']:>5}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the counters on a synthetic workload with ground truth.")
+    parser.add_argument("--modes", nargs='+', choices=MODES, default=list(MODES), help="Modes to run (default: all).")
+    parser.add_argument("--people", type=int, default=None, help="People in the scene (defaults to BENCH_PEOPLE).")
+    parser.add_argument("--frames", type=int, default=None, help="Length of the workload (defaults to BENCH_FRAMES).")
+    parser.add_argument("--size", type=int, nargs=2, metavar=('WIDTH', 'HEIGHT'), default=None,
+                        help="Synthetic video size (defaults to BENCH_FRAME_SIZE).")
+    parser.add_argument("--occlusion", type=float, default=None,
+                        help="Occlusion start probability per person and frame (defaults to BENCH_OCCLUSION_RATE).")
+    parser.add_argument("--seed", type=int, default=None, help="Workload seed (defaults to BENCH_SEED).")
+    parser.add_argument("--repeats", type=int, default=None, help="Runs per mode, the fastest is kept (defaults to BENCH_REPEATS).")
+    parser.add_argument("--backend", choices=['torch', 'onnx', 'cascade'], default=None,
+                        help="Pose inference backend of the yolo mode (defaults to INFERENCE_BACKEND).")
+    parser.add_argument("--workload-dir", default=None,
+                        help="Keep the generated keypoint stream and video here (default: temporary).")
+    parser.add_argument("--output", default=None, help="Result JSON (defaults to BENCH_OUTPUT_DIR/bench_<timestamp>.json).")
+    parser.add_argument("--compare", default=None, help="Baseline result JSON to compare against (exit 1 on regression).")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        try:
+            with open(args.compare, encoding='utf-8') as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as exc:
+            print(f"Error: Could not read baseline {args.compare}: {exc}")
+            sys.exit(1)
+
+    document = run_benchmarks(args.modes, args.people, args.frames, args.size, None,
+                              args.occlusion, args.seed, args.backend, args.workload_dir, args.repeats)
+
+    output = args.output or os.path.join(cfg.BENCH_OUTPUT_DIR, datetime.now().strftime("bench_%Y%m%d_%H%M%S.json"))
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(document, f, indent=2)
+
+    print(f"\n--- Benchmark Complete ---")
+    print(f"Workload: {document['workload']['people']} people, {document['workload']['frames']} frames, "
+          f"ground truth {document['workload']['ground_truth_count']} unique sitting")
+    for mode, result in document['results'].items():
+        if result['status'] != 'ok':
+            print(f"  {mode}: {result['status'].upper()} ({result['reason']})")
+            continue
+        print(f"  {mode}: {result['fps']:.1f} FPS, peak {result['peak_rss_mb']} MB, "
+              f"count {result['count']} (error {result['count_error']:+d})")
+    print(f"Results saved to: {output}")
+    print("-------------------------\n")
+
+    chunked = document['results'].get('chunked', {})
+    if chunked.get('status') == 'failed':
+        print(f"Error: chunked mode failed: {chunked['reason']}")
+        sys.exit(1)
+
+    if baseline is not None:
+        regressions = compare(baseline, document)
+        if regressions:
+            print(f"Error: FPS regression in {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
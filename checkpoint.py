@@ -0,0 +1,93 @@
+# checkpoint.py - Periodic checkpoints of a long run (frame position, counter state, event log offset, event store state)
+
+import os
+import pickle
+import time
+from datetime import datetime
+import config as cfg
+from keypoint_cache import video_fingerprint
+
+# Bumped whenever the checkpoint contents change incompatibly
+CHECKPOINT_VERSION = 5
+
+
+def checkpoint_path_for(video_path, checkpoint_dir=None):
+    """Checkpoint file of a video: <checkpoint_dir>/<video name>_<video hash>.ckpt."""
+    stem = os.path.splitext(os.path.basename(video_path))[0]
+    return os.path.join(checkpoint_dir or cfg.CHECKPOINT_DIR, f"{stem}_{video_fingerprint(video_path)}.ckpt")
+
+
+def load_checkpoint(path):
+    """The checkpoint dict stored at path, or None if there is none (or it is from another version)."""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        state = pickle.load(f)
+    if state.get('version') != CHECKPOINT_VERSION:
+        return None
+    return state
+
+
+def remove_checkpoint(path):
+    """Deletes a checkpoint (and a half-written one left by a crash during a save)."""
+    for stale in (path, f"{path}.tmp"):
+        if os.path.exists(stale):
+            os.remove(stale)
+
+
+def settings_mismatch(state, settings):
+    """Names of the run settings that differ from the checkpointed run (resuming would change the count)."""
+    saved = state['settings']
+    return sorted(key for key in set(saved) | set(settings) if saved.get(key) != settings.get(key))
+
+
+class Checkpointer:
+    """
+    Writes a checkpoint at most every 'interval' seconds (default cfg.CHECKPOINT_INTERVAL_SECONDS)
+    in two steps, so the pipelined mode stays consistent even though counting runs ahead of
+    the output stage:
+
+    - capture(frame_idx, counter) is called by the counting stage right after counting a
+      frame, and pickles the counter (tracker included) when a checkpoint is due;
+    - written(frame_idx, sink, frames, store) is called once that frame's records are
+      written. It flushes the event log, commits the event store and atomically replaces the
+      checkpoint file with the captured state, the last counted frame, the event log offset
+      and the event store state to resume at.
+
+    'meta' (video source, run settings, output paths) is stored alongside.
+    """
+
+    def __init__(self, path, meta, interval=None):
+        self.path = path
+        self.meta = meta
+        self.interval = cfg.CHECKPOINT_INTERVAL_SECONDS if interval is None else interval
+        self._next_due = time.perf_counter() + self.interval
+        self._pending = {}
+        self.saved = 0
+
+    def capture(self, frame_idx, counter):
+        now = time.perf_counter()
+        if now < self._next_due:
+            return
+        self._next_due = now + self.interval
+        self._pending[frame_idx] = pickle.dumps(counter, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def written(self, frame_idx, sink, frames, store=None):
+        counter_state = self._pending.pop(frame_idx, None)
+        if counter_state is None:
+            return
+        state = dict(self.meta, version=CHECKPOINT_VERSION, frame_idx=frame_idx, frames=frames,
+                     counter=counter_state, events_offset=sink.checkpoint() if sink is not None else None,
+                     store_state=store.checkpoint() if store is not None else None,
+                     saved_at=datetime.now().isoformat(timespec='seconds'))
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self.saved += 1
@@ -0,0 +1,339 @@
+# chunked.py - Count one long video in parallel time chunks and stitch the tracks at the boundaries
+
+import argparse
+import multiprocessing
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from datetime import datetime
+import cv2
+import numpy as np
+import config as cfg
+import tracking
+from batch_runner import init_worker, threads_per_worker, worker_model
+from event_sink import open_event_sink
+
+# One time range of the video. Frames [warm_start, own_start) are only processed to warm up
+# the tracker and the sitting streaks; the chunk's results cover [own_start, own_end).
+Chunk = namedtuple('Chunk', ['index', 'warm_start', 'own_start', 'own_end'])
+
+# Per-frame output of a chunk worker: tracked people's local track IDs, newly counted flags
+# and (for frames in an overlap) their normalized keypoints, used to stitch neighbouring chunks
+ChunkFrame = namedtuple('ChunkFrame', ['frame_idx', 'track_ids', 'sitting', 'newly_counted', 'xyn'])
+
+# What a chunk worker returns: only the frames of its overlaps with the neighbouring chunks
+# (with keypoints, for stitching) are kept in memory; the records of all owned frames are
+# streamed to records_path, so the parent's memory does not grow with the video length
+ChunkResult = namedtuple('ChunkResult', ['chunk', 'overlap_frames', 'records_path'])
+
+# Max mean keypoint distance (normalized) for two chunks' detections of one frame to be the same person
+STITCH_MATCH_DISTANCE = 0.01
+
+
+def default_overlap():
+    """
+    Overlap long enough for a chunk's warm-up to end in the same state as a serial run:
+    a full confirmation window plus the tracker's track_buffer, plus one second of margin.
+    """
+    settings = tracking.load_tracker_settings(os.path.join(os.path.dirname(os.path.abspath(__file__)), cfg.TRACKER_CONFIG))
+    return cfg.FRAMES_TO_CONFIRM_SITTING + settings['track_buffer'] + 30
+
+
+def warmup_frames(overlap, stride=1):
+    """Overlap rounded up to whole strides."""
+    return int(np.ceil(overlap / stride)) * stride
+
+
+def plan_chunks(total_frames, num_chunks, overlap, stride=1):
+    """Splits [0, total_frames) into num_chunks ranges (starts aligned to the stride)."""
+    bounds = [int(round(total_frames * i / num_chunks / stride)) * stride for i in range(num_chunks + 1)]
+    bounds[-1] = None   # the last chunk reads to the real end (frame counts can be approximate)
+    chunks = []
+    for i in range(num_chunks):
+        own_start, own_end = bounds[i], bounds[i + 1]
+        if own_end is not None and own_end <= own_start:
+            continue
+        warm_start = max(0, own_start - warmup_frames(overlap, stride))
+        chunks.append(Chunk(len(chunks), warm_start, own_start, own_end))
+    return chunks
+
+
+def count_chunk(chunk, frames, counter, overlap, stride, records_path):
+    """
+    Counts one chunk (warm-up included) with its own SittingCounter. frames yields the
+    chunk's (frame_idx, detections) in order, from chunk.warm_start up to chunk.own_end.
+    The owned frames' records are pickled one after another into records_path.
+    Returns the ChunkResult.
+    """
+    from main_pipeline import count_people
+
+    # Keypoints are only kept where a neighbouring chunk overlaps this one
+    stitch_tail_start = chunk.own_end - warmup_frames(overlap, stride) if chunk.own_end is not None else None
+
+    overlap_frames = []
+    with open(records_path, 'wb') as records:
+        for frame_idx, detections in frames:
+            people, _, _ = count_people(counter, frame_idx, detections)
+            tracked = [i for i, person in enumerate(people) if person.track_id is not None]
+            owned = frame_idx >= chunk.own_start
+            in_tail = stitch_tail_start is not None and frame_idx >= stitch_tail_start
+            record = ChunkFrame(
+                frame_idx,
+                np.array([people[i].track_id for i in tracked], dtype=np.int64),
+                np.array([people[i].sitting for i in tracked], dtype=bool),
+                np.array([people[i].newly_counted for i in tracked], dtype=bool),
+                None
+            )
+            if owned:
+                pickle.dump(record, records, protocol=pickle.HIGHEST_PROTOCOL)
+            if not owned or in_tail:
+                overlap_frames.append(record._replace(xyn=detections.xyn[tracked]))
+
+    return ChunkResult(chunk, overlap_frames, records_path)
+
+
+def _decode_chunk(source, pose_model, chunk):
+    """(frame_idx, detections) of the chunk's frames, decoded and inferred in batches."""
+    from main_pipeline import run_pose_inference
+
+    batch = []
+    while True:
+        ret, frame = source.read()
+        if ret and (chunk.own_end is None or source.frame_index < chunk.own_end):
+            batch.append((source.frame_index, frame))
+        else:
+            ret = False
+
+        if batch and (not ret or len(batch) >= cfg.INFERENCE_BATCH_SIZE):
+            detections = run_pose_inference(pose_model, [frame for _, frame in batch])
+            for (frame_idx, _), frame_detections in zip(batch, detections):
+                yield frame_idx, frame_detections
+            batch = []
+
+        if not ret:
+            return
+
+
+def _process_chunk(job):
+    """Worker: decodes, infers and counts one chunk (count_chunk) from its own seeked VideoCapture."""
+    from counter import create_counter
+    from frame_source import OpenCVFrameSource
+
+    video, chunk, overlap, stride, records_dir = job
+    pose_model = worker_model()
+    counter = create_counter(frame_stride=stride)
+    source = OpenCVFrameSource(video, stride=stride, num_buffers=cfg.INFERENCE_BATCH_SIZE + 1, start_frame=chunk.warm_start)
+    if not source.isOpened():
+        raise RuntimeError(f"Could not open video source {video}")
+    pose_model.begin_stream(source.width, source.height)
+
+    records_path = os.path.join(records_dir, f"chunk_{chunk.index:04d}.pkl")
+    try:
+        return count_chunk(chunk, _decode_chunk(source, pose_model, chunk), counter, overlap, stride, records_path)
+    finally:
+        source.release()
+
+
+def _read_records(path):
+    """The owned frames' ChunkFrames a chunk worker streamed to path, in order."""
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+class _UnionFind:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, key):
+        self.parent.setdefault(key, key)
+        while self.parent[key] != key:
+            self.parent[key] = self.parent[self.parent[key]]
+            key = self.parent[key]
+        return key
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            # Keep the earlier chunk's identity as the root
+            if root_b < root_a:
+                root_a, root_b = root_b, root_a
+            self.parent[root_b] = root_a
+
+
+def stitch_chunks(results):
+    """
+    Links every track of a chunk that is seen in the overlap with the previous chunk to the
+    previous chunk's track of the same detections (most shared frames wins). Returns a
+    _UnionFind over (chunk index, local track ID).
+    """
+    identities = _UnionFind()
+    for previous, current in zip(results, results[1:]):
+        prev_chunk, chunk = previous.chunk, current.chunk
+        prev_by_frame = {f.frame_idx: f for f in previous.overlap_frames}
+        votes = {}
+        for f in current.overlap_frames:
+            if f.frame_idx >= chunk.own_start:
+                break
+            other = prev_by_frame.get(f.frame_idx)
+            if other is None or not len(f.track_ids) or not len(other.track_ids):
+                continue
+
+            # Same frame and model: the same person has (nearly) identical keypoints
+            distance = np.abs(f.xyn[:, None] - other.xyn[None, :]).mean(axis=(-1, -2))
+            rows, cols = tracking.solve_assignment(distance)
+            for row, col in zip(rows, cols):
+                if distance[row, col] <= STITCH_MATCH_DISTANCE:
+                    pair = (int(f.track_ids[row]), int(other.track_ids[col]))
+                    votes[pair] = votes.get(pair, 0) + 1
+
+        best = {}
+        for (track_id, prev_track_id), count in votes.items():
+            if count > best.get(track_id, (None, 0))[1]:
+                best[track_id] = (prev_track_id, count)
+        for track_id, (prev_track_id, _) in best.items():
+            identities.union((prev_chunk.index, prev_track_id), (chunk.index, track_id))
+    return identities
+
+
+def merge_chunks(results, sink=None):
+    """
+    Walks the owned frames of all chunks (ChunkResults) in order and counts each stitched
+    identity once, at its first owned 'newly counted' event. Writes the merged event log to
+    sink. Returns (frames, unique_count).
+    """
+    identities = stitch_chunks(results)
+    global_ids = {}
+    counted = set()
+    frame_count = 0
+
+    for result in results:
+        chunk = result.chunk
+        for f in _read_records(result.records_path):
+            frame_count += 1
+            tracks = []
+            for track_id, sitting, newly_counted in zip(f.track_ids, f.sitting, f.newly_counted):
+                root = identities.find((chunk.index, int(track_id)))
+                global_id = global_ids.setdefault(root, len(global_ids))
+                first = bool(newly_counted) and global_id not in counted
+                if first:
+                    counted.add(global_id)
+                tracks.append((global_id, bool(sitting), first))
+            if sink is not None:
+                sink.write_frame(f.frame_idx, tracks, len(counted))
+
+    return frame_count, len(counted)
+
+
+def run_chunked(video, workers=None, chunks=None, overlap=None, stride=None, events_path=None, backend=None):
+    """
+    Counts one video split into 'chunks' time ranges (default: one per worker) on a pool of
+    'workers' processes, each seeking its own VideoCapture. Every chunk first processes
+    'overlap' frames before its range (default default_overlap()) so its tracker and streaks
+    are warmed up, then tracks are stitched across the overlaps and counted once.
+    Stitching relies on each chunk's frame numbers being exact: CAP_PROP_POS_FRAMES seeks can
+    land a few frames off on some codecs (e.g. long-GOP or variable frame rate files), and
+    then neighbouring chunks no longer see the same detections on the same frame numbers.
+    Returns (frames, unique_count).
+    """
+    workers = workers or cfg.BATCH_WORKERS
+    chunks = chunks or workers
+    overlap = default_overlap() if overlap is None else overlap
+    stride = cfg.FRAME_STRIDE if stride is None else stride
+
+    cap = cv2.VideoCapture(video)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    if total_frames <= 0:
+        raise RuntimeError(f"Could not read the frame count of {video}")
+
+    plan = plan_chunks(total_frames, chunks, overlap, stride)
+    workers = min(workers, len(plan))
+    records_dir = tempfile.mkdtemp(prefix='chunked_')
+    sink = None
+    try:
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(workers, initializer=init_worker, initargs=(backend, threads_per_worker(workers))) as pool:
+            results = pool.map(_process_chunk, [(video, chunk, overlap, stride, records_dir) for chunk in plan])
+
+        sink = open_event_sink(events_path) if events_path else None
+        return merge_chunks(results, sink)
+    finally:
+        if sink is not None:
+            sink.close()
+        shutil.rmtree(records_dir, ignore_errors=True)
+
+
+def run_chunked_replay(cache, chunks, overlap=None):
+    """
+    Runs the chunk, stitch and merge logic of run_chunked over a keypoint cache instead of
+    the video, one chunk after another in this process. Its count must equal a serial
+    run_replay of the same cache (benchmark.py's 'chunked' mode checks this).
+    Returns (frames, unique_count).
+    """
+    from counter import create_counter
+
+    overlap = default_overlap() if overlap is None else overlap
+    stride = cache.meta.get('frame_stride', 1)
+    plan = plan_chunks(len(cache) * stride, chunks, overlap, stride)
+    records_dir = tempfile.mkdtemp(prefix='chunked_')
+    try:
+        results = []
+        for chunk in plan:
+            end = len(cache) if chunk.own_end is None else chunk.own_end // stride
+            frames = ((i * stride, cache.frame(i)) for i in range(chunk.warm_start // stride, end))
+            records_path = os.path.join(records_dir, f"chunk_{chunk.index:04d}.pkl")
+            results.append(count_chunk(chunk, frames, create_counter(frame_stride=stride), overlap, stride, records_path))
+        return merge_chunks(results)
+    finally:
+        shutil.rmtree(records_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count one long video in parallel chunks.")
+    parser.add_argument("video", nargs='?', default=None, help="Video file (defaults to VIDEO_SOURCE).")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (defaults to BATCH_WORKERS).")
+    parser.add_argument("--chunks", type=int, default=None, help="Number of time ranges (defaults to one per worker).")
+    parser.add_argument("--overlap", type=int, default=None,
+                        help="Warm-up frames before each chunk (defaults to FRAMES_TO_CONFIRM_SITTING + track_buffer + 30).")
+    parser.add_argument("--stride", type=int, default=None, help="Process every Nth frame (defaults to FRAME_STRIDE).")
+    parser.add_argument("--events", default=None, help="Path of the merged JSONL/CSV event log.")
+    parser.add_argument("--backend", choices=['torch', 'onnx', 'cascade'], default=None,
+                        help="Pose inference backend (defaults to INFERENCE_BACKEND).")
+    args = parser.parse_args()
+
+    video = args.video or cfg.VIDEO_SOURCE
+    if not os.path.exists(video):
+        print(f"Error: Video file not found at {video}.")
+        sys.exit(1)
+
+    events_path = args.events
+    if events_path is None:
+        os.makedirs(cfg.OUTPUT_DIR, exist_ok=True)
+        base_name = os.path.splitext(os.path.basename(video))[0]
+        events_path = os.path.join(cfg.OUTPUT_DIR, f"{base_name}{datetime.now().strftime('_%Y%m%d_%H%M%S')}_chunked_events.{cfg.EVENTS_FORMAT}")
+
+    start_time = time.perf_counter()
+    try:
+        frame_count, unique_count = run_chunked(video, args.workers, args.chunks, args.overlap, args.stride, events_path, args.backend)
+    except RuntimeError as exc:
+        print(f"Error: {exc}")
+        sys.exit(1)
+    elapsed = time.perf_counter() - start_time
+
+    print(f"\n--- Chunked Analysis Complete ---")
+    print(f"Events saved to: {events_path}")
+    print(f"Processed {frame_count} frames in {elapsed:.1f}s ({frame_count / max(elapsed, 1e-9):.1f} FPS)")
+    print(f"Total unique people seen sitting: {unique_count}")
+    print("-------------------------\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,24 @@
-import torch
-
 # --- PATHS AND VIDEO SETUP ---
 # Update these paths to match your local environment
 VIDEO_SOURCE = '/Users/emrecanaslan/Desktop/copa_data/copavideo1.mkv' 
 OUTPUT_DIR = 'results'
 OUTPUT_VIDEO_NAME = 'copavideo1_yolo11.1_sitting_count.mp4'
+# Format of the analytics event log written in --no-render mode: 'jsonl' or 'csv'
+EVENTS_FORMAT = 'jsonl'
+# Memory-mapped per-frame keypoint store (--cache-keypoints / --replay), keyed by video hash and model
+KEYPOINT_CACHE_DIR = 'cache/keypoints'
+
+# --- DECODING ---
+# Process only every Nth frame (the others are skipped without pixel conversion).
+# FRAMES_TO_CONFIRM_SITTING and the tracker timing are kept in source frames, so counts stay comparable.
+FRAME_STRIDE = 1
+# Width frames are downscaled to right after decoding (None = native resolution)
+DECODE_WIDTH = None
+# 'opencv' (cv2.VideoCapture) or 'ffmpeg' (raw frames from an ffmpeg subprocess pipe)
+DECODER_BACKEND = 'opencv'
+FFMPEG_BINARY = 'ffmpeg'
+# Decoder threads for the ffmpeg backend (0 = ffmpeg picks)
+FFMPEG_THREADS = 0
 
 # --- MODEL AND INFERENCE SETTINGS ---
 # UPDATED: Assuming 'yolo11m-pose.pt' is available (or use 'yolov8m-pose.pt' if 11 is not yet installed/available)
@@ -12,21 +26,54 @@ MODEL_NAME = 'yolov8m-pose.pt'
 
 CONF_THRESHOLD = 0.35
 IOU_THRESHOLD = 0.45
+# Number of consecutive frames sent to the pose model in a single call (1 = frame by frame).
+# Larger batches amortise per-call preprocessing and framework overhead; counting is unchanged.
+INFERENCE_BATCH_SIZE = 1
+
+# --- INFERENCE BACKEND (inference_backend.py) ---
+# 'torch' (Ultralytics/PyTorch), 'onnx' (ONNX Runtime; exported once and cached next to MODEL_NAME)
+# or 'cascade' (CASCADE_LIGHT_MODEL on every frame, MODEL_NAME on ambiguous people only)
+INFERENCE_BACKEND = 'torch'
+# Use the INT8 weight-quantized ONNX model (smaller, faster on CPU; check parity before enabling)
+ONNX_INT8 = False
+# Square input size of the exported model
+ONNX_IMGSZ = 640
+# Intra-op threads for ONNX Runtime (0 = one per physical core)
+ONNX_INTRA_OP_THREADS = 0
+# Execution providers in order of preference; add 'OpenVINOExecutionProvider' with onnxruntime-openvino
+ONNX_PROVIDERS = ['CPUExecutionProvider']
+# Max normalized keypoint distance between the ONNX and PyTorch outputs for the parity check to pass
+ONNX_PARITY_TOLERANCE = 0.01
+
+# --- MODEL CASCADE (INFERENCE_BACKEND = 'cascade') ---
+# Small pose model run on every frame; MODEL_NAME then only re-scores the ambiguous people
+CASCADE_LIGHT_MODEL = 'yolov8n-pose.pt'
+# Backend both cascade models run on: 'torch' or 'onnx'
+CASCADE_BASE_BACKEND = 'torch'
+# A person near the bench is ambiguous when a knee angle is within this many degrees of
+# MIN_KNEE_ANGLE_FOR_SITTING or MAX_KNEE_ANGLE_FOR_SITTING, or a hip, knee or ankle is missing
+CASCADE_ANGLE_MARGIN = 15
+# 'Near the bench': mid-hip inside the bench zone grown by this normalized margin on every side
+CASCADE_BENCH_MARGIN = 0.05
+# Padding around a person's box (fraction of the box size) in the crop sent to MODEL_NAME
+CASCADE_CROP_PADDING = 0.15
+# A re-scored result is reused for the same person (box IoU >= CASCADE_CACHE_IOU with it
+# on the previous inferred frame) for up to this many inferred frames before re-scoring
+CASCADE_CACHE_IOU = 0.5
+CASCADE_CACHE_FRAMES = 30
 
 # --- HARDWARE ACCELERATION ---
-if torch.backends.mps.is_available():
-    DEVICE = 'mps'
-    print(f"INFO: Using Apple Silicon GPU acceleration: {DEVICE}")
-elif torch.cuda.is_available():
-    DEVICE = 'cuda'
-    print(f"INFO: Using NVIDIA CUDA acceleration: {DEVICE}")
-else:
-    DEVICE = 'cpu'
-    print(f"INFO: GPU not available. Falling back to {DEVICE}.")
+# Torch device: 'mps', 'cuda', 'cpu', or None to detect the best one the first time a PyTorch
+# model is loaded (inference_backend.resolve_device). Importing this file never imports torch.
+DEVICE = None
 
 # --- COUNTING & FILTERING CONDITIONS (ANGLE-BASED) ---
 MONUMENT_MASK_X_MAX = 0.0 
 TRACKING_PROXIMITY_THRESHOLD = 0.1
+# ByteTrack-style settings (track_buffer, match_thresh) read by tracking.HipTracker
+TRACKER_CONFIG = 'tracker_config.yaml'
+# Share of the matching cost taken by hip distance; the rest is 1 - box IoU
+TRACKING_HIP_WEIGHT = 0.5
 # ANGLE-BASED HEURISTIC CONFIGURATION:
 # We check the angle at the knee (Hip-Knee-Ankle). 
 # Standing is ~180 degrees. Sitting is typically 90-120 degrees.
@@ -34,9 +81,13 @@ MIN_KNEE_ANGLE_FOR_SITTING = 75  # Minimum degrees for bent knee
 MAX_KNEE_ANGLE_FOR_SITTING = 125 # Maximum degrees for bent knee
 
 # --- TEMPORAL SMOOTHING ---
-# How many consecutive frames a person must be "sitting" before the count increments.
-# At 30 FPS, 30 frames = 1 second of continuous sitting.
+# How many source frames a person must be seen "sitting" in a row before the count increments
+# (with --stride N, ceil(30 / N) consecutive observations). At 30 FPS, 30 frames = 1 second.
 FRAMES_TO_CONFIRM_SITTING = 30 
+# Live mode only (live.py): most source frames one observation of a track adds to its sitting time
+# (15 = 0.5 s at 30 FPS). Dropped frames count as sitting up to this gap, so a stall cannot confirm
+# anyone at once; offline runs credit one stride per observation
+MAX_SITTING_GAP_FRAMES = 15
 
 # --- BENCH BOUNDARIES (Normalized 0.0 to 1.0) ---
 BENCH_X_MIN = 0.35   
@@ -44,6 +95,28 @@ BENCH_X_MAX = 0.65
 BENCH_Y_MIN = 0.40   
 BENCH_Y_MAX = 0.80   
 
+# --- POLYGON ZONES (zones.py) ---
+# YAML file of named include/exclude polygons (e.g. 'zones.yaml') that replaces the BENCH
+# rectangle above; sitting counts are then also reported per include zone. None = rectangle.
+ZONES_CONFIG = None
+# Resolution of the label raster the zones are compiled into (cells per frame side)
+ZONE_GRID_SIZE = 512
+
+# --- ROI CROPPING & MOTION GATING ---
+# Run inference only on a crop around the bench zone (keypoints are mapped back to the full frame)
+USE_ROI_CROP = False
+# Padding around the bench zone as (left, top, right, bottom) fractions of the frame.
+# The top padding is the largest because heads and shoulders sit well above the hips.
+ROI_PADDING = (0.10, 0.35, 0.10, 0.20)
+# Skip inference when the ROI has not changed since the last inferred frame
+USE_MOTION_GATE = False
+# Mean absolute grayscale difference (0-255) inside the ROI that counts as motion
+MOTION_THRESHOLD = 2.0
+# Width the ROI is downscaled to before differencing
+MOTION_DOWNSCALE_WIDTH = 160
+# Force an inference at least this often, even in a completely static scene
+MOTION_MAX_SKIPPED_FRAMES = 150
+
 # --- YOLO KEYPOINT INDICES (COCO 17) ---
 LEFT_HIP_IDX = 11
 RIGHT_HIP_IDX = 12
@@ -52,3 +125,118 @@ RIGHT_KNEE_IDX = 14
 # Added for angle calculation:
 LEFT_ANKLE_IDX = 15
 RIGHT_ANKLE_IDX = 16
+
+# --- PIPELINE EXECUTION ---
+# Run decode, inference, counting/render and encode on their own worker threads,
+# connected by bounded queues. Counting results are identical to the serial loop.
+USE_PIPELINED_STAGES = False
+# Maximum number of frames buffered between two stages (backpressure on faster stages)
+PIPELINE_QUEUE_SIZE = 8
+
+# --- RENDERING (renderer.py) ---
+# Annotate and encode only every Nth counted frame (the output video plays at FPS / N); counting is unchanged
+RENDER_EVERY_N = 1
+# Width of the annotated output video (None = the decoded frame size); frames are downscaled before drawing
+RENDER_WIDTH = None
+
+# --- EVENT CLIPS (event_clips.py) ---
+# --clips writes one short annotated clip per newly counted person instead of the full-length video:
+# from CLIP_PRE_ROLL_SECONDS before the event to CLIP_POST_ROLL_SECONDS after it (overlapping clips are merged)
+CLIP_PRE_ROLL_SECONDS = 3.0
+CLIP_POST_ROLL_SECONDS = 5.0
+# Width clips and their pre-roll buffer are stored at (None = decoded frame size)
+CLIP_WIDTH = 960
+
+# --- CHECKPOINTS (checkpoint.py) ---
+# Seconds between checkpoints of the frame position, counter state and event log (0 = off;
+# --checkpoint-interval turns them on per run). --resume continues an interrupted run from
+# its checkpoint; finished runs delete theirs.
+CHECKPOINT_INTERVAL_SECONDS = 0
+CHECKPOINT_DIR = 'checkpoints'
+
+# --- EVENT STORE (event_store.py) ---
+# SQLite database --store adds count events, tracks and per-minute occupancy rollups to,
+# indexed by camera, zone and time for queries across many videos (python event_store.py)
+EVENT_STORE_PATH = 'results/events.db'
+# Camera name of stored events when none is given (batch_runner.py uses the video's folder name)
+EVENT_STORE_CAMERA = 'default'
+# Rows buffered before they are inserted, in one transaction
+EVENT_STORE_BATCH_ROWS = 5000
+
+# --- PROFILING & METRICS (metrics.py) ---
+# Time every stage (decode, preprocess, inference, transfer, heuristics, tracking, render, encode)
+# and print a per-stage report at the end of the run (also enabled by --profile)
+PROFILE_STAGES = False
+# Upper bounds (seconds) of the stage latency histogram buckets
+METRICS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+# Most recent calls per stage kept for the rolling percentiles
+METRICS_WINDOW = 1000
+# Prometheus text export: file rewritten every METRICS_INTERVAL seconds (None = off) and
+# local http://localhost:METRICS_PORT/metrics endpoint (0 = off)
+METRICS_FILE = None
+METRICS_INTERVAL = 10.0
+METRICS_PORT = 0
+
+# --- MULTI-CAMERA SERVER (server.py) ---
+# Frames from all streams are gathered into one model call of up to SERVER_MAX_BATCH_SIZE frames,
+# waiting at most SERVER_MAX_WAIT_MS for a batch to fill
+SERVER_MAX_BATCH_SIZE = 16
+SERVER_MAX_WAIT_MS = 20
+# Decoded frames waiting for inference across all streams (readers block beyond this)
+SERVER_QUEUE_SIZE = 64
+# Port of the per-stream JSON status endpoint (0 = disabled)
+SERVER_PORT = 8080
+
+# --- LIVE MODE (live.py) ---
+# End-to-end latency budget: a frame older than this when the model is ready for it is dropped
+LIVE_MAX_LATENCY_MS = 500
+# Live frames are numbered by capture time, in frames of the source FPS (this rate when the
+# camera does not report one), so the tracker and FRAMES_TO_CONFIRM_SITTING measure real time
+LIVE_FALLBACK_FPS = 25
+# Seconds between live status lines (processed FPS, dropped frames, lag)
+LIVE_STATUS_INTERVAL = 5.0
+
+# --- BATCH RUNNER (batch_runner.py) ---
+# Worker processes; each loads the model once and gets cpu_count // BATCH_WORKERS threads
+BATCH_WORKERS = 2
+# Files picked up when a directory is given
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.avi', '.mov')
+
+# --- WARM WORKER (worker.py) ---
+# Frame size of the blank batch the model is warmed up on at startup (jobs of other sizes warm up once more)
+WORKER_WARMUP_FRAME_SIZE = (1280, 720)
+# Unix socket path or localhost TCP port the worker takes jobs on (None = read jobs from stdin)
+WORKER_SOCKET = None
+WORKER_PORT = None
+
+# --- BENCHMARKS (benchmark.py) ---
+# Synthetic workload: people in the scene (60% sit down, the others walk past), length and video format
+BENCH_PEOPLE = 8
+BENCH_FRAMES = 900
+BENCH_FPS = 30
+BENCH_FRAME_SIZE = (1280, 720)
+# Chance per person and frame that an occlusion starts (person or legs hidden for 3-15 frames)
+BENCH_OCCLUSION_RATE = 0.01
+BENCH_SEED = 0
+# Chunk counts the 'chunked' mode splits the keypoint stream into (each must count like a serial run)
+BENCH_CHUNKS = (2, 4, 8)
+# Runs per mode; the fastest one is reported (less noise from the rest of the machine)
+BENCH_REPEATS = 3
+# Where result JSON files are written
+BENCH_OUTPUT_DIR = 'benchmarks'
+# --compare flags a mode whose FPS dropped by more than this fraction
+BENCH_REGRESSION_TOLERANCE = 0.10
+
+# --- PARAMETER SWEEP (sweep.py) ---
+# Candidate values scored over the keypoint cache; every combination is evaluated.
+SWEEP_GRID = {
+    'min_knee_angle': [65, 70, 75, 80, 85],
+    'max_knee_angle': [115, 120, 125, 130, 140],
+    'bench_x_min': [0.30, 0.35, 0.40],
+    'bench_x_max': [0.60, 0.65, 0.70],
+    'bench_y_min': [0.35, 0.40, 0.45],
+    'bench_y_max': [0.75, 0.80, 0.85],
+    'mask_x_max': [0.0],
+    'tracking_proximity': [0.05, 0.1, 0.15],
+    'frames_to_confirm': [1, 15, 30, 60],
+}
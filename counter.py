@@ -0,0 +1,126 @@
+# counter.py - Per-stream unique sitting counter (tracking, temporal confirmation, unique counting)
+
+from collections import namedtuple
+import numpy as np
+
+# Result of SittingCounter.update, one entry per person passed in (input order):
+# track ID, sitting state, consecutive sitting observations, source frames of sitting credited
+# towards confirmation, counted (now or before), newly counted
+TrackEvents = namedtuple('TrackEvents', ['track_ids', 'sitting', 'streaks', 'sitting_frames', 'counted', 'newly_counted'])
+
+
+def confirm_observations(frames_to_confirm, frame_stride=1):
+    """
+    Consecutive sitting observations needed to cover 'frames_to_confirm' source frames
+    when only every 'frame_stride'-th frame is processed.
+    """
+    return max(1, -(-int(frames_to_confirm) // max(int(frame_stride), 1)))
+
+
+def create_counter(frame_stride=1, proximity=None, frames_to_confirm=None, max_gap=None):
+    """
+    SittingCounter configured from config.py (FRAMES_TO_CONFIRM_SITTING and the tracker
+    settings). config.py is only imported here so main.py can use the counter without the
+    YOLO configuration. max_gap is only given for live streams (live.py).
+    """
+    import config as cfg
+    import tracking
+
+    return SittingCounter(
+        tracking.create_tracker(proximity),
+        frames_to_confirm=cfg.FRAMES_TO_CONFIRM_SITTING if frames_to_confirm is None else frames_to_confirm,
+        frame_stride=frame_stride,
+        max_gap=max_gap
+    )
+
+
+class SittingCounter:
+    """
+    Counting state of one video stream: a tracker, the consecutive sitting observations of
+    every live track and the unique count. Instances share nothing, so one process can
+    count any number of streams side by side (e.g. with a single loaded pose model).
+
+    A track is counted once it has been seen sitting for 'frames_to_confirm' source frames:
+    the first observation of a track covers 'frame_stride' frames, and every later sitting
+    observation adds the frames elapsed since that track's own previous observation, at most
+    'max_gap' (default frame_stride; never less than it). With the default that is
+    ceil(frames_to_confirm / frame_stride) consecutive observations, however long a track is
+    missed in between. live.py, where frames are dropped irregularly and frame_idx is derived
+    from capture timestamps, raises max_gap so short gaps are credited in full, while a stall
+    or a track missed for a while cannot confirm anyone on its own. Per-track state lives in flat arrays sorted by track ID and is dropped when the
+    tracker evicts the track, so memory depends on the people in view, not on the length of
+    the stream.
+
+    When update() gets the zone of each person, 'zone_counts' (zone ID -> count) also
+    attributes every counted track to the zone it was sitting in when it was confirmed.
+    """
+
+    __slots__ = ('tracker', 'frame_stride', 'frames_to_confirm', 'observations_to_confirm', 'count', 'zone_counts',
+                 'max_gap', '_track_ids', '_streaks', '_sitting_frames', '_last_seen', '_counted')
+
+    def __init__(self, tracker, frames_to_confirm=1, frame_stride=1, max_gap=None):
+        self.tracker = tracker
+        self.frame_stride = max(int(frame_stride), 1)
+        self.frames_to_confirm = int(frames_to_confirm)
+        self.observations_to_confirm = confirm_observations(frames_to_confirm, self.frame_stride)
+        self.max_gap = max(int(max_gap or 0), self.frame_stride)
+        self.count = 0
+        self.zone_counts = {}
+
+        self._track_ids = np.empty(0, dtype=np.int64)
+        self._streaks = np.empty(0, dtype=np.int32)
+        self._sitting_frames = np.empty(0, dtype=np.int64)
+        self._last_seen = np.empty(0, dtype=np.int64)
+        self._counted = np.empty(0, dtype=bool)
+
+    def update(self, frame_idx, hips, boxes, sitting, zone_ids=None):
+        """
+        Tracks and counts the (unmasked) people of one frame.
+
+        frame_idx: source frame number, increasing (gaps allowed)
+        hips:      (N, 2) normalized mid-hip positions (NaN rows when both hips are missing)
+        boxes:     (N, 4) xyxy boxes (NaN rows when missing), or None
+        sitting:   (N,) result of the sitting heuristic
+        zone_ids:  (N,) zone of each person (BatchClassification.zone_ids), or None
+
+        Returns TrackEvents for the N people.
+        """
+        sitting = np.asarray(sitting, dtype=bool).reshape(-1)
+        track_ids, evicted_ids = self.tracker.update(frame_idx, hips, boxes)
+
+        if evicted_ids:
+            keep = ~np.isin(self._track_ids, evicted_ids)
+            self._track_ids = self._track_ids[keep]
+            self._streaks = self._streaks[keep]
+            self._sitting_frames = self._sitting_frames[keep]
+            self._last_seen = self._last_seen[keep]
+            self._counted = self._counted[keep]
+
+        # New tracks get the next (always larger) IDs, so appending keeps the arrays sorted
+        new_ids = np.setdiff1d(track_ids, self._track_ids)
+        if len(new_ids):
+            self._track_ids = np.concatenate([self._track_ids, new_ids])
+            self._streaks = np.concatenate([self._streaks, np.zeros(len(new_ids), dtype=np.int32)])
+            self._sitting_frames = np.concatenate([self._sitting_frames, np.zeros(len(new_ids), dtype=np.int64)])
+            # A new track's first observation covers one stride
+            self._last_seen = np.concatenate([self._last_seen, np.full(len(new_ids), frame_idx - self.frame_stride, dtype=np.int64)])
+            self._counted = np.concatenate([self._counted, np.zeros(len(new_ids), dtype=bool)])
+
+        rows = np.searchsorted(self._track_ids, track_ids)
+        streaks = np.where(sitting, self._streaks[rows] + 1, 0).astype(np.int32)
+        self._streaks[rows] = streaks
+
+        # Source frames covered by this observation of each track
+        step = np.clip(frame_idx - self._last_seen[rows], 1, self.max_gap)
+        self._last_seen[rows] = frame_idx
+        sitting_frames = np.where(sitting, self._sitting_frames[rows] + step, 0)
+        self._sitting_frames[rows] = sitting_frames
+
+        newly_counted = sitting & ~self._counted[rows] & (sitting_frames >= self.frames_to_confirm)
+        self._counted[rows] |= newly_counted
+        self.count += int(newly_counted.sum())
+        if zone_ids is not None and newly_counted.any():
+            for zone_id in np.asarray(zone_ids).reshape(-1)[newly_counted]:
+                self.zone_counts[int(zone_id)] = self.zone_counts.get(int(zone_id), 0) + 1
+
+        return TrackEvents(track_ids, sitting, streaks, sitting_frames, self._counted[rows], newly_counted)
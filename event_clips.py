@@ -0,0 +1,134 @@
+# event_clips.py - Short annotated clips around each newly counted person, plus an index of them
+
+import csv
+import os
+from collections import deque
+import cv2
+import numpy as np
+import config as cfg
+import metrics
+from renderer import FrameRenderer
+
+# Columns of the clip index: one row per newly counted person
+INDEX_FIELDS = ['clip', 'track_id', 'frame', 'timestamp', 'time']
+
+INDEX_NAME = 'index.csv'
+
+
+def format_time(seconds):
+    """H:MM:SS.mmm video position."""
+    minutes, seconds = divmod(seconds, 60.0)
+    hours, minutes = divmod(int(minutes), 60)
+    return f"{hours}:{minutes:02d}:{seconds:06.3f}"
+
+
+class _Clip:
+    __slots__ = ('number', 'path', 'writer', 'end_frame')
+
+    def __init__(self, number, path, writer, end_frame):
+        self.number = number
+        self.path = path
+        self.writer = writer
+        self.end_frame = end_frame
+
+
+class ClipRecorder:
+    """
+    Instead of a full-length annotated video, writes one short clip per 'NEW COUNTED' event:
+    'pre_roll' seconds before it to 'post_roll' seconds after it (defaults
+    cfg.CLIP_PRE_ROLL_SECONDS / cfg.CLIP_POST_ROLL_SECONDS). Events whose clips would overlap
+    or touch end up in one clip. <output_dir>/index.csv lists every event with its clip,
+    track ID, source frame and video time.
+
+    Every counted frame is copied (downscaled to 'width', default cfg.CLIP_WIDTH) into a
+    preallocated ring buffer long enough for the pre-roll, along with what is needed to
+    annotate it. Frames are only annotated and encoded once they become part of a clip.
+    add() is called by the counting stage with frames in order; frame numbers are in source
+    frames, 'stride' apart, and 'fps' is the source frame rate (clips play at fps / stride).
+    """
+
+    def __init__(self, output_dir, fps, frame_width, frame_height, stride=1, pre_roll=None, post_roll=None, width=None):
+        pre_roll = cfg.CLIP_PRE_ROLL_SECONDS if pre_roll is None else pre_roll
+        post_roll = cfg.CLIP_POST_ROLL_SECONDS if post_roll is None else post_roll
+        self.output_dir = output_dir
+        self.fps = fps
+        self.stride = stride
+        self.pre_frames = int(round(pre_roll * fps))
+        self.post_frames = int(round(post_roll * fps))
+        self.renderer = FrameRenderer(frame_width, frame_height, every=1,
+                                      preview_width=cfg.CLIP_WIDTH if width is None else width)
+
+        # Ring buffer of (frame_idx, slot, render arguments); one slot per processed frame of pre-roll
+        capacity = self.pre_frames // stride + 1
+        self._slots = [np.empty((self.renderer.height, self.renderer.width, 3), dtype=np.uint8) for _ in range(capacity)]
+        self._recent = deque(maxlen=capacity)
+        self._next_slot = 0
+        self._last_written = -1
+        self._clip = None
+
+        os.makedirs(output_dir, exist_ok=True)
+        self.index_path = os.path.join(output_dir, INDEX_NAME)
+        self._index_file = open(self.index_path, 'w', encoding='utf-8', newline='')
+        self._index = csv.DictWriter(self._index_file, fieldnames=INDEX_FIELDS)
+        self._index.writeheader()
+        self.clips = 0
+        self.events = 0
+        self.frames_written = 0
+
+    def add(self, frame_idx, frame, people, current_feedback, current_feedback_color, current_count):
+        slot = self._slots[self._next_slot]
+        self._next_slot = (self._next_slot + 1) % len(self._slots)
+        self.renderer.fit(frame, slot)
+        self._recent.append((frame_idx, slot, (people, current_feedback, current_feedback_color, current_count)))
+
+        events = [person for person in people if person.newly_counted]
+        if events:
+            if self._clip is None:
+                self._open_clip()
+            self._clip.end_frame = frame_idx + self.post_frames
+            for person in events:
+                seconds = frame_idx / self.fps
+                self._index.writerow({'clip': os.path.basename(self._clip.path), 'track_id': person.track_id,
+                                      'frame': frame_idx, 'timestamp': round(seconds, 3), 'time': format_time(seconds)})
+                self.events += 1
+            self._index_file.flush()
+
+        if self._clip is not None:
+            if frame_idx <= self._clip.end_frame:
+                self._flush(frame_idx)
+            elif frame_idx > self._clip.end_frame + self.pre_frames:
+                # Past the post-roll by more than a pre-roll: a later event cannot join this clip.
+                # Until then frames stay in the ring, and an event in that gap continues the clip.
+                self._close_clip()
+
+    def _open_clip(self):
+        self.clips += 1
+        path = os.path.join(self.output_dir, f"clip_{self.clips:04d}.mp4")
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), self.fps / self.stride,
+                                 (self.renderer.width, self.renderer.height))
+        self._clip = _Clip(self.clips, path, writer, None)
+        metrics.count('clips')
+
+    def _flush(self, up_to):
+        """
+        Annotates and encodes the buffered frames not written yet, up to frame up_to. The ring
+        never holds more than the pre-roll, so a new clip starts at most pre_roll before its event.
+        """
+        for frame_idx, slot, (people, feedback, feedback_color, count) in self._recent:
+            if frame_idx <= self._last_written or frame_idx > up_to:
+                continue
+            with metrics.stage('render'):
+                self.renderer.draw(slot, people, feedback, feedback_color, count)
+            with metrics.stage('encode'):
+                self._clip.writer.write(slot)
+            self._last_written = frame_idx
+            self.frames_written += 1
+
+    def _close_clip(self):
+        self._clip.writer.release()
+        self._clip = None
+
+    def close(self):
+        if self._clip is not None:
+            self._close_clip()
+        self._index_file.close()
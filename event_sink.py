@@ -0,0 +1,91 @@
+import csv
+import json
+import os
+
+# Column order used by the CSV sink (JSONL records only carry the fields relevant to their type)
+CSV_FIELDS = ['type', 'frame', 'track_id', 'sitting', 'newly_counted', 'detections', 'count', 'timestamp']
+
+
+def open_event_sink(path, resume_offset=None):
+    """
+    Opens a JSONL or CSV event sink based on the file extension (defaults to JSONL).
+    With resume_offset (a checkpoint() value), the existing log is cut back to that offset
+    and appended to.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    if os.path.splitext(path)[1].lower() == '.csv':
+        return CsvEventSink(path, resume_offset)
+    return JsonlEventSink(path, resume_offset)
+
+
+def _open_log(path, resume_offset, newline=None):
+    if resume_offset is None:
+        return open(path, 'w', encoding='utf-8', newline=newline)
+    f = open(path, 'r+', encoding='utf-8', newline=newline)
+    f.seek(resume_offset)
+    f.truncate()
+    return f
+
+
+class JsonlEventSink:
+    """
+    Streams compact analytics records, one JSON object per line:
+      {"type": "frame", "frame": 12, "detections": 3, "count": 5}
+      {"type": "track", "frame": 12, "track_id": 4, "sitting": true, "newly_counted": false}
+    Live runs add the capture time (seconds since start) to the frame record as "timestamp".
+    """
+
+    def __init__(self, path, resume_offset=None):
+        self.path = path
+        self._file = _open_log(path, resume_offset)
+
+    def write_record(self, record):
+        self._file.write(json.dumps(record, separators=(',', ':')))
+        self._file.write('\n')
+
+    def write_frame(self, frame_idx, tracks, current_count, timestamp=None):
+        """
+        Writes one 'frame' record plus one 'track' record per tracked person.
+        tracks is a list of (track_id, sitting, newly_counted) tuples.
+        """
+        record = {'type': 'frame', 'frame': frame_idx, 'detections': len(tracks), 'count': current_count}
+        if timestamp is not None:
+            record['timestamp'] = round(timestamp, 3)
+        self.write_record(record)
+        for track_id, sitting, newly_counted in tracks:
+            self.write_record({
+                'type': 'track', 'frame': frame_idx, 'track_id': track_id,
+                'sitting': sitting, 'newly_counted': newly_counted
+            })
+
+    def checkpoint(self):
+        """Flushes everything written so far to disk and returns the offset to resume at."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return self._file.tell()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CsvEventSink(JsonlEventSink):
+    """Same records as JsonlEventSink, written as CSV rows with the CSV_FIELDS columns."""
+
+    def __init__(self, path, resume_offset=None):
+        self.path = path
+        self._file = _open_log(path, resume_offset, newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=CSV_FIELDS, restval='')
+        if resume_offset is None:
+            self._writer.writeheader()
+
+    def write_record(self, record):
+        self._writer.writerow(record)
@@ -0,0 +1,398 @@
+# event_store.py - Indexed SQLite store of count events, tracks and per-minute occupancy rollups, plus a query CLI
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+import config as cfg
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    id INTEGER PRIMARY KEY,
+    camera TEXT NOT NULL,
+    source TEXT NOT NULL,
+    recorded_at REAL NOT NULL,
+    fps REAL NOT NULL,
+    processed_at TEXT NOT NULL,
+    frames INTEGER,
+    unique_count INTEGER
+);
+CREATE INDEX IF NOT EXISTS videos_camera_recorded_at ON videos (camera, recorded_at);
+CREATE INDEX IF NOT EXISTS videos_camera_source ON videos (camera, source);
+
+CREATE TABLE IF NOT EXISTS count_events (
+    video_id INTEGER NOT NULL REFERENCES videos (id),
+    camera TEXT NOT NULL,
+    zone TEXT NOT NULL,
+    ts REAL NOT NULL,
+    frame INTEGER NOT NULL,
+    track_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS count_events_camera_zone_ts ON count_events (camera, zone, ts);
+CREATE INDEX IF NOT EXISTS count_events_ts ON count_events (ts, camera, zone);
+CREATE INDEX IF NOT EXISTS count_events_video ON count_events (video_id, frame);
+
+CREATE TABLE IF NOT EXISTS tracks (
+    video_id INTEGER NOT NULL REFERENCES videos (id),
+    camera TEXT NOT NULL,
+    track_id INTEGER NOT NULL,
+    zone TEXT,
+    first_ts REAL NOT NULL,
+    last_ts REAL NOT NULL,
+    sitting_seconds REAL NOT NULL,
+    counted_ts REAL,
+    PRIMARY KEY (video_id, track_id)
+);
+CREATE INDEX IF NOT EXISTS tracks_camera_first_ts ON tracks (camera, first_ts);
+
+CREATE TABLE IF NOT EXISTS occupancy_minutes (
+    camera TEXT NOT NULL,
+    zone TEXT NOT NULL,
+    minute INTEGER NOT NULL,
+    video_id INTEGER NOT NULL REFERENCES videos (id),
+    frames INTEGER NOT NULL,
+    sitting INTEGER NOT NULL,
+    max_sitting INTEGER NOT NULL,
+    counted INTEGER NOT NULL,
+    PRIMARY KEY (minute, camera, zone, video_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS occupancy_minutes_camera_zone_minute ON occupancy_minutes (camera, zone, minute);
+"""
+
+# Time buckets of the queries, as SQLite strftime formats (local time)
+BUCKETS = {
+    'minute': '%Y-%m-%d %H:%M',
+    'hour': '%Y-%m-%d %H:00',
+    'day': '%Y-%m-%d',
+    'month': '%Y-%m',
+    'total': None,
+}
+
+
+def connect(path):
+    """
+    Opens (and creates) the store. WAL lets queries and several writer processes share it;
+    the connection may be handed to another thread (the pipelined output stage).
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    db = sqlite3.connect(path, timeout=60, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    # Bounds the table statistics PRAGMA optimize gathers (see close)
+    db.execute("PRAGMA analysis_limit=1000")
+    db.executescript(SCHEMA)
+    return db
+
+
+def close(db):
+    """
+    Closes a connection. PRAGMA optimize first refreshes the statistics the query planner
+    needs to pick between the time and camera indexes.
+    """
+    db.execute("PRAGMA optimize")
+    db.close()
+
+
+def open_event_store(path, video_source, fps, zone_names, camera=None, recorded_at=None, frame_stride=1,
+                     resume_state=None):
+    """
+    EventStoreWriter recording one video into the store at path. fps is the source frame
+    rate (frame numbers are source frames, 'frame_stride' apart). camera defaults to
+    cfg.EVENT_STORE_CAMERA and recorded_at (unix time of frame 0) to recording_start(). Any
+    earlier run of the same camera and source is replaced. With resume_state (a checkpoint()
+    value), the video's rows written after that checkpoint are removed and recording
+    continues where it left off.
+    """
+    if recorded_at is None:
+        recorded_at = recording_start(video_source, fps)
+    return EventStoreWriter(connect(path), video_source, fps, zone_names,
+                            camera or cfg.EVENT_STORE_CAMERA, recorded_at, frame_stride, resume_state)
+
+
+def recording_start(video_source, fps):
+    """
+    Unix time of frame 0 of a recorded file. Its modification time is when the recording
+    ended, so the video's length (frame count / fps) is taken off; a file whose length is
+    unknown falls back to the modification time.
+    """
+    import cv2  # Only needed when recording (the query CLI does without)
+    cap = cv2.VideoCapture(video_source)
+    frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+    cap.release()
+    duration = frame_count / fps if frame_count > 0 and fps else 0.0
+    return os.path.getmtime(video_source) - duration
+
+
+class EventStoreWriter:
+    """
+    Records the counting results of one video:
+
+    - count_events: one row per newly counted person (camera, zone, timestamp, track);
+    - tracks:       one row per track (first/last seen, seconds seen sitting, when it was
+                    counted and in which zone), written when the video is done;
+    - occupancy_minutes: per camera, zone and minute of the recording, the frames processed,
+                    person-frames of sitting people, the most people sitting at once and
+                    the people counted. Rollups are summed in memory and written once their
+                    minute is over.
+
+    Rows are buffered and inserted with executemany, cfg.EVENT_STORE_BATCH_ROWS at a time,
+    each batch in one transaction. Timestamps are recorded_at + frame / fps, with fps the
+    source frame rate (also stored in videos.fps), whatever the frame stride.
+    """
+
+    def __init__(self, db, video_source, fps, zone_names, camera, recorded_at, frame_stride=1, resume_state=None):
+        self.db = db
+        self.camera = camera
+        self.fps = fps
+        self.frame_stride = max(int(frame_stride), 1)
+        self.recorded_at = recorded_at
+        self.zone_names = list(zone_names)
+        self._events = []
+        self._minutes = []
+
+        if resume_state is None:
+            source = os.path.abspath(video_source)
+            with db:
+                # A video processed again (or after an incomplete run) replaces its earlier rows,
+                # so the queries never count it twice
+                earlier = [(row[0],) for row in db.execute(
+                    "SELECT id FROM videos WHERE camera = ? AND source = ?", (camera, source))]
+                for table in ('count_events', 'tracks', 'occupancy_minutes', 'videos'):
+                    column = 'id' if table == 'videos' else 'video_id'
+                    db.executemany(f"DELETE FROM {table} WHERE {column} = ?", earlier)
+                cursor = db.execute(
+                    "INSERT INTO videos (camera, source, recorded_at, fps, processed_at) VALUES (?, ?, ?, ?, ?)",
+                    (camera, source, recorded_at, fps, datetime.now().isoformat(timespec='seconds')))
+            self.video_id = cursor.lastrowid
+            self._minute = None
+            self._minute_totals = None
+            self._tracks = {}
+            self._last_frame = None
+        else:
+            self.video_id = resume_state['video_id']
+            self.camera = resume_state['camera']
+            self.recorded_at = resume_state['recorded_at']
+            self._minute = resume_state['minute']
+            self._minute_totals = resume_state['minute_totals']
+            self._tracks = resume_state['tracks']
+            self._last_frame = resume_state['last_frame']
+            # Whatever was written after the checkpoint is recorded again
+            with db:
+                db.execute("DELETE FROM count_events WHERE video_id = ? AND frame > ?", (self.video_id, self._last_frame))
+                if self._minute is not None:
+                    db.execute("DELETE FROM occupancy_minutes WHERE video_id = ? AND minute >= ?", (self.video_id, self._minute))
+
+    def timestamp(self, frame_idx):
+        return self.recorded_at + frame_idx / self.fps
+
+    def write_frame(self, frame_idx, people, current_count):
+        """Records one counted frame (main_pipeline.PersonState list; masked people have no track)."""
+        ts = self.timestamp(frame_idx)
+        # Seconds covered by this frame: the gap since the previous counted frame (one stride at first)
+        step = (frame_idx - self._last_frame if self._last_frame is not None else self.frame_stride) / self.fps
+        self._last_frame = frame_idx
+
+        minute = int(ts // 60) * 60
+        if minute != self._minute:
+            self._close_minute()
+            self._minute = minute
+            # zone index -> [frames, sitting person-frames, max sitting, counted]
+            self._minute_totals = [[0, 0, 0, 0] for _ in self.zone_names]
+
+        sitting = [0] * len(self.zone_names)
+        for person in people:
+            if person.track_id is None:
+                continue
+            zone = self.zone_names[person.zone_id] if person.zone_id >= 0 else None
+            track = self._tracks.get(person.track_id)
+            if track is None:
+                # [first ts, last ts, sitting seconds, counted ts, zone]
+                track = self._tracks[person.track_id] = [ts, ts, 0.0, None, None]
+            track[1] = ts
+            if person.sitting:
+                track[2] += step
+                if zone is not None:
+                    sitting[person.zone_id] += 1
+            if person.newly_counted:
+                track[3] = ts
+                track[4] = zone
+                self._events.append((self.video_id, self.camera, zone or '', ts, frame_idx, person.track_id))
+                if zone is not None:
+                    self._minute_totals[person.zone_id][3] += 1
+
+        for totals, zone_sitting in zip(self._minute_totals, sitting):
+            totals[0] += 1
+            totals[1] += zone_sitting
+            totals[2] = max(totals[2], zone_sitting)
+
+        if len(self._events) + len(self._minutes) >= cfg.EVENT_STORE_BATCH_ROWS:
+            self._flush()
+
+    def _close_minute(self):
+        if self._minute is None:
+            return
+        for zone, (frames, sitting, max_sitting, counted) in zip(self.zone_names, self._minute_totals):
+            self._minutes.append((self.camera, zone, self._minute, self.video_id, frames, sitting, max_sitting, counted))
+
+    def _flush(self):
+        with self.db:
+            if self._events:
+                self.db.executemany(
+                    "INSERT INTO count_events (video_id, camera, zone, ts, frame, track_id) VALUES (?, ?, ?, ?, ?, ?)",
+                    self._events)
+            if self._minutes:
+                # A minute split over two runs of the same video (a resume) adds up
+                self.db.executemany(
+                    "INSERT INTO occupancy_minutes (camera, zone, minute, video_id, frames, sitting, max_sitting, counted) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (minute, camera, zone, video_id) DO UPDATE SET "
+                    "frames = frames + excluded.frames, sitting = sitting + excluded.sitting, "
+                    "max_sitting = max(max_sitting, excluded.max_sitting), counted = counted + excluded.counted",
+                    self._minutes)
+        self._events = []
+        self._minutes = []
+
+    def checkpoint(self):
+        """Commits everything recorded so far and returns the state to resume with (checkpoint.Checkpointer)."""
+        self._flush()
+        return {
+            'video_id': self.video_id,
+            'camera': self.camera,
+            'recorded_at': self.recorded_at,
+            'minute': self._minute,
+            'minute_totals': [list(totals) for totals in self._minute_totals] if self._minute_totals else None,
+            'tracks': {track_id: list(track) for track_id, track in self._tracks.items()},
+            'last_frame': self._last_frame,
+        }
+
+    def finish(self, frames, unique_count):
+        """Writes the last minute and the tracks, and marks the video as complete."""
+        self._close_minute()
+        self._minute = None
+        self._flush()
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO tracks (video_id, camera, track_id, zone, first_ts, last_ts, sitting_seconds, counted_ts) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(self.video_id, self.camera, track_id, zone, first_ts, last_ts, sitting_seconds, counted_ts)
+                 for track_id, (first_ts, last_ts, sitting_seconds, counted_ts, zone) in self._tracks.items()])
+            self.db.execute("UPDATE videos SET frames = ?, unique_count = ? WHERE id = ?",
+                            (frames, unique_count, self.video_id))
+
+    def close(self):
+        """Commits the buffered rows; a video closed without finish() stays incomplete (frames is NULL)."""
+        self._flush()
+        close(self.db)
+
+
+# --- Queries ---
+
+def _where(start=None, end=None, camera=None, zone=None, time_column='ts'):
+    clauses, params = [], []
+    if start is not None:
+        clauses.append(f"{time_column} >= ?")
+        params.append(start)
+    if end is not None:
+        clauses.append(f"{time_column} < ?")
+        params.append(end)
+    if camera is not None:
+        clauses.append("camera = ?")
+        params.append(camera)
+    if zone is not None:
+        clauses.append("zone = ?")
+        params.append(zone)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def _bucket(by, column):
+    if by not in BUCKETS:
+        raise ValueError(f"Unknown bucket '{by}' (expected {', '.join(BUCKETS)})")
+    if BUCKETS[by] is None:
+        return "'total'"
+    return f"strftime('{BUCKETS[by]}', {column}, 'unixepoch', 'localtime')"
+
+
+def unique_counts(db, start=None, end=None, by='hour', camera=None, zone=None):
+    """
+    Unique sitting people per time bucket, camera and zone: rows of (bucket, camera, zone,
+    count). start / end are unix times (end exclusive).
+    """
+    where, params = _where(start, end, camera, zone)
+    return db.execute(
+        f"SELECT {_bucket(by, 'ts')} AS bucket, camera, zone, COUNT(*) FROM count_events{where} "
+        f"GROUP BY bucket, camera, zone ORDER BY bucket, camera, zone", params).fetchall()
+
+
+def occupancy(db, start=None, end=None, by='hour', camera=None, zone=None):
+    """
+    Bench occupancy per time bucket, camera and zone from the per-minute rollups: rows of
+    (bucket, camera, zone, mean people sitting, most people sitting at once, people counted).
+    """
+    where, params = _where(start, end, camera, zone, time_column='minute')
+    return db.execute(
+        f"SELECT {_bucket(by, 'minute')} AS bucket, camera, zone, "
+        f"CAST(SUM(sitting) AS REAL) / MAX(SUM(frames), 1), MAX(max_sitting), SUM(counted) "
+        f"FROM occupancy_minutes{where} GROUP BY bucket, camera, zone ORDER BY bucket, camera, zone", params).fetchall()
+
+
+def videos(db, start=None, end=None, camera=None):
+    """Processed videos: rows of (id, camera, source, recorded at, frames, unique count); frames is None for incomplete runs."""
+    where, params = _where(start, end, camera, time_column='recorded_at')
+    return db.execute(
+        f"SELECT id, camera, source, datetime(recorded_at, 'unixepoch', 'localtime'), frames, unique_count "
+        f"FROM videos{where} ORDER BY recorded_at", params).fetchall()
+
+
+def _parse_time(value):
+    """Unix time of an ISO date or date-time (local time)."""
+    return datetime.fromisoformat(value).timestamp() if value else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the SQLite event store written by --store runs.")
+    parser.add_argument("query", choices=['unique', 'occupancy', 'videos'],
+                        help="unique: unique sitting people; occupancy: mean/max people sitting; videos: processed videos.")
+    parser.add_argument("--db", default=None, help="Store path (defaults to EVENT_STORE_PATH).")
+    parser.add_argument("--from", dest="start", default=None, help="Start (ISO date or date-time, local time, inclusive).")
+    parser.add_argument("--to", dest="end", default=None, help="End (ISO date or date-time, local time, exclusive).")
+    parser.add_argument("--by", choices=list(BUCKETS), default='hour', help="Time bucket (default: hour).")
+    parser.add_argument("--camera", default=None, help="Only this camera.")
+    parser.add_argument("--zone", default=None, help="Only this zone.")
+    args = parser.parse_args()
+
+    path = args.db or cfg.EVENT_STORE_PATH
+    if not os.path.exists(path):
+        print(f"Error: No event store at {path}")
+        sys.exit(1)
+    try:
+        start, end = _parse_time(args.start), _parse_time(args.end)
+    except ValueError as exc:
+        print(f"Error: {exc}")
+        sys.exit(1)
+
+    db = connect(path)
+    query_start = time.perf_counter()
+    if args.query == 'unique':
+        header = ('bucket', 'camera', 'zone', 'unique')
+        rows = unique_counts(db, start, end, args.by, args.camera, args.zone)
+    elif args.query == 'occupancy':
+        header = ('bucket', 'camera', 'zone', 'mean_sitting', 'max_sitting', 'counted')
+        rows = [(bucket, camera, zone, round(mean, 2), peak, counted)
+                for bucket, camera, zone, mean, peak, counted in occupancy(db, start, end, args.by, args.camera, args.zone)]
+    else:
+        header = ('id', 'camera', 'source', 'recorded_at', 'frames', 'unique')
+        rows = videos(db, start, end, args.camera)
+    elapsed = time.perf_counter() - query_start
+    close(db)
+
+    print("\t".join(header))
+    for row in rows:
+        print("\t".join('' if value is None else str(value) for value in row))
+    print(f"{len(rows)} rows in {elapsed * 1000:.1f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# frame_source.py - Pluggable video frame sources (OpenCV or ffmpeg pipe) with striding and downscaling
+
+import shutil
+import subprocess
+import cv2
+import numpy as np
+import config as cfg
+
+
+def output_size(src_width, src_height, target_width=None):
+    """Decoded frame size for a target width (keeps the aspect ratio, even height)."""
+    if not target_width or target_width >= src_width:
+        return src_width, src_height
+    height = int(round(src_height * target_width / src_width / 2)) * 2
+    return int(target_width), max(height, 2)
+
+
+class OpenCVFrameSource:
+    """
+    cv2.VideoCapture with frame striding and downscaling.
+
+    Only every 'stride'-th frame is decoded: the frames in between are skipped with grab(),
+    which demuxes without converting the image. Frames are resized to 'target_width'
+    right after decoding, into a rotating pool of 'num_buffers' preallocated arrays, so a
+    returned frame stays valid until num_buffers more frames have been read.
+    Reading starts at source frame 'start_frame' (seeked with CAP_PROP_POS_FRAMES).
+    """
+
+    def __init__(self, path, stride=1, target_width=None, num_buffers=8, start_frame=0):
+        self.cap = cv2.VideoCapture(path)
+        self.stride = max(int(stride), 1)
+        if start_frame > 0:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+
+        self.src_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.src_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.src_fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.width, self.height = output_size(self.src_width, self.src_height, target_width)
+        self.fps = self.src_fps / self.stride if self.src_fps else self.src_fps
+
+        self._resize = (self.width, self.height) != (self.src_width, self.src_height)
+        self._buffers = [np.empty((self.height, self.width, 3), dtype=np.uint8)
+                         for _ in range(num_buffers)] if self._resize else []
+        self._next_buffer = 0
+
+        # Source frame number of the last frame returned by read()
+        self.frame_index = start_frame - 1
+        self._first_read = True
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def read(self):
+        # Skip the frames between two processed ones (no pixel conversion)
+        if not self._first_read:
+            for _ in range(self.stride - 1):
+                if not self.cap.grab():
+                    return False, None
+                self.frame_index += 1
+
+        ret, frame = self.cap.read()
+        if not ret:
+            return False, None
+        self.frame_index += 1
+        self._first_read = False
+
+        if self._resize:
+            buffer = self._buffers[self._next_buffer]
+            self._next_buffer = (self._next_buffer + 1) % len(self._buffers)
+            frame = cv2.resize(frame, (self.width, self.height), dst=buffer, interpolation=cv2.INTER_AREA)
+        return True, frame
+
+    def release(self):
+        self.cap.release()
+
+
+class FFmpegFrameSource:
+    """
+    Raw BGR frames from a multi-threaded ffmpeg subprocess.
+
+    Striding ('select') and scaling happen inside ffmpeg, so only the frames that are
+    processed are converted, already at the inference resolution. Frames are read with
+    readinto() into a rotating pool of 'num_buffers' preallocated arrays (no per-frame
+    allocation); a returned frame stays valid until num_buffers more frames have been read.
+    Reading starts at source frame 'start_frame' (ffmpeg input seek, decoded frame-accurately).
+    """
+
+    def __init__(self, path, stride=1, target_width=None, num_buffers=8, threads=None, binary=None, start_frame=0):
+        binary = binary or cfg.FFMPEG_BINARY
+        if shutil.which(binary) is None:
+            raise RuntimeError(f"ffmpeg binary '{binary}' not found (set FFMPEG_BINARY in config.py)")
+
+        # Probe the stream properties with OpenCV
+        probe = cv2.VideoCapture(path)
+        self.src_width = int(probe.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.src_height = int(probe.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.src_fps = probe.get(cv2.CAP_PROP_FPS)
+        probe.release()
+        if self.src_width <= 0 or self.src_height <= 0:
+            raise RuntimeError(f"Could not probe video source {path}")
+        if start_frame > 0 and not self.src_fps:
+            raise RuntimeError(f"Cannot seek in {path}: the frame rate is unknown")
+
+        self.stride = max(int(stride), 1)
+        self.width, self.height = output_size(self.src_width, self.src_height, target_width)
+        self.fps = self.src_fps / self.stride if self.src_fps else self.src_fps
+
+        filters = []
+        if self.stride > 1:
+            filters.append(f"select=not(mod(n\\,{self.stride}))")
+        if (self.width, self.height) != (self.src_width, self.src_height):
+            filters.append(f"scale={self.width}:{self.height}:flags=area")
+
+        threads = cfg.FFMPEG_THREADS if threads is None else threads
+        command = [binary, '-hide_banner', '-loglevel', 'error', '-nostdin',
+                   '-threads', str(threads)]
+        if start_frame > 0:
+            command += ['-ss', f"{start_frame / self.src_fps:.6f}"]
+        command += ['-i', path]
+        if filters:
+            command += ['-vf', ','.join(filters)]
+        command += ['-vsync', '0', '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-']
+
+        self._proc = subprocess.Popen(command, stdout=subprocess.PIPE, bufsize=0)
+        self._frame_bytes = self.width * self.height * 3
+        self._buffers = [np.empty((self.height, self.width, 3), dtype=np.uint8) for _ in range(num_buffers)]
+        self._next_buffer = 0
+        self._open = True
+
+        # Source frame number of the last frame returned by read()
+        self.frame_index = start_frame - 1
+        self._first_read = True
+
+    def isOpened(self):
+        return self._open
+
+    def read(self):
+        if not self._open:
+            return False, None
+
+        buffer = self._buffers[self._next_buffer]
+        view = memoryview(buffer.reshape(-1))
+        filled = 0
+        while filled < self._frame_bytes:
+            count = self._proc.stdout.readinto(view[filled:])
+            if not count:
+                self._open = False
+                return False, None
+            filled += count
+
+        self._next_buffer = (self._next_buffer + 1) % len(self._buffers)
+        self.frame_index += 1 if self._first_read else self.stride
+        self._first_read = False
+        return True, buffer
+
+    def release(self):
+        self._open = False
+        if self._proc.poll() is None:
+            self._proc.kill()
+        self._proc.stdout.close()
+        self._proc.wait()
+
+
+def open_frame_source(path, stride=1, target_width=None, backend='opencv', num_buffers=8, start_frame=0):
+    """Opens a frame source; backend is 'opencv' or 'ffmpeg'."""
+    if backend == 'ffmpeg':
+        return FFmpegFrameSource(path, stride=stride, target_width=target_width, num_buffers=num_buffers, start_frame=start_frame)
+    if backend == 'opencv':
+        return OpenCVFrameSource(path, stride=stride, target_width=target_width, num_buffers=num_buffers, start_frame=start_frame)
+    raise ValueError(f"Unknown decoder backend '{backend}' (expected 'opencv' or 'ffmpeg')")
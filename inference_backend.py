@@ -0,0 +1,565 @@
+# inference_backend.py - Pluggable pose inference backends (Ultralytics/PyTorch or ONNX Runtime)
+
+import argparse
+import os
+import sys
+import time
+import cv2
+import numpy as np
+import config as cfg
+import metrics
+import utils
+import tracking
+import zones
+
+# Keypoints below this confidence are zeroed, as Ultralytics does, so that the
+# heuristics see them as missing (x == 0)
+KEYPOINT_VISIBLE_CONF = 0.5
+# Letterbox padding value used by Ultralytics
+LETTERBOX_COLOR = 114
+# Upper bound on people kept per frame after NMS (Ultralytics max_det)
+MAX_DETECTIONS = 300
+# Min box IoU between a person and the heavy model's detection in their crop to use it
+CASCADE_MATCH_IOU = 0.3
+
+# Torch device detected by resolve_device (once per process)
+_detected_device = None
+
+
+def resolve_device():
+    """
+    cfg.DEVICE, or when it is None the best available torch device ('mps', 'cuda' or 'cpu').
+    Detection imports torch, so it only happens the first time a PyTorch model is loaded,
+    and its result is reused for every later model of the process.
+    """
+    global _detected_device
+    if cfg.DEVICE:
+        return cfg.DEVICE
+    if _detected_device is None:
+        import torch
+
+        if torch.backends.mps.is_available():
+            _detected_device = 'mps'
+            print(f"INFO: Using Apple Silicon GPU acceleration: {_detected_device}")
+        elif torch.cuda.is_available():
+            _detected_device = 'cuda'
+            print(f"INFO: Using NVIDIA CUDA acceleration: {_detected_device}")
+        else:
+            _detected_device = 'cpu'
+            print(f"INFO: GPU not available. Falling back to {_detected_device}.")
+    return _detected_device
+
+
+def onnx_model_path(model_name=None, int8=None):
+    """Where the exported ONNX model is cached: next to the .pt file, '.int8' for the quantized one."""
+    model_name = model_name or cfg.MODEL_NAME
+    int8 = cfg.ONNX_INT8 if int8 is None else int8
+    stem = os.path.splitext(model_name)[0]
+    return f"{stem}.int8.onnx" if int8 else f"{stem}.onnx"
+
+
+def backend_model_name(backend=None):
+    """Model file a backend runs (also used to key the keypoint cache); 'light+heavy' for the cascade."""
+    backend = backend or cfg.INFERENCE_BACKEND
+    if backend == 'cascade':
+        return '+'.join(_base_model_name(cfg.CASCADE_BASE_BACKEND, model_name)
+                        for model_name in (cfg.CASCADE_LIGHT_MODEL, cfg.MODEL_NAME))
+    return _base_model_name(backend, cfg.MODEL_NAME)
+
+
+def _base_model_name(backend, model_name):
+    return onnx_model_path(model_name) if backend == 'onnx' else model_name
+
+
+def export_onnx(model_name=None, int8=None):
+    """
+    Exports the Ultralytics .pt model to ONNX once (dynamic batch) and, with int8,
+    quantizes its weights. Returns the cached path; existing exports are reused.
+    """
+    model_name = model_name or cfg.MODEL_NAME
+    int8 = cfg.ONNX_INT8 if int8 is None else int8
+    fp32_path = onnx_model_path(model_name, int8=False)
+    target_path = onnx_model_path(model_name, int8=int8)
+    if os.path.exists(target_path):
+        return target_path
+
+    if not os.path.exists(fp32_path):
+        from ultralytics import YOLO
+
+        print(f"INFO: Exporting {model_name} to ONNX (one-time)...")
+        exported = YOLO(model_name).export(format='onnx', imgsz=cfg.ONNX_IMGSZ, dynamic=True, simplify=True)
+        if os.path.abspath(exported) != os.path.abspath(fp32_path):
+            os.replace(exported, fp32_path)
+
+    if int8:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        print(f"INFO: Quantizing {fp32_path} to INT8 (one-time)...")
+        tmp_path = target_path + ".tmp"
+        quantize_dynamic(fp32_path, tmp_path, weight_type=QuantType.QUInt8)
+        os.replace(tmp_path, target_path)
+
+    return target_path
+
+
+def letterbox(frame, size, canvas):
+    """
+    Resizes 'frame' into the square (size, size, 3) 'canvas' keeping the aspect ratio,
+    padded like Ultralytics. Returns (gain, left, top) to map coordinates back.
+    """
+    height, width = frame.shape[:2]
+    gain = min(size / height, size / width)
+    new_width, new_height = int(round(width * gain)), int(round(height * gain))
+    left = int(round((size - new_width) / 2 - 0.1))
+    top = int(round((size - new_height) / 2 - 0.1))
+
+    canvas[:] = LETTERBOX_COLOR
+    cv2.resize(frame, (new_width, new_height), dst=canvas[top:top + new_height, left:left + new_width],
+               interpolation=cv2.INTER_LINEAR)
+    return gain, left, top
+
+
+def decode_pose_output(prediction, frame_width, frame_height, gain, left, top):
+    """
+    Turns one image of raw YOLOv8-pose output (4 + 1 + 17 * 3, anchors) into
+    utils.FrameDetections in frame pixels: confidence filter, NMS, undo the letterbox.
+    """
+    prediction = prediction.T
+    scores = prediction[:, 4]
+    candidates = prediction[scores > cfg.CONF_THRESHOLD]
+    if not len(candidates):
+        return utils.empty_detections()
+
+    # (cx, cy, w, h) -> NMS on (x, y, w, h), highest score first
+    centers, sizes = candidates[:, 0:2], candidates[:, 2:4]
+    nms_boxes = np.concatenate([centers - sizes / 2, sizes], axis=1)
+    keep = np.asarray(cv2.dnn.NMSBoxes(nms_boxes.tolist(), candidates[:, 4].tolist(),
+                                       cfg.CONF_THRESHOLD, cfg.IOU_THRESHOLD), dtype=np.int64).reshape(-1)
+    keep = keep[np.argsort(-candidates[keep, 4], kind='stable')][:MAX_DETECTIONS]
+    candidates = candidates[keep]
+
+    offset = np.array([left, top], dtype=np.float32)
+    limits = np.array([frame_width, frame_height], dtype=np.float32)
+
+    boxes = np.concatenate([centers[keep] - sizes[keep] / 2, centers[keep] + sizes[keep] / 2], axis=1)
+    boxes = (boxes - np.tile(offset, 2)) / gain
+    boxes = np.clip(boxes, 0, np.tile(limits, 2))
+
+    keypoints = candidates[:, 5:].reshape(len(candidates), -1, 3)
+    conf = keypoints[..., 2]
+    xy = np.clip((keypoints[..., :2] - offset) / gain, 0, limits)
+    xy[conf < KEYPOINT_VISIBLE_CONF] = 0
+
+    return utils.FrameDetections(
+        xy.astype(np.float32),
+        (xy / limits).astype(np.float32),
+        conf.astype(np.float32),
+        boxes.astype(np.float32)
+    )
+
+
+class TorchPoseBackend:
+    """The Ultralytics YOLO model (PyTorch) on resolve_device(). half precision is only used off the CPU."""
+
+    name = 'torch'
+
+    def __init__(self, model_name=None):
+        from ultralytics import YOLO
+
+        self.model_name = model_name or cfg.MODEL_NAME
+        self.device = resolve_device()
+        self.model = YOLO(self.model_name)
+        self._warm = set()
+
+    def predict(self, frames):
+        """One utils.FrameDetections per BGR frame, in order."""
+        start = time.perf_counter()
+        results = self.model(
+            list(frames),
+            conf=cfg.CONF_THRESHOLD,
+            iou=cfg.IOU_THRESHOLD,
+            classes=[0],
+            device=self.device,
+            half=self.device != 'cpu',
+            verbose=False
+        )
+        if metrics.active() is not None:
+            # Ultralytics times its own preprocessing (per image, in ms); the rest is the
+            # forward pass plus NMS
+            elapsed = time.perf_counter() - start
+            speed = getattr(results[0], 'speed', None) if len(results) else None
+            preprocess = min(speed['preprocess'] * len(results) / 1000.0, elapsed) if speed else 0.0
+            metrics.record('preprocess', preprocess)
+            metrics.record('inference', elapsed - preprocess)
+
+        # .cpu().numpy() of boxes and keypoints
+        with metrics.stage('transfer'):
+            return [utils.extract_detections([result]) for result in results]
+
+    def warmup(self, frame_shape, batch_size=1):
+        """One pass on a blank batch, once per frame shape and batch size (a reused model stays warm)."""
+        if (tuple(frame_shape), batch_size) in self._warm:
+            return
+        self._warm.add((tuple(frame_shape), batch_size))
+        self.predict([np.zeros(frame_shape, dtype=np.uint8)] * batch_size)
+
+    def begin_stream(self, frame_width=None, frame_height=None, roi=None):
+        """Called before the frames of a new video; detections only depend on the frame, so nothing to reset."""
+
+
+class OnnxPoseBackend:
+    """
+    The exported pose model on ONNX Runtime. Frames are letterboxed into a fixed square
+    input (cfg.ONNX_IMGSZ) so every batch of the same size reuses one input buffer and
+    the same optimized graph. Threads and providers come from config.py.
+    """
+
+    name = 'onnx'
+
+    def __init__(self, model_path=None):
+        import onnxruntime as ort
+
+        self.model_name = model_path or export_onnx()
+        self.imgsz = cfg.ONNX_IMGSZ
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.intra_op_num_threads = cfg.ONNX_INTRA_OP_THREADS
+        options.inter_op_num_threads = 1
+
+        available = ort.get_available_providers()
+        providers = [provider for provider in cfg.ONNX_PROVIDERS if provider in available] or ['CPUExecutionProvider']
+        self.session = ort.InferenceSession(self.model_name, sess_options=options, providers=providers)
+        self.input_name = self.session.get_inputs()[0].name
+
+        self._canvases = np.empty((0, self.imgsz, self.imgsz, 3), dtype=np.uint8)
+        self._warm = set()
+
+    def predict(self, frames):
+        """One utils.FrameDetections per BGR frame, in order."""
+        frames = list(frames)
+        if len(self._canvases) < len(frames):
+            self._canvases = np.empty((len(frames), self.imgsz, self.imgsz, 3), dtype=np.uint8)
+
+        with metrics.stage('preprocess'):
+            letterboxes = [letterbox(frame, self.imgsz, canvas) for frame, canvas in zip(frames, self._canvases)]
+            blob = cv2.dnn.blobFromImages(list(self._canvases[:len(frames)]), scalefactor=1 / 255.0, swapRB=True)
+        with metrics.stage('inference'):
+            predictions = self.session.run(None, {self.input_name: blob})[0]
+
+        with metrics.stage('transfer'):
+            return [
+                decode_pose_output(prediction, frame.shape[1], frame.shape[0], *params)
+                for prediction, frame, params in zip(predictions, frames, letterboxes)
+            ]
+
+    def warmup(self, frame_shape, batch_size=1):
+        """One pass on a blank batch, once per frame shape and batch size (a reused model stays warm)."""
+        if (tuple(frame_shape), batch_size) in self._warm:
+            return
+        self._warm.add((tuple(frame_shape), batch_size))
+        self.predict([np.zeros(frame_shape, dtype=np.uint8)] * batch_size)
+
+    def begin_stream(self, frame_width=None, frame_height=None, roi=None):
+        """Called before the frames of a new video; detections only depend on the frame, so nothing to reset."""
+
+
+class CascadePoseBackend:
+    """
+    Two-tier pose model: the light model (cfg.CASCADE_LIGHT_MODEL) runs on every frame and
+    the heavy one (cfg.MODEL_NAME) only on crops of ambiguous people, i.e. unmasked people
+    near the bench zone whose knee angle is within cfg.CASCADE_ANGLE_MARGIN of the sitting
+    thresholds, or whose hips, knees or ankles were not found. The heavy result replaces that
+    person's keypoints and box. Both models run on cfg.CASCADE_BASE_BACKEND.
+
+    Re-scored results are cached per person: while the same person (matched by box IoU on
+    consecutive inferred frames) stays ambiguous, the result moves along with their box and
+    is re-scored only every cfg.CASCADE_CACHE_FRAMES inferred frames, so a settled sitter
+    costs the light model only. The cache belongs to one stream: begin_stream() clears it
+    and tells the cascade where ROI crops lie in the full frame.
+    """
+
+    name = 'cascade'
+
+    def __init__(self, light_model=None, heavy_model=None, base_backend=None):
+        base_backend = base_backend or cfg.CASCADE_BASE_BACKEND
+        self.light = _create_base_backend(base_backend, light_model or cfg.CASCADE_LIGHT_MODEL)
+        self.heavy = _create_base_backend(base_backend, heavy_model or cfg.MODEL_NAME)
+        self.model_name = f"{self.light.model_name}+{self.heavy.model_name}"
+        self.begin_stream()
+
+    def begin_stream(self, frame_width=None, frame_height=None, roi=None):
+        """
+        Clears the cache and statistics before the frames of a new video. frame_width /
+        frame_height are the full frame size and roi the (x0, y0, x1, y1) crop of it the
+        frames are cut from (roi.RoiGate); by default frames are full frames.
+        """
+        self._frame_size = None if frame_width is None else np.array([frame_width, frame_height], dtype=np.float32)
+        self._offset = np.zeros(2, dtype=np.float32) if roi is None else np.array(roi[:2], dtype=np.float32)
+
+        # One entry per ambiguous person of the previous inferred frame: light box (for matching),
+        # heavy result relative to its top-left corner (NaN = missing keypoint), whether the
+        # heavy model found the person at all, and the age of the result in inferred frames
+        self._cache_boxes = np.empty((0, 4), dtype=np.float32)
+        self._cache_xy = np.empty((0, 17, 2), dtype=np.float32)
+        self._cache_conf = np.empty((0, 17), dtype=np.float32)
+        self._cache_box = np.empty((0, 4), dtype=np.float32)
+        self._cache_found = np.empty(0, dtype=bool)
+        self._cache_age = np.empty(0, dtype=np.int64)
+
+        self.people = 0
+        self.rescored = 0
+        self.reused = 0
+
+    def warmup(self, frame_shape, batch_size=1):
+        self.light.warmup(frame_shape, batch_size)
+        # Crops are about one person in size
+        self.heavy.warmup((max(frame_shape[0] // 2, 1), max(frame_shape[1] // 4, 1), 3), 1)
+
+    def predict(self, frames):
+        """One utils.FrameDetections per BGR frame, in order."""
+        frames = list(frames)
+        return [self._refine(frame, detections) for frame, detections in zip(frames, self.light.predict(frames))]
+
+    def _ambiguous(self, frame, detections):
+        """Which people of the light model's detections get the heavy model (or a cached result of it)."""
+        if not len(detections.xy):
+            return np.zeros(0, dtype=bool)
+        frame_size = self._frame_size if self._frame_size is not None else np.array([frame.shape[1], frame.shape[0]], dtype=np.float32)
+        missing = (detections.xy == 0).all(axis=-1, keepdims=True)
+        kpts = np.where(missing, 0, (detections.xy + self._offset) / frame_size)
+
+        classification = utils.classify_keypoints_batch(kpts)
+        margin = cfg.CASCADE_ANGLE_MARGIN
+        angles = classification.knee_angles
+        near_threshold = (
+            (np.abs(angles - cfg.MIN_KNEE_ANGLE_FOR_SITTING) <= margin) |
+            (np.abs(angles - cfg.MAX_KNEE_ANGLE_FOR_SITTING) <= margin)
+        ).any(axis=-1)
+        legs = kpts[:, [cfg.LEFT_HIP_IDX, cfg.RIGHT_HIP_IDX, cfg.LEFT_KNEE_IDX, cfg.RIGHT_KNEE_IDX,
+                        cfg.LEFT_ANKLE_IDX, cfg.RIGHT_ANKLE_IDX], 0]
+        legs_missing = (legs <= 0).any(axis=-1)
+
+        x_min, y_min, x_max, y_max = zones.bench_bounds()
+        grow = cfg.CASCADE_BENCH_MARGIN
+        mid_hips = utils.mid_hip_batch(kpts)
+        with np.errstate(invalid='ignore'):
+            near_bench = (
+                (mid_hips[:, 0] >= x_min - grow) & (mid_hips[:, 0] <= x_max + grow) &
+                (mid_hips[:, 1] >= y_min - grow) & (mid_hips[:, 1] <= y_max + grow)
+            )
+        has_box = np.isfinite(detections.boxes).all(axis=-1)
+        return near_bench & has_box & ~classification.exclusion_mask & (near_threshold | legs_missing)
+
+    def _match_cache(self, boxes):
+        """Cache entry of each box (-1 for none): same person on the previous frame, not due for re-scoring."""
+        entries = np.full(len(boxes), -1, dtype=np.int64)
+        if not len(boxes) or not len(self._cache_boxes):
+            return entries
+        iou = np.nan_to_num(tracking.box_iou_matrix(boxes, self._cache_boxes))
+        rows, cols = tracking.solve_assignment(1 - iou)
+        valid = (iou[rows, cols] >= cfg.CASCADE_CACHE_IOU) & (self._cache_age[cols] < cfg.CASCADE_CACHE_FRAMES)
+        entries[rows[valid]] = cols[valid]
+        return entries
+
+    def _crop(self, frame, box):
+        pad_x = (box[2] - box[0]) * cfg.CASCADE_CROP_PADDING
+        pad_y = (box[3] - box[1]) * cfg.CASCADE_CROP_PADDING
+        x0, y0 = max(int(box[0] - pad_x), 0), max(int(box[1] - pad_y), 0)
+        x1, y1 = min(int(np.ceil(box[2] + pad_x)), frame.shape[1]), min(int(np.ceil(box[3] + pad_y)), frame.shape[0])
+        return x0, y0, max(x1, x0 + 1), max(y1, y0 + 1)
+
+    def _refine(self, frame, detections):
+        with metrics.stage('cascade'):
+            rows = np.flatnonzero(self._ambiguous(frame, detections))
+            self.people += len(detections.xy)
+            entries = self._match_cache(detections.boxes[rows])
+            light_boxes = detections.boxes[rows]
+            xy, conf, boxes = detections.xy.copy(), detections.conf.copy(), detections.boxes.copy()
+            cached = entries >= 0
+            ages = np.zeros(len(rows), dtype=np.int64)
+            ages[cached] = self._cache_age[entries[cached]] + 1
+            found = np.zeros(len(rows), dtype=bool)
+            found[cached] = self._cache_found[entries[cached]]
+
+            # Carried over: the cached result, moved with the person's box (the light result
+            # stays when the heavy model did not find the person either)
+            for k in np.flatnonzero(found):
+                row, entry = rows[k], entries[k]
+                origin = np.tile(light_boxes[k, :2], 2)
+                xy[row] = np.where(np.isnan(self._cache_xy[entry]), 0, self._cache_xy[entry] + origin[:2])
+                conf[row] = self._cache_conf[entry]
+                boxes[row] = self._cache_box[entry] + origin
+            self.reused += int(cached.sum())
+
+            rescore = np.flatnonzero(~cached)
+            regions = [self._crop(frame, light_boxes[k]) for k in rescore]
+
+        if regions:
+            crop_detections = self.heavy.predict([frame[y0:y1, x0:x1] for x0, y0, x1, y1 in regions])
+            self.rescored += len(regions)
+            with metrics.stage('cascade'):
+                for k, (x0, y0, _, _), person in zip(rescore, regions, crop_detections):
+                    if not len(person.xy):
+                        continue
+                    offset = np.array([x0, y0], dtype=np.float32)
+                    iou = np.nan_to_num(tracking.box_iou_matrix(light_boxes[k:k + 1] - np.tile(offset, 2), person.boxes))[0]
+                    best = int(np.argmax(iou))
+                    if iou[best] < CASCADE_MATCH_IOU:
+                        continue
+                    row = rows[k]
+                    missing = (person.xy[best] == 0).all(axis=-1, keepdims=True)
+                    xy[row] = np.where(missing, 0, person.xy[best] + offset)
+                    conf[row] = person.conf[best]
+                    boxes[row] = person.boxes[best] + np.tile(offset, 2)
+                    found[k] = True
+
+        with metrics.stage('cascade'):
+            # The cache keeps this frame's ambiguous people, relative to their light box
+            origins = np.tile(light_boxes[:, :2], 2)
+            self._cache_boxes = light_boxes.astype(np.float32)
+            self._cache_xy = np.where((xy[rows] == 0).all(axis=-1, keepdims=True), np.nan, xy[rows] - origins[:, None, :2]).astype(np.float32)
+            self._cache_conf = conf[rows]
+            self._cache_box = (boxes[rows] - origins).astype(np.float32)
+            self._cache_found = found
+            self._cache_age = ages.astype(np.int64)
+
+            size = np.array([frame.shape[1], frame.shape[0]], dtype=np.float32)
+            return utils.FrameDetections(xy, (xy / size).astype(np.float32), conf, boxes)
+
+    def report(self):
+        if self.people:
+            print(f"Cascade: {self.light.model_name} on {self.people} people, {self.heavy.model_name} re-scored "
+                  f"{self.rescored} ({self.rescored / self.people:.0%}), {self.reused} cached results reused")
+
+
+def _create_base_backend(backend, model_name):
+    if backend == 'onnx':
+        return OnnxPoseBackend(export_onnx(model_name))
+    if backend == 'torch':
+        return TorchPoseBackend(model_name)
+    raise ValueError(f"Unknown cascade base backend '{backend}' (expected 'torch' or 'onnx')")
+
+
+def create_backend(backend=None):
+    """The pose backend selected by name ('torch', 'onnx' or 'cascade', default cfg.INFERENCE_BACKEND)."""
+    backend = backend or cfg.INFERENCE_BACKEND
+    if backend == 'onnx':
+        return OnnxPoseBackend()
+    if backend == 'torch':
+        return TorchPoseBackend()
+    if backend == 'cascade':
+        return CascadePoseBackend()
+    raise ValueError(f"Unknown inference backend '{backend}' (expected 'torch', 'onnx' or 'cascade')")
+
+
+# --- Parity Check ---
+
+def compare_detections(reference, candidate):
+    """
+    Matches the people of two FrameDetections of the same frame by box IoU.
+    Returns (matched, unmatched, max_keypoint_error, sitting_mismatches): the keypoint error
+    is the largest normalized distance between matched visible keypoints.
+    """
+    if not len(reference.xy) or not len(candidate.xy):
+        return 0, len(reference.xy) + len(candidate.xy), 0.0, 0
+
+    iou = np.nan_to_num(tracking.box_iou_matrix(reference.boxes, candidate.boxes))
+    rows, cols = tracking.solve_assignment(1 - iou)
+    valid = iou[rows, cols] >= 0.5
+    rows, cols = rows[valid], cols[valid]
+
+    visible = (reference.xyn[rows] > 0).all(-1) & (candidate.xyn[cols] > 0).all(-1)
+    distances = np.linalg.norm(reference.xyn[rows] - candidate.xyn[cols], axis=-1)
+    max_error = float(distances[visible].max()) if visible.any() else 0.0
+
+    sitting_ref = utils.classify_keypoints_batch(reference.xyn[rows]).sitting_mask
+    sitting_cand = utils.classify_keypoints_batch(candidate.xyn[cols]).sitting_mask
+    unmatched = len(reference.xy) + len(candidate.xy) - 2 * len(rows)
+    return len(rows), unmatched, max_error, int((sitting_ref != sitting_cand).sum())
+
+
+def parity_check(video_path, num_frames=50, tolerance=None, backend=None):
+    """
+    Runs the PyTorch model and 'backend' (default: a new OnnxPoseBackend) on num_frames
+    frames spread over the video and prints how far the keypoints and sitting decisions
+    are apart. Returns True when every matched keypoint is within 'tolerance'
+    (normalized, default cfg.ONNX_PARITY_TOLERANCE) and no sitting decision differs.
+    """
+    tolerance = cfg.ONNX_PARITY_TOLERANCE if tolerance is None else tolerance
+
+    cap = cv2.VideoCapture(video_path)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    frames = []
+    for frame_idx in np.linspace(0, max(total - 1, 0), num_frames).astype(int):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, int(frame_idx))
+        ret, frame = cap.read()
+        if ret:
+            frames.append(frame)
+    cap.release()
+    if not frames:
+        raise RuntimeError(f"Could not read frames from {video_path}")
+
+    reference_backend = TorchPoseBackend()
+    candidate_backend = backend or OnnxPoseBackend()
+
+    matched = unmatched = sitting_mismatches = 0
+    max_error = 0.0
+    for frame in frames:
+        reference = reference_backend.predict([frame])[0]
+        candidate = candidate_backend.predict([frame])[0]
+        frame_matched, frame_unmatched, frame_error, frame_sitting = compare_detections(reference, candidate)
+        matched += frame_matched
+        unmatched += frame_unmatched
+        sitting_mismatches += frame_sitting
+        max_error = max(max_error, frame_error)
+
+    passed = max_error <= tolerance and sitting_mismatches == 0
+    print(f"\n--- Parity Check ({candidate_backend.model_name} vs {reference_backend.model_name}) ---")
+    print(f"Frames: {len(frames)}, matched people: {matched}, unmatched: {unmatched}")
+    print(f"Max keypoint error: {max_error:.4f} (tolerance {tolerance}), sitting mismatches: {sitting_mismatches}")
+    print(f"Result: {'PASS' if passed else 'FAIL'}")
+    print("-------------------------\n")
+    return passed
+
+
+def benchmark(backend, frame_shape, batch_size=1, iterations=20):
+    """Mean seconds per frame after a warmup pass."""
+    frames = [np.random.default_rng(0).integers(0, 255, frame_shape, dtype=np.uint8)] * batch_size
+    backend.warmup(frame_shape, batch_size)
+    start_time = time.perf_counter()
+    for _ in range(iterations):
+        backend.predict(frames)
+    return (time.perf_counter() - start_time) / (iterations * batch_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the pose model to ONNX and check it against PyTorch.")
+    parser.add_argument("--int8", action="store_true", help="Export (and check) the INT8-quantized model.")
+    parser.add_argument("--frames", type=int, default=50, help="Frames sampled from VIDEO_SOURCE for the check.")
+    parser.add_argument("--tolerance", type=float, default=None,
+                        help="Max normalized keypoint error (defaults to ONNX_PARITY_TOLERANCE).")
+    args = parser.parse_args()
+
+    model_path = export_onnx(int8=args.int8 or cfg.ONNX_INT8)
+    print(f"ONNX model: {model_path}")
+
+    if not os.path.exists(cfg.VIDEO_SOURCE):
+        print(f"Error: Video file not found at {cfg.VIDEO_SOURCE}.")
+        sys.exit(1)
+
+    backend = OnnxPoseBackend(model_path)
+    if not parity_check(cfg.VIDEO_SOURCE, args.frames, args.tolerance, backend):
+        sys.exit(1)
+
+    cap = cv2.VideoCapture(cfg.VIDEO_SOURCE)
+    frame_shape = (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), 3)
+    cap.release()
+    for candidate in (TorchPoseBackend(), backend):
+        seconds = benchmark(candidate, frame_shape, cfg.INFERENCE_BATCH_SIZE)
+        print(f"{candidate.name:>5}: {seconds * 1000:.1f} ms/frame ({1 / max(seconds, 1e-9):.1f} FPS)")
+
+
+if __name__ == "__main__":
+    main()
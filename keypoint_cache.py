@@ -0,0 +1,130 @@
+# keypoint_cache.py - On-disk cache of per-frame pose keypoints for replaying the counting logic without inference
+
+import hashlib
+import json
+import os
+from datetime import datetime
+import numpy as np
+import config as cfg
+import utils
+
+# Per-person arrays stored in the cache: field name -> per-person shape (all float32)
+CACHE_FIELDS = {
+    'xy': (17, 2),
+    'xyn': (17, 2),
+    'conf': (17,),
+    'boxes': (4,),
+}
+
+# Bytes hashed at the start and end of the video for its fingerprint
+FINGERPRINT_SAMPLE_BYTES = 4 * 1024 * 1024
+
+
+def video_fingerprint(video_path):
+    """
+    Cheap content hash of a video file: its size plus the first and last few MB.
+    Reading the whole file would take longer than some replays.
+    """
+    size = os.path.getsize(video_path)
+    digest = hashlib.sha1(str(size).encode())
+    with open(video_path, 'rb') as f:
+        digest.update(f.read(FINGERPRINT_SAMPLE_BYTES))
+        if size > FINGERPRINT_SAMPLE_BYTES:
+            f.seek(max(size - FINGERPRINT_SAMPLE_BYTES, FINGERPRINT_SAMPLE_BYTES))
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def cache_path_for(video_path, model_name=None, cache_dir=None):
+    """Cache directory for a (video, model) pair: <cache_dir>/<video hash>_<model name>."""
+    model_name = model_name or cfg.MODEL_NAME
+    model_stem = os.path.splitext(os.path.basename(model_name))[0]
+    return os.path.join(cache_dir or cfg.KEYPOINT_CACHE_DIR, f"{video_fingerprint(video_path)}_{model_stem}")
+
+
+class KeypointCacheWriter:
+    """
+    Streams per-frame detections to disk. Each field is appended to its own raw float32
+    file, so memory stays flat; the frame offsets and meta.json are written on close().
+    A cache without meta.json is incomplete and is never opened for replay.
+    """
+
+    def __init__(self, path, meta=None):
+        self.path = path
+        self.meta = dict(meta or {})
+        os.makedirs(path, exist_ok=True)
+
+        # Remove a stale meta.json first so an interrupted rewrite is never mistaken for complete
+        meta_path = os.path.join(path, 'meta.json')
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+
+        self._files = {name: open(os.path.join(path, f"{name}.bin"), 'wb') for name in CACHE_FIELDS}
+        self._offsets = [0]
+
+    def append(self, detections):
+        """Appends one frame (a utils.FrameDetections)."""
+        for name in CACHE_FIELDS:
+            values = np.ascontiguousarray(getattr(detections, name), dtype=np.float32)
+            self._files[name].write(values.tobytes())
+        self._offsets.append(self._offsets[-1] + len(detections.xy))
+
+    def abort(self):
+        """Closes the field files without writing meta.json, leaving the cache incomplete."""
+        for f in self._files.values():
+            f.close()
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+
+        np.save(os.path.join(self.path, 'offsets.npy'), np.asarray(self._offsets, dtype=np.int64))
+
+        meta = dict(self.meta)
+        meta.update({
+            'num_frames': len(self._offsets) - 1,
+            'num_people': self._offsets[-1],
+            'created': datetime.now().isoformat(timespec='seconds'),
+        })
+        tmp_path = os.path.join(self.path, 'meta.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_path, os.path.join(self.path, 'meta.json'))
+
+
+class KeypointCache:
+    """
+    Read-only, memory-mapped view of a completed cache. Fields are exposed as flat
+    (num_people, ...) arrays (e.g. cache.xyn) and frame i covers rows offsets[i]:offsets[i + 1].
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.offsets = np.load(os.path.join(path, 'offsets.npy'))
+
+        num_people = int(self.meta['num_people'])
+        for name, shape in CACHE_FIELDS.items():
+            if num_people == 0:
+                values = np.zeros((0,) + shape, dtype=np.float32)
+            else:
+                values = np.memmap(os.path.join(path, f"{name}.bin"), dtype=np.float32,
+                                   mode='r', shape=(num_people,) + shape)
+            setattr(self, name, values)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def frame(self, frame_idx):
+        """Detections of one frame as a utils.FrameDetections."""
+        start, end = self.offsets[frame_idx], self.offsets[frame_idx + 1]
+        return utils.FrameDetections(self.xy[start:end], self.xyn[start:end],
+                                     self.conf[start:end], self.boxes[start:end])
+
+
+def open_cache(path):
+    """Returns the KeypointCache at path, or None if it does not exist or is incomplete."""
+    if not os.path.exists(os.path.join(path, 'meta.json')):
+        return None
+    return KeypointCache(path)
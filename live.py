@@ -0,0 +1,326 @@
+# live.py - Real-time counting on live sources: latest-frame-wins reading with a latency budget
+
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+import cv2
+import numpy as np
+import config as cfg
+import metrics
+from counter import create_counter
+from event_sink import open_event_sink
+from frame_source import output_size
+from inference_backend import create_backend
+from main_pipeline import count_people, print_zone_counts
+from renderer import FrameRenderer
+
+
+def parse_source(source):
+    """
+    Camera index ('0'), stream URL (rtsp://, http://, ...) or local file.
+    Returns (cv2.VideoCapture argument, is_local_file).
+    """
+    if isinstance(source, int) or str(source).isdigit():
+        return int(source), False
+    return source, os.path.isfile(source)
+
+
+class LatestFrameReader:
+    """
+    Reader thread of a live source that only ever keeps the newest frame: a frame replaced
+    before the consumer took it is dropped (frames_dropped), so a slow consumer always gets
+    the most recent picture instead of falling further and further behind.
+
+    Three preallocated buffers rotate between the reader and the consumer: one holds the
+    latest frame, one is in use by the consumer (until its next get()) and the reader
+    decodes into the third, so nothing is copied or allocated per frame.
+
+    A local file is replayed as a simulated live source: frames are released at its native
+    frame rate however fast they can be decoded. Every frame is stamped with its capture
+    time in seconds since start().
+    """
+
+    def __init__(self, source, target_width=None, simulate=None):
+        capture_arg, is_file = parse_source(source)
+        self.source = source
+        self.simulate = is_file if simulate is None else simulate
+        self.cap = cv2.VideoCapture(capture_arg)
+
+        self.src_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.src_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.src_fps = self.cap.get(cv2.CAP_PROP_FPS) or 0.0
+        self.fps = self.src_fps if self.src_fps > 0 else cfg.LIVE_FALLBACK_FPS
+        self.width, self.height = output_size(self.src_width, self.src_height, target_width)
+
+        self._resize = (self.width, self.height) != (self.src_width, self.src_height)
+        self._decoded = np.empty((self.src_height, self.src_width, 3), dtype=np.uint8) if self._resize else None
+        self._buffers = [np.empty((self.height, self.width, 3), dtype=np.uint8) for _ in range(3)]
+        self._latest = None     # (buffer index, frame number, capture time) not yet taken
+        self._in_use = None     # buffer index held by the consumer
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._finished = False
+        self._thread = threading.Thread(target=self._run, name="live-reader", daemon=True)
+
+        self.started_at = None
+        self.frames_captured = 0
+        self.frames_dropped = 0
+        self.error = None
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            while not self._stopped:
+                with self._condition:
+                    busy = (self._in_use, self._latest[0] if self._latest else None)
+                    index = next(i for i in range(len(self._buffers)) if i not in busy)
+
+                # Decode outside the lock; the consumer never touches a buffer that is
+                # neither the latest nor its own
+                with metrics.stage('decode'):
+                    if self._resize:
+                        ret, decoded = self.cap.read(self._decoded)
+                        if ret:
+                            self._buffers[index] = cv2.resize(decoded, (self.width, self.height),
+                                                              dst=self._buffers[index], interpolation=cv2.INTER_AREA)
+                    else:
+                        ret, decoded = self.cap.read(self._buffers[index])
+                        if ret:
+                            self._buffers[index] = decoded
+                if not ret:
+                    break
+
+                frame_number = self.frames_captured
+                if self.simulate:
+                    delay = self.started_at + frame_number / self.fps - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                captured_at = time.perf_counter() - self.started_at
+
+                with self._condition:
+                    if self._latest is not None:
+                        self.frames_dropped += 1
+                    self._latest = (index, frame_number, captured_at)
+                    self.frames_captured += 1
+                    self._condition.notify()
+        except Exception as exc:
+            self.error = str(exc)
+        finally:
+            with self._condition:
+                self._finished = True
+                self._condition.notify()
+
+    def get(self):
+        """
+        Blocks until a frame newer than the last one returned is available.
+        Returns (frame number, capture time, frame), or None once the source has ended.
+        The frame stays valid until the next get().
+        """
+        with self._condition:
+            while self._latest is None and not self._finished:
+                self._condition.wait()
+            if self._latest is None:
+                return None
+            index, frame_number, captured_at = self._latest
+            self._latest = None
+            self._in_use = index
+        return frame_number, captured_at, self._buffers[index]
+
+    def stop(self):
+        self._stopped = True
+        if self._thread.is_alive():
+            self._thread.join()
+        self.cap.release()
+
+
+class LiveStats:
+    """Counters of a live run: throughput, dropped frames and end-to-end lag (capture to counted)."""
+
+    def __init__(self):
+        self.frames_processed = 0
+        self.frames_stale = 0
+        self.frames_over_budget = 0
+        self.lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self._lag_sum_ms = 0.0
+
+    def record(self, lag_ms, budget_ms):
+        self.frames_processed += 1
+        self.lag_ms = lag_ms
+        self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+        self._lag_sum_ms += lag_ms
+        if lag_ms > budget_ms:
+            self.frames_over_budget += 1
+
+    @property
+    def mean_lag_ms(self):
+        return self._lag_sum_ms / self.frames_processed if self.frames_processed else 0.0
+
+    def status(self, reader):
+        elapsed = time.perf_counter() - reader.started_at if reader.started_at else 0.0
+        return {
+            'frames_captured': reader.frames_captured,
+            'frames_processed': self.frames_processed,
+            'frames_dropped': reader.frames_dropped,
+            'frames_stale': self.frames_stale,
+            'frames_over_budget': self.frames_over_budget,
+            'fps': round(self.frames_processed / elapsed, 2) if elapsed else 0.0,
+            'lag_ms': round(self.lag_ms, 1),
+            'mean_lag_ms': round(self.mean_lag_ms, 1),
+            'max_lag_ms': round(self.max_lag_ms, 1),
+        }
+
+
+def run_live(reader, pose_model, counter, sink=None, max_latency_ms=None, show=False, duration=None, stats=None):
+    """
+    Counts a started LatestFrameReader until the source ends, 'duration' seconds have passed
+    or 'q' is pressed in the preview window (show=True, drawn by a renderer.FrameRenderer
+    with the RENDER_EVERY_N / RENDER_WIDTH settings). Frames are inferred one at a time
+    (batching would only add latency). A frame that is already older than max_latency_ms
+    (default cfg.LIVE_MAX_LATENCY_MS) when the model is free for it is dropped as stale.
+
+    Frames are numbered by capture time in frames of reader.fps, so with dropped frames the
+    tracker's track_buffer and FRAMES_TO_CONFIRM_SITTING still measure real time (gaps of
+    more than MAX_SITTING_GAP_FRAMES between two observations of a person count as that gap).
+    Updates and returns 'stats' (a new LiveStats by default).
+    """
+    budget_ms = cfg.LIVE_MAX_LATENCY_MS if max_latency_ms is None else max_latency_ms
+    stats = stats or LiveStats()
+    last_frame_idx = -1
+    renderer = FrameRenderer(reader.width, reader.height) if show else None
+    next_status = time.perf_counter() + cfg.LIVE_STATUS_INTERVAL
+
+    while True:
+        item = reader.get()
+        if item is None:
+            break
+        _, captured_at, frame = item
+        capture_time = reader.started_at + captured_at
+
+        if (time.perf_counter() - capture_time) * 1000.0 > budget_ms:
+            stats.frames_stale += 1
+            continue
+
+        detections = pose_model.predict([frame])[0]
+        frame_idx = max(int(round(captured_at * reader.fps)), last_frame_idx + 1)
+        last_frame_idx = frame_idx
+        people, current_feedback, current_feedback_color = count_people(counter, frame_idx, detections)
+        if sink is not None:
+            tracks = [(p.track_id, p.sitting, p.newly_counted) for p in people if p.track_id is not None]
+            sink.write_frame(frame_idx, tracks, counter.count, timestamp=captured_at)
+
+        now = time.perf_counter()
+        stats.record((now - capture_time) * 1000.0, budget_ms)
+        metrics.count('frames')
+        metrics.gauge('unique_sitting_count', counter.count)
+        metrics.gauge('live_lag_ms', stats.lag_ms)
+        metrics.gauge('live_frames_dropped', reader.frames_dropped + stats.frames_stale)
+
+        if renderer is not None and renderer.due():
+            with metrics.stage('render'):
+                vis_frame = renderer.render(frame, people, current_feedback, current_feedback_color, counter.count)
+            cv2.imshow('Unique Sitting Counter (live)', vis_frame)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+
+        if now >= next_status:
+            status = stats.status(reader)
+            print(f"Live: {status['fps']} FPS, {status['frames_dropped']} dropped, {status['frames_stale']} stale, "
+                  f"lag {status['lag_ms']:.0f} ms (max {status['max_lag_ms']:.0f}). Current Count: {counter.count}")
+            next_status = now + cfg.LIVE_STATUS_INTERVAL
+        if duration and now - reader.started_at >= duration:
+            break
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count unique sitting people on a live camera/stream in real time.")
+    parser.add_argument("source", nargs='?', default=None,
+                        help="Camera index, stream URL (rtsp://...) or a video file replayed at its native FPS "
+                             "as a simulated live source (defaults to VIDEO_SOURCE).")
+    parser.add_argument("--max-latency-ms", type=float, default=None,
+                        help="End-to-end latency budget (defaults to LIVE_MAX_LATENCY_MS).")
+    parser.add_argument("--decode-width", type=int, default=None,
+                        help="Downscale frames to this width right after decoding (defaults to DECODE_WIDTH).")
+    parser.add_argument("--duration", type=float, default=None, help="Stop after this many seconds.")
+    parser.add_argument("--show", action="store_true", help="Show the annotated preview window ('q' stops).")
+    parser.add_argument("--events", default=None, help="Path of the JSONL/CSV event log (defaults to OUTPUT_DIR).")
+    parser.add_argument("--backend", choices=['torch', 'onnx', 'cascade'], default=None,
+                        help="Pose inference backend (defaults to INFERENCE_BACKEND).")
+    parser.add_argument("--profile", action="store_true",
+                        help="Time every stage and print a per-stage report at the end (PROFILE_STAGES).")
+    parser.add_argument("--metrics-file", default=None,
+                        help="Write stage and lag metrics in Prometheus text format to this file (defaults to METRICS_FILE).")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve stage and lag metrics at http://localhost:<port>/metrics (defaults to METRICS_PORT).")
+    args = parser.parse_args()
+
+    source = args.source or cfg.VIDEO_SOURCE
+    decode_width = cfg.DECODE_WIDTH if args.decode_width is None else args.decode_width
+    reader = LatestFrameReader(source, target_width=decode_width)
+    if not reader.isOpened():
+        print(f"Error: Could not open live source {source}")
+        sys.exit(1)
+
+    pose_model = create_backend(args.backend)
+    pose_model.warmup((reader.height, reader.width, 3), 1)
+    pose_model.begin_stream(reader.width, reader.height)
+    counter = create_counter(max_gap=cfg.MAX_SITTING_GAP_FRAMES)
+
+    metrics_file = args.metrics_file or cfg.METRICS_FILE
+    metrics_port = cfg.METRICS_PORT if args.metrics_port is None else args.metrics_port
+    exporter = None
+    if args.profile or cfg.PROFILE_STAGES or metrics_file or metrics_port:
+        exporter = metrics.MetricsExporter(metrics.enable(), metrics_file, metrics_port)
+
+    events_path = args.events
+    if events_path is None:
+        os.makedirs(cfg.OUTPUT_DIR, exist_ok=True)
+        events_path = os.path.join(cfg.OUTPUT_DIR, datetime.now().strftime(f"live_%Y%m%d_%H%M%S_events.{cfg.EVENTS_FORMAT}"))
+    sink = open_event_sink(events_path)
+
+    mode = "simulated live (native FPS)" if reader.simulate else "live"
+    print(f"Counting {source} ({mode}, {reader.width}x{reader.height} @ {reader.fps:.1f} FPS). Ctrl+C stops.")
+    stats = LiveStats()
+    reader.start()
+    try:
+        run_live(reader, pose_model, counter, sink, args.max_latency_ms, args.show, args.duration, stats)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.stop()
+        sink.close()
+        if exporter is not None:
+            exporter.stop()
+        if args.show:
+            cv2.destroyAllWindows()
+    if reader.error:
+        print(f"Error: Live source failed: {reader.error}")
+
+    print(f"\n--- Live Run Complete ---")
+    print(f"Events saved to: {events_path}")
+    status = stats.status(reader)
+    print(f"Captured {status['frames_captured']} frames, counted {status['frames_processed']} "
+          f"({status['frames_dropped']} dropped as superseded, {status['frames_stale']} stale)")
+    print(f"End-to-end lag: mean {status['mean_lag_ms']:.0f} ms, max {status['max_lag_ms']:.0f} ms, "
+          f"{status['frames_over_budget']} frames over the budget")
+    print(f"Total unique people seen sitting: {counter.count}")
+    print_zone_counts(counter)
+    print("-------------------------\n")
+    if metrics.active() is not None:
+        metrics.active().report()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,20 @@
 # main.py - Unique Sitting Person Counter with Region Masking
 
 import cv2
-import mediapipe as mp
 import numpy as np
 import os
 import sys
-
-# Initialize MediaPipe's Pose solution and drawing utilities
-mp_pose = mp.solutions.pose
-mp_drawing = mp.solutions.drawing_utils
+import argparse
+from event_sink import open_event_sink
+from tracking import HipTracker, load_tracker_settings
+from counter import SittingCounter
+
+# MediaPipe Pose landmark indices (mp.solutions.pose.PoseLandmark). MediaPipe itself is
+# only imported once a video is analyzed, so importing this module stays cheap.
+LEFT_HIP = 23
+RIGHT_HIP = 24
+LEFT_KNEE = 25
+RIGHT_KNEE = 26
 
 # --- CONFIGURATION ---
 # Corrected path to step up from the current directory
@@ -26,9 +32,11 @@ MONUMENT_MASK_X_MAX = 0.35
 # --- SITTING THRESHOLDS (Based on Positional Heuristics) ---
 HIP_KNEE_Y_DIFF_MAX = 0.15 
 
-# --- GLOBAL TRACKING STORAGE ---
-unique_sitting_ids = {} 
-next_temp_id = 0 
+# --- TRACKING ---
+# Maximum normalized hip distance for matching a detection to a track
+TRACKING_PROXIMITY_THRESHOLD = 0.1
+# track_buffer / match_thresh settings shared with the YOLO pipeline
+TRACKER_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tracker_config.yaml')
 
 # --- HELPER FUNCTIONS ---
 
@@ -40,8 +48,8 @@ def is_inside_mask(landmarks, x_max):
     """
     try:
         # Use the average horizontal position of the hips as the person's center
-        l_hip_x = landmarks[mp_pose.PoseLandmark.LEFT_HIP.value].x
-        r_hip_x = landmarks[mp_pose.PoseLandmark.RIGHT_HIP.value].x
+        l_hip_x = landmarks[LEFT_HIP].x
+        r_hip_x = landmarks[RIGHT_HIP].x
         mid_hip_x = (l_hip_x + r_hip_x) / 2
         
         # If the person's center is to the left of the max X-coordinate
@@ -60,10 +68,10 @@ def is_sitting_heuristic(landmarks, height):
     """
     try:
         # We check both left and right sides for robustness
-        l_hip_y = landmarks[mp_pose.PoseLandmark.LEFT_HIP.value].y * height
-        l_knee_y = landmarks[mp_pose.PoseLandmark.LEFT_KNEE.value].y * height
-        r_hip_y = landmarks[mp_pose.PoseLandmark.RIGHT_HIP.value].y * height
-        r_knee_y = landmarks[mp_pose.PoseLandmark.RIGHT_KNEE.value].y * height
+        l_hip_y = landmarks[LEFT_HIP].y * height
+        l_knee_y = landmarks[LEFT_KNEE].y * height
+        r_hip_y = landmarks[RIGHT_HIP].y * height
+        r_knee_y = landmarks[RIGHT_KNEE].y * height
         
         # Hip-Knee Y-difference should be small if the leg is bent (sitting)
         l_diff = abs(l_hip_y - l_knee_y) / height
@@ -82,9 +90,16 @@ def is_sitting_heuristic(landmarks, height):
 
 # --- Main Program ---
 
-def analyze_video_for_sitting():
-    global next_temp_id
-    
+def analyze_video_for_sitting(render=True, events_path=None):
+    """
+    render=False is the headless analytics mode: no drawing, no VideoWriter and no window
+    (and therefore no waitKey delay); per-frame records are streamed to events_path instead.
+    Returns the unique sitting count.
+    """
+    import mediapipe as mp
+    mp_pose = mp.solutions.pose
+    mp_drawing = mp.solutions.drawing_utils
+
     if not os.path.exists(VIDEO_SOURCE):
         print(f"Error: Video file not found at {VIDEO_SOURCE}.")
         sys.exit(1)
@@ -101,12 +116,20 @@ def analyze_video_for_sitting():
 
     # --- VIDEO WRITER SETUP ---
     os.makedirs(OUTPUT_DIR, exist_ok=True)
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v') # Codec for MP4
-    out = cv2.VideoWriter(OUTPUT_FILE, fourcc, fps, (frame_width, frame_height))
-    print(f"Saving output video to: {OUTPUT_FILE}")
+    out = None
+    if render:
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v') # Codec for MP4
+        out = cv2.VideoWriter(OUTPUT_FILE, fourcc, fps, (frame_width, frame_height))
+        print(f"Saving output video to: {OUTPUT_FILE}")
+
+    if events_path is None and not render:
+        events_path = os.path.join(OUTPUT_DIR, 'sitting_count_events.jsonl')
+    sink = open_event_sink(events_path) if events_path else None
     # --------------------------
 
-    temp_trackers = {} 
+    # Counting state of this video (a person is counted on the first sitting frame)
+    counter = SittingCounter(HipTracker(proximity=TRACKING_PROXIMITY_THRESHOLD, **load_tracker_settings(TRACKER_CONFIG)))
+    frame_idx = 0
 
     with mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5) as pose:
         while cap.isOpened():
@@ -117,15 +140,18 @@ def analyze_video_for_sitting():
             image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
             image.flags.writeable = False
             results = pose.process(image)
-            image.flags.writeable = True
-            image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+            tracks = []
 
-            frame_height, frame_width, _ = image.shape
-            
-            # Draw the exclusion mask region for debug visualization
-            mask_pixel_x = int(MONUMENT_MASK_X_MAX * frame_width)
-            cv2.rectangle(image, (0, 0), (mask_pixel_x, frame_height), (0, 0, 100), -1) # Dark Blue overlay
-            cv2.putText(image, "EXCLUSION ZONE", (10, frame_height - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1, cv2.LINE_AA)
+            if render:
+                image.flags.writeable = True
+                image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+
+                frame_height, frame_width, _ = image.shape
+                
+                # Draw the exclusion mask region for debug visualization
+                mask_pixel_x = int(MONUMENT_MASK_X_MAX * frame_width)
+                cv2.rectangle(image, (0, 0), (mask_pixel_x, frame_height), (0, 0, 100), -1) # Dark Blue overlay
+                cv2.putText(image, "EXCLUSION ZONE", (10, frame_height - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1, cv2.LINE_AA)
 
             if results.pose_landmarks:
                 landmarks = results.pose_landmarks.landmark
@@ -139,25 +165,17 @@ def analyze_video_for_sitting():
                     # --- 1. SITTING CHECK ---
                     is_person_sitting = is_sitting_heuristic(landmarks, frame_height)
                     
-                    # --- 2. SIMPLE TRACKING/ID ASSIGNMENT ---
-                    hip_x_normalized = landmarks[mp_pose.PoseLandmark.LEFT_HIP.value].x
-                    
-                    assigned_id = None
-                    
-                    for tid, pos in temp_trackers.items():
-                        if abs(pos - hip_x_normalized) < 0.1:
-                            assigned_id = tid
-                            break
-                    
-                    if assigned_id is None:
-                        assigned_id = next_temp_id
-                        next_temp_id += 1
-                    
-                    temp_trackers[assigned_id] = hip_x_normalized
+                    # --- 2. TRACKING/ID ASSIGNMENT (Mid-Hip Position) ---
+                    l_hip = landmarks[LEFT_HIP]
+                    r_hip = landmarks[RIGHT_HIP]
+                    mid_hip = np.array([[(l_hip.x + r_hip.x) / 2, (l_hip.y + r_hip.y) / 2]])
                     
                     # --- 3. UNIQUE COUNTING LOGIC ---
-                    if is_person_sitting and assigned_id not in unique_sitting_ids:
-                        unique_sitting_ids[assigned_id] = True
+                    events = counter.update(frame_idx, mid_hip, None, [is_person_sitting])
+                    assigned_id = int(events.track_ids[0])
+                    newly_counted = bool(events.newly_counted[0])
+                    tracks.append((assigned_id, is_person_sitting, newly_counted))
+                    if newly_counted:
                         feedback = f"NEW PERSON {assigned_id} COUNTED!"
                         feedback_box_color = (255, 100, 0)
                     elif is_person_sitting:
@@ -168,19 +186,26 @@ def analyze_video_for_sitting():
                         feedback_box_color = (0, 165, 255)
 
                 # --- 4. RENDER UI AND FEEDBACK ---
-                
-                mp_drawing.draw_landmarks(image, results.pose_landmarks, mp_pose.POSE_CONNECTIONS,
-                                          mp_drawing.DrawingSpec(color=(245, 117, 66), thickness=2, circle_radius=2),
-                                          mp_drawing.DrawingSpec(color=(245, 66, 230), thickness=2, circle_radius=2))
+                if render:
+                    mp_drawing.draw_landmarks(image, results.pose_landmarks, mp_pose.POSE_CONNECTIONS,
+                                              mp_drawing.DrawingSpec(color=(245, 117, 66), thickness=2, circle_radius=2),
+                                              mp_drawing.DrawingSpec(color=(245, 66, 230), thickness=2, circle_radius=2))
 
             else:
                 feedback = "NO BODY DETECTED"
                 feedback_box_color = (128, 0, 0)
 
+            if sink is not None:
+                sink.write_frame(frame_idx, tracks, counter.count)
+            frame_idx += 1
+
+            if not render:
+                continue
+
             # Status Boxes (Count Box)
             cv2.rectangle(image, (0, 0), (350, 73), (50, 50, 50), -1)
             cv2.putText(image, 'UNIQUE SITTING COUNT', (15, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1, cv2.LINE_AA)
-            cv2.putText(image, str(len(unique_sitting_ids)), (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (255, 255, 255), 2, cv2.LINE_AA)
+            cv2.putText(image, str(counter.count), (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (255, 255, 255), 2, cv2.LINE_AA)
             
             # Feedback Box
             cv2.rectangle(image, (350, 0), (frame_width, 73), feedback_box_color, -1)
@@ -198,14 +223,28 @@ def analyze_video_for_sitting():
                 break
 
     cap.release()
-    out.release() # Release the VideoWriter
-    cv2.destroyAllWindows()
+    if out is not None:
+        out.release() # Release the VideoWriter
+        cv2.destroyAllWindows()
+    if sink is not None:
+        sink.close()
     print(f"\n--- Analysis Complete ---")
-    print(f"Output video saved to: {OUTPUT_FILE}")
-    print(f"Total unique people seen sitting: {len(unique_sitting_ids)}")
+    if out is not None:
+        print(f"Output video saved to: {OUTPUT_FILE}")
+    if sink is not None:
+        print(f"Events saved to: {events_path}")
+    print(f"Total unique people seen sitting: {counter.count}")
     print("-------------------------\n")
+    return counter.count
 
 
 if __name__ == "__main__":
-    analyze_video_for_sitting()
+    parser = argparse.ArgumentParser(description="Unique sitting person counter (MediaPipe Pose).")
+    parser.add_argument("--no-render", action="store_true",
+                        help="Headless analytics mode: skip drawing, video encoding and the preview window.")
+    parser.add_argument("--events", default=None,
+                        help="Path of the JSONL/CSV event log (defaults to OUTPUT_DIR in --no-render mode).")
+    args = parser.parse_args()
+
+    analyze_video_for_sitting(render=not args.no_render, events_path=args.events)
     print("Analysis complete.")
@@ -1,190 +1,843 @@
 import cv2
 import numpy as np
-from ultralytics import YOLO
 import os
 import sys
+import time
+import queue
+import argparse
+import pickle
+import threading
+from collections import namedtuple
 from datetime import datetime
 import config as cfg
 import utils
+import keypoint_cache
+import metrics
+import zones
+from counter import create_counter
+from roi import RoiGate
+from renderer import FrameRenderer
+from event_clips import ClipRecorder
+from inference_backend import create_backend, backend_model_name
+from frame_source import open_frame_source
+from event_sink import open_event_sink
+from event_store import open_event_store
+from checkpoint import Checkpointer, checkpoint_path_for, load_checkpoint, remove_checkpoint, settings_mismatch
+
+# Marks the end of the stream in the pipelined stage queues
+_END_OF_STREAM = object()
+
+# Per-person result of the counting step. 'track_id', 'feedback' and 'box' are None for
+# masked people; 'box' is also None when the detection has no bounding box. 'zone_id' is
+# the bench zone the person is in (an index into zones.zone_names(), zones.NO_ZONE for none).
+PersonState = namedtuple(
+    'PersonState',
+    ['kpts_pixel', 'color', 'feedback', 'box', 'track_id', 'sitting', 'newly_counted', 'zone_id']
+)
+
+# What analyze_video_for_sitting returns: frames processed, wall time, the unique count,
+# the unique count of each zone (zone name -> count, see named_zone_counts) and the seconds
+# from the call to the first counted frame (None for replays)
+RunSummary = namedtuple('RunSummary', ['frames', 'seconds', 'unique_count', 'zone_counts', 'time_to_first_frame'],
+                        defaults=(None, None))
+
+
+# --- Stage Functions ---
+
+def run_pose_inference(pose_model, frames, roi_gate=None):
+    """
+    Runs the pose backend (inference_backend) on a list of BGR frames in a single call.
+    Returns one utils.FrameDetections per frame, in the same order as 'frames'.
+
+    With a roi.RoiGate, frames that fail the motion gate are not inferred and reuse the
+    last detections, and the others are inferred on the bench-zone crop.
+    """
+    if roi_gate is None:
+        return pose_model.predict(frames)
+
+    selected = [roi_gate.should_infer(frame) for frame in frames]
+    model_inputs = [roi_gate.model_input(frame) for frame, infer in zip(frames, selected) if infer]
+    inferred = iter(pose_model.predict(model_inputs) if model_inputs else [])
+
+    detections = []
+    for infer in selected:
+        if infer:
+            roi_gate.last_detections = roi_gate.to_frame_coordinates(next(inferred))
+        detections.append(roi_gate.last_detections)
+    return detections
+
+
+def count_people(counter, frame_idx, detections, classification=None, settings=None):
+    """
+    Runs the mask check and sitting heuristic for one frame of utils.FrameDetections, then
+    tracking and unique counting on the stream's counter.SittingCounter. frame_idx is the
+    source frame number, so the tracker timing does not depend on the frame stride.
+    A precomputed utils.BatchClassification of the same people can be passed in (e.g. when
+    replaying cached keypoints); otherwise it is computed with 'settings' (utils.resolve_settings,
+    default config.py).
+
+    Returns (people, current_feedback, current_feedback_color), where people is a list of
+    PersonState tuples used by renderer.FrameRenderer and the analytics event sink.
+    """
+    people = []
+    current_feedback = "NO DETECTION"
+    current_feedback_color = (128, 0, 0)
+
+    # Mask and sitting checks for every person of the frame in one vectorized pass
+    if classification is None:
+        with metrics.stage('heuristics'):
+            classification = utils.classify_keypoints_batch(detections.xyn, settings)
+
+    # Tracking, temporal confirmation and counting for all unmasked people of the frame at once
+    with metrics.stage('tracking'):
+        tracked = ~classification.exclusion_mask
+        events = counter.update(
+            frame_idx, utils.mid_hip_batch(detections.xyn[tracked]), detections.boxes[tracked],
+            classification.sitting_mask[tracked], classification.zone_ids[tracked]
+        )
+    event_rows = np.cumsum(tracked) - 1
+
+    for i, kpts_pixel in enumerate(detections.xy):
+
+        # A. MASK CHECK
+        if not tracked[i]:
+            people.append(PersonState(kpts_pixel, (100, 100, 100), None, None, None, False, False, zones.NO_ZONE))
+            current_feedback = "MASKED"
+            current_feedback_color = (100, 100, 100)
+            continue
+
+        # B. SITTING CHECK (Combined Posture AND Spatial checks from utils.classify_keypoints_batch)
+        row = event_rows[i]
+        is_person_sitting = bool(events.sitting[row])
+
+        # C. TRACK ID (from the association above)
+        assigned_id = int(events.track_ids[row])
+
+        # D. TEMPORAL SMOOTHING: counted only after FRAMES_TO_CONFIRM_SITTING frames of continuous sitting
+        sitting_frames = int(events.sitting_frames[row])
+
+        # E. UNIQUE COUNTING LOGIC
+        newly_counted = bool(events.newly_counted[row])
+        if newly_counted:
+            feedback = f"NEW COUNTED! (ID: {assigned_id})"
+            color = (0, 100, 255) # Blue-Orange
+            current_feedback = feedback
+            current_feedback_color = color
+        elif is_person_sitting and events.counted[row]:
+            feedback = f"SITTING (ID: {assigned_id})"
+            color = (0, 255, 0) # Bright Green
+            current_feedback = feedback
+            current_feedback_color = color
+        elif is_person_sitting:
+            feedback = f"CONFIRMING {sitting_frames}/{counter.frames_to_confirm} (ID: {assigned_id})"
+            color = (0, 255, 255) # Yellow
+        else:
+            feedback = "NOT COUNTED"
+            color = (0, 165, 255) # Orange
+
+        box = detections.boxes[i]
+        if np.isnan(box).any():
+            box = None
+        people.append(PersonState(kpts_pixel, color, feedback, box, assigned_id, is_person_sitting, newly_counted,
+                                  int(classification.zone_ids[i])))
+
+    return people, current_feedback, current_feedback_color
+
+
+def process_frame(counter, frame_idx, frame, detections, renderer=None, clips=None):
+    """
+    Counting (+ rendering) for one frame. Returns (vis_frame, people, current_count);
+    vis_frame is None without a renderer.FrameRenderer and on frames it skips.
+    The frame is also handed to an event_clips.ClipRecorder, if any.
+    """
+    people, current_feedback, current_feedback_color = count_people(counter, frame_idx, detections)
+    current_count = counter.count
+    if clips is not None:
+        clips.add(frame_idx, frame, people, current_feedback, current_feedback_color, current_count)
+    vis_frame = None
+    if renderer is not None and renderer.due():
+        with metrics.stage('render'):
+            vis_frame = renderer.render(frame, people, current_feedback, current_feedback_color, current_count)
+    return vis_frame, people, current_count
+
+
+class FrameOutputs:
+    """
+    Everything written per frame once it has been counted: the annotated video, the
+    analytics event log, the SQLite event store and the keypoint cache. Each of them is
+    optional. A checkpoint.Checkpointer is told about every frame whose records are written.
+    """
+
+    def __init__(self, out=None, sink=None, cache_writer=None, checkpointer=None, store=None):
+        self.out = out
+        self.sink = sink
+        self.cache_writer = cache_writer
+        self.checkpointer = checkpointer
+        self.store = store
+        self.frames_written = 0
+        # perf_counter() time the first frame of this run was written
+        self.first_frame_at = None
+
+    def write_video(self, vis_frame):
+        if self.out is not None and vis_frame is not None:
+            with metrics.stage('encode'):
+                self.out.write(vis_frame)
+
+    def write_records(self, frame_idx, detections, people, current_count):
+        if self.sink is not None:
+            tracks = [(p.track_id, p.sitting, p.newly_counted) for p in people if p.track_id is not None]
+            self.sink.write_frame(frame_idx, tracks, current_count)
+        if self.store is not None:
+            with metrics.stage('store'):
+                self.store.write_frame(frame_idx, people, current_count)
+        if self.cache_writer is not None:
+            self.cache_writer.append(detections)
+        self.frames_written += 1
+        if self.first_frame_at is None:
+            self.first_frame_at = time.perf_counter()
+        if self.checkpointer is not None:
+            self.checkpointer.written(frame_idx, self.sink, self.frames_written, self.store)
+        metrics.count('frames')
+        metrics.gauge('unique_sitting_count', current_count)
+        report_progress(self.frames_written, current_count)
+
+    def write(self, frame_idx, vis_frame, detections, people, current_count):
+        self.write_video(vis_frame)
+        self.write_records(frame_idx, detections, people, current_count)
+
+    def finish(self, unique_count):
+        """Called once every frame is written: marks the video as complete in the event store."""
+        if self.store is not None:
+            self.store.finish(self.frames_written, unique_count)
+
+    def close(self):
+        if self.out is not None:
+            self.out.release()
+        if self.sink is not None:
+            self.sink.close()
+        if self.store is not None:
+            self.store.close()
+        if self.cache_writer is not None:
+            self.cache_writer.close()
+
+
+def report_progress(frame_count, current_count):
+    if frame_count % 100 == 0:
+        print(f"Frames processed: {frame_count}. Current Count: {current_count}")
+
+
+# --- Serial Execution ---
+
+def run_serial(source, pose_model, counter, outputs, renderer=None, roi_gate=None, clips=None):
+    """
+    Decode, inference, counting/render and encode one after another in a single loop.
+    Frames are collected into micro-batches of cfg.INFERENCE_BATCH_SIZE for inference and
+    then counted one by one in decode order. 'source' is a frame_source frame source;
+    without a renderer.FrameRenderer nothing is drawn.
+
+    Returns (frame_count, render_seconds), where render_seconds is the time spent drawing
+    and encoding, i.e. what the --no-render mode saves.
+    """
+    frame_count = 0
+    render_seconds = 0.0
+    batch = []
+    while source.isOpened():
+        with metrics.stage('decode'):
+            ret, frame = source.read()
+        if ret:
+            batch.append((source.frame_index, frame))
+
+        # Flush a full batch, or whatever is left once the video ends
+        if batch and (not ret or len(batch) >= cfg.INFERENCE_BATCH_SIZE):
+            frames = [frame for _, frame in batch]
+            for (frame_idx, frame), detections in zip(batch, run_pose_inference(pose_model, frames, roi_gate)):
+                people, current_feedback, current_feedback_color = count_people(counter, frame_idx, detections)
+                current_count = counter.count
+                if clips is not None:
+                    clips.add(frame_idx, frame, people, current_feedback, current_feedback_color, current_count)
+                if outputs.checkpointer is not None:
+                    outputs.checkpointer.capture(frame_idx, counter)
+
+                # Render + encode are timed together so the cost of the rendering path is reported
+                if renderer is not None and renderer.due():
+                    render_start = time.perf_counter()
+                    with metrics.stage('render'):
+                        vis_frame = renderer.render(frame, people, current_feedback, current_feedback_color, current_count)
+                    outputs.write_video(vis_frame)
+                    render_seconds += time.perf_counter() - render_start
+
+                outputs.write_records(frame_idx, detections, people, current_count)
+                frame_count += 1
+            batch = []
+
+        if not ret:
+            break
+
+    return frame_count, render_seconds
+
+
+def named_zone_counts(counter):
+    """Unique count of every zone of zones.zone_names() (the BENCH rectangle without ZONES_CONFIG)."""
+    return {name: counter.zone_counts.get(zone_id, 0) for zone_id, name in enumerate(zones.zone_names())}
+
+
+def print_zone_counts(counter):
+    """Per-zone lines of the run summaries (only with polygon zones configured)."""
+    if not cfg.ZONES_CONFIG:
+        return
+    for name, count in named_zone_counts(counter).items():
+        print(f"  {name}: {count}")
+
+
+# --- Replay From Keypoint Cache ---
+
+def run_replay(cache, counter, outputs):
+    """
+    Re-runs the mask, heuristic, tracking and counting logic on cached keypoints, without
+    decoding the video or running the model. The whole cache is classified in a single
+    vectorized pass, so replays are bound by the tracking loop only.
+    Cached frames are numbered in source frames using counter.frame_stride, which must be
+    the stride the cache was recorded with.
+    """
+    with metrics.stage('heuristics'):
+        classification_all = utils.classify_keypoints_batch(cache.xyn)
+
+    for i in range(len(cache)):
+        start, end = cache.offsets[i], cache.offsets[i + 1]
+        classification = utils.BatchClassification(*(values[start:end] for values in classification_all))
+        detections = cache.frame(i)
+
+        frame_idx = i * counter.frame_stride
+        people, _, _ = count_people(counter, frame_idx, detections, classification)
+        outputs.write_records(frame_idx, detections, people, counter.count)
+
+    return len(cache)
+
+
+# --- Pipelined Execution ---
+
+def _queue_put(q, item, stop_event):
+    """Blocking put that gives up once another stage has failed."""
+    while not stop_event.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _queue_get(q, stop_event):
+    """Blocking get that returns _END_OF_STREAM once another stage has failed."""
+    while not stop_event.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _END_OF_STREAM
+
+
+def _stage_worker(name, stage_fn, in_q, out_q, stop_event, errors, batch_size=1):
+    """
+    Generic pipeline stage: pulls up to batch_size items from in_q, applies stage_fn to the
+    list and pushes each returned item to out_q. A partial batch is only processed at the
+    end of the stream. A single worker per stage with FIFO queues keeps frames in order.
+    """
+    try:
+        end_of_stream = False
+        while not end_of_stream:
+            batch = []
+            while len(batch) < batch_size:
+                item = _queue_get(in_q, stop_event)
+                if item is _END_OF_STREAM:
+                    end_of_stream = True
+                    break
+                batch.append(item)
+
+            if not batch:
+                break
+            for result in stage_fn(batch):
+                if not _queue_put(out_q, result, stop_event):
+                    return
+    except Exception as exc:
+        errors.append((name, exc))
+        stop_event.set()
+    finally:
+        _queue_put(out_q, _END_OF_STREAM, stop_event)
+
+
+def _decode_worker(source, out_q, stop_event, errors):
+    """Pushes (source frame number, frame) pairs."""
+    try:
+        while source.isOpened() and not stop_event.is_set():
+            with metrics.stage('decode'):
+                ret, frame = source.read()
+            if not ret:
+                break
+            if not _queue_put(out_q, (source.frame_index, frame), stop_event):
+                return
+    except Exception as exc:
+        errors.append(("decode", exc))
+        stop_event.set()
+    finally:
+        _queue_put(out_q, _END_OF_STREAM, stop_event)
+
+
+def run_pipelined(source, pose_model, counter, outputs, renderer=None, roi_gate=None, clips=None):
+    """
+    Decode, inference, counting/render and encode run on their own threads, connected by
+    bounded queues (cfg.PIPELINE_QUEUE_SIZE) for backpressure. Counting stays on a single
+    thread and sees frames in decode order, so the counts are identical to run_serial.
+    In --no-render mode the last stage only streams analytics records. Event clips are
+    buffered and encoded on the counting thread.
+    """
+    stop_event = threading.Event()
+    errors = []
+
+    decoded_q = queue.Queue(maxsize=cfg.PIPELINE_QUEUE_SIZE)
+    inferred_q = queue.Queue(maxsize=cfg.PIPELINE_QUEUE_SIZE)
+    rendered_q = queue.Queue(maxsize=cfg.PIPELINE_QUEUE_SIZE)
+
+    def infer(items):
+        frames = [frame for _, frame in items]
+        return [(frame_idx, frame, detections) for (frame_idx, frame), detections
+                in zip(items, run_pose_inference(pose_model, frames, roi_gate))]
+
+    def count_and_render(items):
+        results = []
+        for frame_idx, frame, detections in items:
+            results.append((frame_idx, detections) + process_frame(counter, frame_idx, frame, detections, renderer, clips))
+            if outputs.checkpointer is not None:
+                outputs.checkpointer.capture(frame_idx, counter)
+        return results
+
+    workers = [
+        threading.Thread(target=_decode_worker, args=(source, decoded_q, stop_event, errors), daemon=True),
+        threading.Thread(target=_stage_worker, args=("inference", infer, decoded_q, inferred_q, stop_event, errors, cfg.INFERENCE_BATCH_SIZE), daemon=True),
+        threading.Thread(target=_stage_worker, args=("render", count_and_render, inferred_q, rendered_q, stop_event, errors), daemon=True),
+    ]
+    for worker in workers:
+        worker.start()
+
+    # --- ENCODE STAGE (Main Thread) ---
+    frame_count = 0
+    try:
+        while True:
+            item = _queue_get(rendered_q, stop_event)
+            if item is _END_OF_STREAM:
+                break
+            frame_idx, detections, vis_frame, people, current_count = item
+            outputs.write(frame_idx, vis_frame, detections, people, current_count)
+            frame_count += 1
+    except BaseException:
+        stop_event.set()
+        raise
+    finally:
+        for worker in workers:
+            worker.join()
+
+    if errors:
+        stage, exc = errors[0]
+        raise RuntimeError(f"Pipeline stage '{stage}' failed") from exc
+
+    return frame_count
 
-# --- GLOBAL TRACKING STORAGE ---
-unique_sitting_ids = {} 
-next_temp_id = 0 
-temp_trackers = {} 
 
 # --- Main Analysis Function ---
-def analyze_video_for_sitting():
-    global next_temp_id, temp_trackers
-    
+def analyze_video_for_sitting(render=True, events_path=None, pipelined=None,
+                              cache_keypoints=False, replay=False, roi_crop=None, motion_gate=None,
+                              stride=None, decode_width=None, decoder=None, backend=None,
+                              render_every=None, render_width=None, clips=False, resume=False, checkpoint_interval=None,
+                              store_path=None, camera=None, recorded_at=None, video_source=None, pose_model=None):
+    """
+    Counts unique sitting people in video_source (default cfg.VIDEO_SOURCE). Returns a RunSummary.
+
+    render=False is the headless analytics mode: no visualization frames, no VideoWriter,
+    only per-frame/per-track records streamed to events_path (JSONL, or CSV by extension).
+    render_every / render_width (default cfg.RENDER_EVERY_N / cfg.RENDER_WIDTH) annotate only
+    every Nth frame and downscale the output video to a preview width.
+    clips=True writes short annotated clips around every newly counted person (event_clips)
+    instead of the full-length video.
+    Every checkpoint_interval seconds (default cfg.CHECKPOINT_INTERVAL_SECONDS, 0 = off) the
+    frame position, counter state and event log offset are saved to CHECKPOINT_DIR;
+    resume=True continues from that checkpoint (same settings required), appending to the
+    same event log, so the final count equals an uninterrupted run. The checkpoint is deleted
+    when a run completes. Only the counter is checkpointed, so runs with state elsewhere
+    (motion gate, cascade backend, clips, keypoint cache) are neither checkpointed nor resumable.
+    store_path adds the counting results to the SQLite event store there (event_store):
+    count events, tracks and per-minute occupancy, under 'camera' (default
+    cfg.EVENT_STORE_CAMERA) and timestamped from recorded_at, the unix time of the first frame
+    (default: the video file's modification time less its length).
+    pipelined defaults to cfg.USE_PIPELINED_STAGES.
+    cache_keypoints=True also stores every frame's keypoints in the keypoint cache;
+    replay=True skips decoding and inference and counts straight from that cache.
+    roi_crop / motion_gate (default cfg.USE_ROI_CROP / cfg.USE_MOTION_GATE) restrict
+    inference to the bench-zone crop and skip it on frames without motion.
+    stride / decode_width / decoder (default cfg.FRAME_STRIDE / cfg.DECODE_WIDTH /
+    cfg.DECODER_BACKEND) select the frame source: every Nth frame, downscaled on decode.
+    backend (default cfg.INFERENCE_BACKEND) is the pose inference backend, 'torch' or 'onnx';
+    an already loaded pose_model of that backend can be passed in and shared between calls.
+    All counting state belongs to this call, so several videos can be counted in one process.
+    The time to the first counted frame (model load, decoder start, warm-up and the first
+    batch) is reported and returned; a warm pose_model skips the first two.
+    """
+    called_at = time.perf_counter()
+    if video_source is None:
+        video_source = cfg.VIDEO_SOURCE
+    if pipelined is None:
+        pipelined = cfg.USE_PIPELINED_STAGES
+    if roi_crop is None:
+        roi_crop = cfg.USE_ROI_CROP
+    if motion_gate is None:
+        motion_gate = cfg.USE_MOTION_GATE
+    if stride is None:
+        stride = cfg.FRAME_STRIDE
+    if decode_width is None:
+        decode_width = cfg.DECODE_WIDTH
+    if decoder is None:
+        decoder = cfg.DECODER_BACKEND
+    if backend is None:
+        backend = cfg.INFERENCE_BACKEND
+    if checkpoint_interval is None:
+        checkpoint_interval = cfg.CHECKPOINT_INTERVAL_SECONDS
+
     # --- 1. INITIALIZATION ---
-    if not os.path.exists(cfg.VIDEO_SOURCE):
-        print(f"Error: Video file not found at {cfg.VIDEO_SOURCE}.")
+    if not os.path.exists(video_source):
+        print(f"Error: Video file not found at {video_source}.")
         sys.exit(1)
-
-    pose_model = YOLO(cfg.MODEL_NAME)
-    cap = cv2.VideoCapture(cfg.VIDEO_SOURCE) 
-    
-    if not cap.isOpened():
-        print(f"Error: Could not open video source {cfg.VIDEO_SOURCE}")
+    try:
+        zones.configured_zone_map()
+    except (OSError, ValueError) as exc:
+        print(f"Error: Could not load the zones of {cfg.ZONES_CONFIG}: {exc}")
         sys.exit(1)
 
-    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps = cap.get(cv2.CAP_PROP_FPS)
+    cache_path = None
+    if cache_keypoints or replay:
+        cache_path = keypoint_cache.cache_path_for(video_source, backend_model_name(backend))
 
-    # --- VIDEO WRITER SETUP (Unique Name) ---
     os.makedirs(cfg.OUTPUT_DIR, exist_ok=True)
-    
     timestamp = datetime.now().strftime("_%Y%m%d_%H%M%S")
-    
     base_name, ext = os.path.splitext(cfg.OUTPUT_VIDEO_NAME)
-    unique_file_name = f"{base_name}{timestamp}{ext}"
-    unique_save_path = os.path.join(cfg.OUTPUT_DIR, unique_file_name) 
 
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    out = cv2.VideoWriter(unique_save_path, fourcc, fps, (frame_width, frame_height))
+    if replay:
+        cache = keypoint_cache.open_cache(cache_path)
+        if cache is None:
+            print(f"Error: No complete keypoint cache at {cache_path}. Run with --cache-keypoints first.")
+            sys.exit(1)
+
+        if events_path is None:
+            events_path = os.path.join(cfg.OUTPUT_DIR, f"{base_name}{timestamp}_replay_events.{cfg.EVENTS_FORMAT}")
+        outputs = FrameOutputs(sink=open_event_sink(events_path))
+        frame_stride = cache.meta.get('frame_stride', 1)
+        if store_path:
+            # Caches written before 'src_fps' was recorded hold the strided rate only
+            src_fps = cache.meta.get('src_fps') or cache.meta['fps'] * frame_stride
+            outputs.store = open_event_store(store_path, video_source, src_fps, zones.zone_names(), camera=camera,
+                                             recorded_at=recorded_at, frame_stride=frame_stride)
+
+        counter = create_counter(frame_stride=frame_stride)
+        start_time = time.perf_counter()
+        try:
+            frame_count = run_replay(cache, counter, outputs)
+            outputs.finish(counter.count)
+        finally:
+            outputs.close()
+        elapsed = time.perf_counter() - start_time
+
+        print(f"\n--- Replay Complete ---")
+        print(f"Keypoint cache: {cache_path}")
+        print(f"Events saved to: {events_path}")
+        if store_path:
+            print(f"Events stored in: {store_path} (camera '{outputs.store.camera}', video {outputs.store.video_id})")
+        print(f"Replayed {frame_count} frames in {elapsed:.2f}s ({frame_count / max(elapsed, 1e-9):.0f} FPS)")
+        print(f"Total unique people seen sitting: {counter.count}")
+        print_zone_counts(counter)
+        print("-------------------------\n")
+        if metrics.active() is not None:
+            metrics.active().report(elapsed)
+        return RunSummary(frame_count, elapsed, counter.count, named_zone_counts(counter))
+
+    # Everything that changes detections or counting must match to resume a run
+    run_settings = dict(
+        vars(utils.resolve_settings()), frame_stride=stride, decode_width=decode_width, decoder=decoder,
+        model_name=backend_model_name(backend), conf_threshold=cfg.CONF_THRESHOLD, iou_threshold=cfg.IOU_THRESHOLD,
+        roi_crop=roi_crop, motion_gate=motion_gate, frames_to_confirm=cfg.FRAMES_TO_CONFIRM_SITTING,
+        zones_config=cfg.ZONES_CONFIG, zone_grid_size=cfg.ZONE_GRID_SIZE
+    )
+    checkpoint_path = checkpoint_path_for(video_source)
+    # Options whose state a checkpoint does not hold (motion reference, cascade cache, clip ring buffer)
+    not_resumable = [option for option, enabled in (('--motion-gate', motion_gate), ('--backend cascade', backend == 'cascade'),
+                                                    ('--clips', clips), ('--cache-keypoints', cache_keypoints)) if enabled]
+    resume_state = None
+    if resume:
+        if not_resumable:
+            print(f"Error: --resume cannot be combined with {', '.join(not_resumable)}: checkpoints do not hold their state.")
+            sys.exit(1)
+        resume_state = load_checkpoint(checkpoint_path)
+        if resume_state is None:
+            print(f"Error: No checkpoint for {video_source} at {checkpoint_path}.")
+            sys.exit(1)
+        mismatch = settings_mismatch(resume_state, run_settings)
+        if mismatch:
+            print(f"Error: The checkpoint was written with different settings ({', '.join(mismatch)}).")
+            sys.exit(1)
+        if events_path is not None and events_path != resume_state['events_path']:
+            print(f"Error: The checkpointed run writes its events to {resume_state['events_path']}.")
+            sys.exit(1)
+        events_path = resume_state['events_path']
+        if store_path is not None and store_path != resume_state['store_path']:
+            print(f"Error: The checkpointed run stores its events in {resume_state['store_path']}.")
+            sys.exit(1)
+        store_path = resume_state['store_path']
+
+    model_load_seconds = 0.0
+    if pose_model is None:
+        load_start = time.perf_counter()
+        pose_model = create_backend(backend)
+        model_load_seconds = time.perf_counter() - load_start
+
+    # Every frame handed out stays valid until this many more have been decoded, which
+    # must cover a full inference batch plus everything buffered between pipeline stages
+    num_buffers = cfg.INFERENCE_BATCH_SIZE + 1
+    if pipelined:
+        num_buffers += 3 * cfg.PIPELINE_QUEUE_SIZE + 3
+
+    start_frame = resume_state['frame_idx'] + stride if resume_state else 0
+    try:
+        source = open_frame_source(video_source, stride=stride, target_width=decode_width,
+                                   backend=decoder, num_buffers=num_buffers, start_frame=start_frame)
+    except (RuntimeError, ValueError) as exc:
+        print(f"Error: {exc}")
+        sys.exit(1)
+
+    if not source.isOpened():
+        print(f"Error: Could not open video source {video_source}")
+        sys.exit(1)
+
+    if resume_state:
+        counter = pickle.loads(resume_state['counter'])
+    else:
+        counter = create_counter(frame_stride=source.stride)
+    frame_width = source.width
+    frame_height = source.height
+    fps = source.fps
+
+    # One pass on a blank batch first, so graph optimization and allocations are not timed
+    warmup_start = time.perf_counter()
+    pose_model.warmup((frame_height, frame_width, 3), cfg.INFERENCE_BATCH_SIZE)
+    warmup_seconds = time.perf_counter() - warmup_start
+    metrics.reset()
+
+    # --- OUTPUT SETUP (Unique Names) ---
+    outputs = FrameOutputs()
+
+    unique_save_path = None
+    renderer = None
+    if render and not clips:
+        # Rendered frames wait in the rendered queue and the encoder, each in its own preview buffer
+        renderer = FrameRenderer(frame_width, frame_height, every=render_every, preview_width=render_width,
+                                 num_buffers=cfg.PIPELINE_QUEUE_SIZE + 2 if pipelined else 1)
+        unique_file_name = f"{base_name}{timestamp}{ext}"
+        unique_save_path = os.path.join(cfg.OUTPUT_DIR, unique_file_name)
+
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        outputs.out = cv2.VideoWriter(unique_save_path, fourcc, renderer.output_fps(fps), (renderer.width, renderer.height))
+
+    if events_path is None and (clips or not render):
+        events_path = os.path.join(cfg.OUTPUT_DIR, f"{base_name}{timestamp}_events.{cfg.EVENTS_FORMAT}")
+    if events_path:
+        outputs.sink = open_event_sink(events_path, resume_offset=resume_state['events_offset'] if resume_state else None)
+    if store_path:
+        outputs.store = open_event_store(store_path, video_source, source.src_fps, zones.zone_names(), camera=camera,
+                                         recorded_at=recorded_at, frame_stride=source.stride,
+                                         resume_state=resume_state['store_state'] if resume_state else None)
+    if resume_state:
+        outputs.frames_written = resume_state['frames']
+    if checkpoint_interval > 0 and not not_resumable:
+        outputs.checkpointer = Checkpointer(checkpoint_path, {
+            'video_source': video_source, 'settings': run_settings, 'events_path': events_path,
+            'store_path': store_path
+        }, interval=checkpoint_interval)
+
+    if cache_keypoints:
+        outputs.cache_writer = keypoint_cache.KeypointCacheWriter(cache_path, meta={
+            'video_source': video_source,
+            'model_name': pose_model.model_name,
+            'backend': pose_model.name,
+            'conf_threshold': cfg.CONF_THRESHOLD,
+            'iou_threshold': cfg.IOU_THRESHOLD,
+            'frame_width': frame_width,
+            'frame_height': frame_height,
+            'fps': fps,
+            'src_fps': source.src_fps,
+            'frame_stride': source.stride,
+        })
+
+    roi_gate = None
+    if roi_crop or motion_gate:
+        roi_gate = RoiGate(frame_width, frame_height, crop=roi_crop, motion_gate=motion_gate)
+    pose_model.begin_stream(frame_width, frame_height, roi_gate.roi if roi_gate is not None and roi_gate.crop_enabled else None)
+
+    clip_recorder = None
+    if clips:
+        clips_dir = os.path.join(cfg.OUTPUT_DIR, f"{base_name}{timestamp}_clips")
+        clip_recorder = ClipRecorder(clips_dir, source.src_fps, frame_width, frame_height, stride=source.stride, width=render_width)
     # ----------------------------------------------------
 
-    frame_count = 0
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-        
-        frame_count += 1
-        
-        # --- 2. YOLO INFERENCE ---
-        results = pose_model(
-            frame,
-            conf=cfg.CONF_THRESHOLD,
-            iou=cfg.IOU_THRESHOLD,
-            classes=[0],
-            device=cfg.DEVICE, 
-            half=True,
-            verbose=False
-        )
-        
-        vis_frame = frame.copy()
-        keypoints_to_draw = []
-        
-        # Draw the exclusion mask region
-        mask_pixel_x = int(cfg.MONUMENT_MASK_X_MAX * frame_width)
-        cv2.rectangle(vis_frame, (0, 0), (mask_pixel_x, frame_height), (0, 0, 100), -1)
-        cv2.putText(vis_frame, "EXCLUSION ZONE", (10, frame_height - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1, cv2.LINE_AA)
-
-        # --- NEW: DRAW BENCH BOUNDARY BOX (Visualization) ---
-        x_min_px = int(cfg.BENCH_X_MIN * frame_width)
-        x_max_px = int(cfg.BENCH_X_MAX * frame_width)
-        y_min_px = int(cfg.BENCH_Y_MIN * frame_height)
-        y_max_px = int(cfg.BENCH_Y_MAX * frame_height)
-        
-        box_color = (255, 255, 0) 
-        line_thickness = 2
-        
-        # Draw the rectangle with a simple dashed look (for clearer visualization)
-        cv2.line(vis_frame, (x_min_px, y_min_px), (x_max_px, y_min_px), box_color, line_thickness)
-        for x in range(x_min_px, x_max_px, 10): 
-             cv2.line(vis_frame, (x, y_max_px), (x + 5, y_max_px), box_color, line_thickness)
-        cv2.line(vis_frame, (x_min_px, y_min_px), (x_min_px, y_max_px), box_color, line_thickness)
-        cv2.line(vis_frame, (x_max_px, y_min_px), (x_max_px, y_max_px), box_color, line_thickness)
-        
-        cv2.putText(vis_frame, "BENCH ZONE", (x_min_px + 5, y_min_px - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, box_color, 1, cv2.LINE_AA)
-        # ---------------------------------------------------
-        
-        # --- 3. COUNTING & TRACKING LOOP ---
-        current_feedback = "NO DETECTION"
-        current_feedback_color = (128, 0, 0)
-        
-        for result in results:
-            if result.keypoints is None:
-                continue
-                
-            keypoints_pixel_xy = result.keypoints.xy.cpu().numpy()
-            keypoints_normalized_xyn = result.keypoints.xyn.cpu().numpy()
-            
-            for kpts_pixel, kpts_normalized in zip(keypoints_pixel_xy, keypoints_normalized_xyn):
-                
-                # A. MASK CHECK
-                if utils.is_inside_mask(kpts_normalized):
-                    keypoints_to_draw.append((kpts_pixel, (100, 100, 100))) 
-                    current_feedback = "MASKED"
-                    current_feedback_color = (100, 100, 100)
-                    continue
-                
-                # B. SITTING CHECK (Uses combined Posture AND Spatial checks from utils.py)
-                is_person_sitting = utils.is_sitting_heuristic(kpts_normalized, frame_height)
-                
-                # C. SIMPLE TRACKING/ID ASSIGNMENT
-                hip_x_normalized = kpts_normalized[cfg.LEFT_HIP_IDX][0]
-                assigned_id = None
-                
-                for tid, pos in temp_trackers.items():
-                    if abs(pos - hip_x_normalized) < cfg.TRACKING_PROXIMITY_THRESHOLD: 
-                        assigned_id = tid
-                        break
-                
-                if assigned_id is None:
-                    assigned_id = next_temp_id
-                    next_temp_id += 1
-                
-                temp_trackers[assigned_id] = hip_x_normalized
-                
-                # D. UNIQUE COUNTING LOGIC
-                if is_person_sitting and assigned_id not in unique_sitting_ids:
-                    unique_sitting_ids[assigned_id] = True
-                    feedback = f"NEW COUNTED! (ID: {assigned_id})"
-                    color = (0, 100, 255) # Blue-Orange
-                    current_feedback = feedback
-                    current_feedback_color = color
-                elif is_person_sitting:
-                    feedback = f"SITTING (ID: {assigned_id})"
-                    color = (0, 255, 0) # Bright Green
-                    current_feedback = feedback
-                    current_feedback_color = color
-                else:
-                    feedback = "NOT COUNTED"
-                    color = (0, 165, 255) # Orange
-
-                keypoints_to_draw.append((kpts_pixel, color))
-
-                if result.boxes is not None and len(result.boxes.xyxy) > 0:
-                    box = result.boxes.xyxy.cpu().numpy()[0] 
-                    x1, y1 = map(int, box[:2])
-                    cv2.putText(vis_frame, feedback, (x1, y1 - 20), 
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2, cv2.LINE_AA)
-
-
-        # --- 4. FINAL DRAWING & UI ---
-        for kpts, color in keypoints_to_draw:
-            vis_frame = utils.draw_pose(vis_frame, [kpts], color=color)
-        
-        current_count = len(unique_sitting_ids)
-        
-        # Draw Status Boxes
-        cv2.rectangle(vis_frame, (0, 0), (350, 73), (50, 50, 50), -1)
-        cv2.putText(vis_frame, 'UNIQUE SITTING COUNT', (15, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1, cv2.LINE_AA)
-        cv2.putText(vis_frame, str(current_count), (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (255, 255, 255), 2, cv2.LINE_AA)
-        
-        cv2.rectangle(vis_frame, (350, 0), (frame_width, 73), current_feedback_color, -1)
-        (text_width, _), _ = cv2.getTextSize(current_feedback, cv2.FONT_HERSHEY_SIMPLEX, 1, 2)
-        text_x = 350 + ((frame_width - 350) - text_width) // 2 
-        cv2.putText(vis_frame, current_feedback, (text_x, 45), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2, cv2.LINE_AA)
-        
-        # --- 5. WRITE FRAME ---
-        out.write(vis_frame)
-        
-        if frame_count % 100 == 0:
-            print(f"Frames processed: {frame_count}. Current Count: {current_count}")
-
-    # --- 6. CLEANUP ---
-    cap.release()
-    out.release()
-    
+    # --- 2-5. INFERENCE, COUNTING, RENDERING & WRITING ---
+    start_time = time.perf_counter()
+    render_seconds = None
+    try:
+        if pipelined:
+            frame_count = run_pipelined(source, pose_model, counter, outputs, renderer, roi_gate, clip_recorder)
+        else:
+            frame_count, render_seconds = run_serial(source, pose_model, counter, outputs, renderer, roi_gate, clip_recorder)
+        outputs.finish(counter.count)
+    except BaseException:
+        # Never leave a truncated cache behind that looks complete
+        if outputs.cache_writer is not None:
+            outputs.cache_writer.abort()
+            outputs.cache_writer = None
+        raise
+    finally:
+        # --- 6. CLEANUP ---
+        source.release()
+        outputs.close()
+        if clip_recorder is not None:
+            clip_recorder.close()
+    elapsed = time.perf_counter() - start_time
+    time_to_first_frame = outputs.first_frame_at - called_at if outputs.first_frame_at is not None else None
+
+    # Only an interrupted run leaves its checkpoint behind
+    remove_checkpoint(checkpoint_path)
+
     print(f"\n--- Analysis Complete ---")
-    print(f"Output video saved to: {unique_save_path}")
-    print(f"Total unique people seen sitting: {len(unique_sitting_ids)}")
+    if resume_state:
+        print(f"Resumed from the checkpoint of {resume_state['saved_at']} at frame {start_frame} "
+              f"({resume_state['frames']} frames counted before)")
+    if unique_save_path:
+        print(f"Output video saved to: {unique_save_path}")
+    if events_path:
+        print(f"Events saved to: {events_path}")
+    if store_path:
+        print(f"Events stored in: {store_path} (camera '{outputs.store.camera}', video {outputs.store.video_id})")
+    if clip_recorder is not None:
+        print(f"Clips saved to: {clip_recorder.output_dir} ({clip_recorder.clips} clips, {clip_recorder.events} events, "
+              f"{clip_recorder.frames_written} of {frame_count} frames encoded; index: {clip_recorder.index_path})")
+    if cache_keypoints:
+        print(f"Keypoints cached to: {cache_path}")
+    if source.stride > 1 or (frame_width, frame_height) != (source.src_width, source.src_height):
+        print(f"Decoding: every {source.stride} frame(s) at {frame_width}x{frame_height} ({decoder})")
+    if renderer is not None and (renderer.every > 1 or renderer.resize):
+        print(f"Rendering: every {renderer.every} frame(s) at {renderer.width}x{renderer.height} "
+              f"({renderer.frames_rendered} frames annotated)")
+    print(f"Processed {frame_count} frames in {elapsed:.1f}s ({frame_count / max(elapsed, 1e-9):.1f} FPS)")
+    if time_to_first_frame is not None:
+        print(f"Time to first frame: {time_to_first_frame:.2f}s (model load {model_load_seconds:.2f}s, "
+              f"warm-up {warmup_seconds:.2f}s)")
+    if render_seconds:
+        # Estimated speedup of --no-render from the measured render + encode share of wall time
+        render_share = render_seconds / max(elapsed, 1e-9)
+        print(f"Rendering + encoding: {render_seconds:.1f}s ({render_share:.0%} of wall time, "
+              f"--no-render would be ~{1 / max(1 - render_share, 1e-9):.2f}x faster)")
+    if roi_gate is not None:
+        roi_gate.report()
+    if pose_model.name == 'cascade':
+        pose_model.report()
+    print(f"Total unique people seen sitting: {counter.count}")
+    print_zone_counts(counter)
     print("-------------------------\n")
+    if metrics.active() is not None:
+        metrics.active().report(elapsed)
+    return RunSummary(frame_count, elapsed, counter.count, named_zone_counts(counter), time_to_first_frame)
 
 
 if __name__ == "__main__":
-    analyze_video_for_sitting()
+    parser = argparse.ArgumentParser(description="Unique sitting person counter (YOLO pose).")
+    parser.add_argument("--no-render", action="store_true",
+                        help="Headless analytics mode: skip drawing, video encoding and windows.")
+    parser.add_argument("--events", default=None,
+                        help="Path of the JSONL/CSV event log (defaults to OUTPUT_DIR in --no-render mode).")
+    parser.add_argument("--pipelined", action="store_true",
+                        help="Run decode, inference, counting/render and encode on separate threads.")
+    parser.add_argument("--cache-keypoints", action="store_true",
+                        help="Store every frame's keypoints in KEYPOINT_CACHE_DIR for later replays.")
+    parser.add_argument("--replay", action="store_true",
+                        help="Count from the keypoint cache instead of running the model (no video decode).")
+    parser.add_argument("--roi-crop", action="store_true",
+                        help="Run inference only on a padded crop around the bench zone.")
+    parser.add_argument("--motion-gate", action="store_true",
+                        help="Skip inference on frames without motion inside the bench-zone ROI.")
+    parser.add_argument("--stride", type=int, default=None,
+                        help="Process every Nth frame (defaults to FRAME_STRIDE).")
+    parser.add_argument("--decode-width", type=int, default=None,
+                        help="Downscale frames to this width right after decoding (defaults to DECODE_WIDTH).")
+    parser.add_argument("--decoder", choices=['opencv', 'ffmpeg'], default=None,
+                        help="Frame source backend (defaults to DECODER_BACKEND).")
+    parser.add_argument("--backend", choices=['torch', 'onnx', 'cascade'], default=None,
+                        help="Pose inference backend (defaults to INFERENCE_BACKEND).")
+    parser.add_argument("--clips", action="store_true",
+                        help="Write short annotated clips around each newly counted person (plus an index) "
+                             "instead of the full-length video.")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted run from its last checkpoint (same settings and event log).")
+    parser.add_argument("--checkpoint-interval", type=float, default=None,
+                        help="Seconds between checkpoints, 0 = off (defaults to CHECKPOINT_INTERVAL_SECONDS).")
+    parser.add_argument("--store", nargs='?', const=cfg.EVENT_STORE_PATH, default=None,
+                        help="Add the count events and per-minute occupancy to this SQLite event store "
+                             "(defaults to EVENT_STORE_PATH when given without a path).")
+    parser.add_argument("--camera", default=None,
+                        help="Camera name of the stored events (defaults to EVENT_STORE_CAMERA).")
+    parser.add_argument("--recorded-at", default=None,
+                        help="Local ISO date-time of the first frame, for the stored events (defaults to the file modification time less the video length).")
+    parser.add_argument("--render-every", type=int, default=None,
+                        help="Annotate and encode only every Nth frame (defaults to RENDER_EVERY_N).")
+    parser.add_argument("--render-width", type=int, default=None,
+                        help="Downscale the annotated output video to this width (defaults to RENDER_WIDTH).")
+    parser.add_argument("--profile", action="store_true",
+                        help="Time every stage and print a per-stage report at the end (PROFILE_STAGES).")
+    parser.add_argument("--metrics-file", default=None,
+                        help="Write stage metrics in Prometheus text format to this file (defaults to METRICS_FILE).")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve stage metrics at http://localhost:<port>/metrics during the run (defaults to METRICS_PORT).")
+    args = parser.parse_args()
+
+    recorded_at = None
+    if args.recorded_at:
+        try:
+            recorded_at = datetime.fromisoformat(args.recorded_at).timestamp()
+        except ValueError as exc:
+            print(f"Error: {exc}")
+            sys.exit(1)
+
+    metrics_file = args.metrics_file or cfg.METRICS_FILE
+    metrics_port = cfg.METRICS_PORT if args.metrics_port is None else args.metrics_port
+    exporter = None
+    if args.profile or cfg.PROFILE_STAGES or metrics_file or metrics_port:
+        exporter = metrics.MetricsExporter(metrics.enable(), metrics_file, metrics_port)
+
+    try:
+        analyze_video_for_sitting(
+            render=not args.no_render,
+            events_path=args.events,
+            pipelined=args.pipelined or cfg.USE_PIPELINED_STAGES,
+            cache_keypoints=args.cache_keypoints,
+            replay=args.replay,
+            roi_crop=args.roi_crop or cfg.USE_ROI_CROP,
+            motion_gate=args.motion_gate or cfg.USE_MOTION_GATE,
+            stride=args.stride,
+            decode_width=args.decode_width,
+            decoder=args.decoder,
+            backend=args.backend,
+            render_every=args.render_every,
+            render_width=args.render_width,
+            clips=args.clips,
+            resume=args.resume,
+            checkpoint_interval=args.checkpoint_interval,
+            store_path=args.store,
+            camera=args.camera,
+            recorded_at=recorded_at
+        )
+    finally:
+        if exporter is not None:
+            exporter.stop()
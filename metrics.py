@@ -0,0 +1,294 @@
+# metrics.py - Per-stage profiling: latency histograms, throughput counters and Prometheus text export
+
+import bisect
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import config as cfg
+
+# Stages timed by the pipelines, in report order. 'transfer' is turning the model output into
+# numpy FrameDetections (.cpu().numpy() on PyTorch, output decoding + NMS on ONNX Runtime).
+STAGES = ('decode', 'preprocess', 'inference', 'transfer', 'heuristics', 'tracking', 'render', 'encode')
+
+# Prefix of every exported metric name
+METRIC_PREFIX = 'sitting_counter'
+
+# Quantiles of the rolling window exported as a Prometheus summary
+QUANTILES = (0.5, 0.9, 0.99)
+
+_NO_STAGE = nullcontext()
+
+# The process-wide profiler (None = profiling off, every hook is a no-op)
+_profiler = None
+
+
+class _StageStats:
+    """Cumulative histogram, count and sum of one stage, plus a window of its recent samples."""
+
+    __slots__ = ('bucket_counts', 'count', 'total', 'recent')
+
+    def __init__(self, num_buckets, window):
+        self.bucket_counts = [0] * (num_buckets + 1)    # last bucket is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=window)
+
+
+class _StageTimer:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+
+
+class Profiler:
+    """
+    Times pipeline stages and counts throughput. Every stage keeps a latency histogram over
+    the whole run (cfg.METRICS_BUCKETS, in seconds) and its last cfg.METRICS_WINDOW samples
+    for rolling percentiles. Thread-safe, so the pipelined mode and the server's reader
+    threads can record concurrently.
+    """
+
+    def __init__(self, buckets=None, window=None):
+        self.buckets = tuple(sorted(cfg.METRICS_BUCKETS if buckets is None else buckets))
+        self.window = cfg.METRICS_WINDOW if window is None else window
+        self.started_at = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+        self.gauges = {}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """Drops everything recorded so far (e.g. the model warm-up) and restarts the clock."""
+        with self._lock:
+            self.started_at = time.perf_counter()
+            self.stages = {}
+            self.counters = {}
+            self.gauges = {}
+
+    def stage(self, name):
+        """Context manager timing one call of stage 'name'."""
+        return _StageTimer(self, name)
+
+    def record(self, name, seconds):
+        with self._lock:
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = _StageStats(len(self.buckets), self.window)
+            stats.bucket_counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            stats.count += 1
+            stats.total += seconds
+            stats.recent.append(seconds)
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def gauge(self, name, value):
+        self.gauges[name] = value
+
+    def _ordered_stages(self):
+        names = [name for name in STAGES if name in self.stages]
+        return names + sorted(name for name in self.stages if name not in STAGES)
+
+    def prometheus_text(self):
+        """All metrics in the Prometheus text exposition format."""
+        uptime = time.perf_counter() - self.started_at
+        lines = []
+        with self._lock:
+            histogram = f"{METRIC_PREFIX}_stage_seconds"
+            lines += [f"# HELP {histogram} Time spent per call of each pipeline stage.",
+                      f"# TYPE {histogram} histogram"]
+            for name in self._ordered_stages():
+                stats = self.stages[name]
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float('inf'),), stats.bucket_counts):
+                    cumulative += bucket_count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{histogram}_bucket{{stage="{name}",le="{le}"}} {cumulative}')
+                lines.append(f'{histogram}_sum{{stage="{name}"}} {stats.total:.6f}')
+                lines.append(f'{histogram}_count{{stage="{name}"}} {stats.count}')
+
+            summary = f"{METRIC_PREFIX}_stage_recent_seconds"
+            lines += [f"# HELP {summary} Stage latency quantiles over the last {self.window} calls.",
+                      f"# TYPE {summary} summary"]
+            for name in self._ordered_stages():
+                stats = self.stages[name]
+                recent = np.fromiter(stats.recent, dtype=np.float64)
+                for quantile, value in zip(QUANTILES, np.quantile(recent, QUANTILES)):
+                    lines.append(f'{summary}{{stage="{name}",quantile="{quantile}"}} {value:.6f}')
+                lines.append(f'{summary}_sum{{stage="{name}"}} {recent.sum():.6f}')
+                lines.append(f'{summary}_count{{stage="{name}"}} {len(recent)}')
+
+            for name, value in sorted(self.counters.items()):
+                metric = f"{METRIC_PREFIX}_{name}_total"
+                lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+            gauges = dict(self.gauges, uptime_seconds=uptime,
+                          fps=self.counters.get('frames', 0) / max(uptime, 1e-9))
+            for name, value in sorted(gauges.items()):
+                metric = f"{METRIC_PREFIX}_{name}"
+                lines += [f"# TYPE {metric} gauge", f"{metric} {value:g}"]
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """Writes prometheus_text() to path atomically (e.g. for node_exporter's textfile collector)."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+    def summary(self):
+        """Per-stage calls, mean / p50 / p95 ms per call (p50/p95 over the rolling window) and total seconds."""
+        with self._lock:
+            summary = {}
+            for name in self._ordered_stages():
+                stats = self.stages[name]
+                p50, p95 = np.quantile(np.fromiter(stats.recent, dtype=np.float64), (0.5, 0.95)) * 1000.0
+                summary[name] = {'calls': stats.count, 'mean_ms': round(stats.total / stats.count * 1000.0, 4),
+                                 'p50_ms': round(p50, 4), 'p95_ms': round(p95, 4), 'total_s': round(stats.total, 4)}
+            return summary
+
+    def report(self, wall_seconds=None):
+        """
+        End-of-run table: calls, mean / p50 / p95 per call, total time and share of wall time
+        for every stage. In the pipelined mode stages overlap, so the stage with the highest
+        share is the bottleneck.
+        """
+        wall_seconds = wall_seconds or time.perf_counter() - self.started_at
+        frames = self.counters.get('frames', 0)
+        print(f"--- Stage Profile ({frames} frames, {wall_seconds:.1f}s) ---")
+        print(f"{'stage':<12} {'calls':>8} {'mean ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'total s':>8} {'wall':>6}")
+        for name, stats in self.summary().items():
+            print(f"{name:<12} {stats['calls']:>8} {stats['mean_ms']:>9.2f} {stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} "
+                  f"{stats['total_s']:>8.2f} {stats['total_s'] / max(wall_seconds, 1e-9):>6.0%}")
+        print("-------------------------\n")
+
+
+class MetricsServer:
+    """Serves GET /metrics (Prometheus text) on a background thread."""
+
+    def __init__(self, profiler, port):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') != '/metrics':
+                    self.send_error(404)
+                    return
+                send_prometheus(self, profiler)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('', port), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class MetricsExporter:
+    """
+    Exports a profiler while a run is going: rewrites 'path' every 'interval' seconds and
+    serves /metrics on 'port' (either can be None). stop() writes the file a last time.
+    """
+
+    def __init__(self, profiler, path=None, port=None, interval=None):
+        self.profiler = profiler
+        self.path = path
+        self.interval = cfg.METRICS_INTERVAL if interval is None else interval
+        self.server = MetricsServer(profiler, port).start() if port else None
+        self._stop_event = threading.Event()
+        self._thread = None
+        if path:
+            self._thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.profiler.write(self.path)
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self.profiler.write(self.path)
+        if self.server is not None:
+            self.server.stop()
+
+
+def send_prometheus(handler, profiler):
+    """Writes profiler's Prometheus text as the response of a BaseHTTPRequestHandler."""
+    payload = profiler.prometheus_text().encode('utf-8')
+    handler.send_response(200)
+    handler.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+    handler.send_header('Content-Length', str(len(payload)))
+    handler.end_headers()
+    handler.wfile.write(payload)
+
+
+# --- Process-wide hooks (no-ops unless enable() was called) ---
+
+def enable(profiler=None):
+    """Turns profiling on for this process. Returns the active Profiler."""
+    global _profiler
+    _profiler = profiler or Profiler()
+    return _profiler
+
+
+def disable():
+    global _profiler
+    _profiler = None
+
+
+def active():
+    """The active Profiler, or None when profiling is off."""
+    return _profiler
+
+
+def reset():
+    profiler = _profiler
+    if profiler is not None:
+        profiler.reset()
+
+
+def stage(name):
+    """'with metrics.stage("decode"):' times the block when profiling is on."""
+    profiler = _profiler
+    return profiler.stage(name) if profiler is not None else _NO_STAGE
+
+
+def record(name, seconds):
+    profiler = _profiler
+    if profiler is not None:
+        profiler.record(name, seconds)
+
+
+def count(name, amount=1):
+    profiler = _profiler
+    if profiler is not None:
+        profiler.count(name, amount)
+
+
+def gauge(name, value):
+    profiler = _profiler
+    if profiler is not None:
+        profiler.gauge(name, value)
@@ -0,0 +1,248 @@
+# renderer.py - Annotated output frames: cached zone overlays, batched skeletons, preview size and rate
+
+import cv2
+import numpy as np
+import config as cfg
+import utils
+import zones
+from frame_source import output_size
+
+# Side (pixels) of the tiles a static layer's coverage is classified in
+LAYER_TILE = 16
+
+
+def draw_zones(image, ink=None):
+    """
+    Exclusion zone and dashed bench box with their labels, or the polygon zones of
+    cfg.ZONES_CONFIG. 'ink' replaces every colour (coverage masks).
+    """
+    frame_height, frame_width = image.shape[:2]
+
+    # Draw the exclusion mask region
+    mask_pixel_x = int(cfg.MONUMENT_MASK_X_MAX * frame_width)
+    cv2.rectangle(image, (0, 0), (mask_pixel_x, frame_height), ink or (0, 0, 100), -1)
+    cv2.putText(image, "EXCLUSION ZONE", (10, frame_height - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, ink or (255, 255, 255), 1, cv2.LINE_AA)
+
+    zone_map = zones.configured_zone_map()
+    if zone_map is not None:
+        _draw_polygon_zones(image, zone_map, ink)
+        return
+
+    # --- DRAW BENCH BOUNDARY BOX (Visualization) ---
+    x_min_px = int(cfg.BENCH_X_MIN * frame_width)
+    x_max_px = int(cfg.BENCH_X_MAX * frame_width)
+    y_min_px = int(cfg.BENCH_Y_MIN * frame_height)
+    y_max_px = int(cfg.BENCH_Y_MAX * frame_height)
+
+    box_color = ink or (255, 255, 0)
+    line_thickness = 2
+
+    # Solid top and sides, dashed bottom edge (5 px dashes every 10 px)
+    cv2.polylines(image, [np.array([(x_min_px, y_max_px), (x_min_px, y_min_px), (x_max_px, y_min_px), (x_max_px, y_max_px)])],
+                  False, box_color, line_thickness)
+    dash_x = np.arange(x_min_px, x_max_px, 10)
+    if len(dash_x):
+        dashes = np.stack([np.stack([dash_x, np.full_like(dash_x, y_max_px)], axis=-1),
+                           np.stack([dash_x + 5, np.full_like(dash_x, y_max_px)], axis=-1)], axis=1)
+        cv2.polylines(image, dashes.astype(np.int32), False, box_color, line_thickness)
+
+    cv2.putText(image, "BENCH ZONE", (x_min_px + 5, y_min_px - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, box_color, 1, cv2.LINE_AA)
+
+
+def _draw_polygon_zones(image, zone_map, ink=None):
+    """Filled exclude zones, then include zone outlines with their names."""
+    frame_height, frame_width = image.shape[:2]
+    size = np.array([frame_width, frame_height])
+    polygons = [(zone, np.round(zone.polygon * size).astype(np.int32)) for zone in zone_map.zones]
+
+    excluded = [points for zone, points in polygons if zone.kind == 'exclude']
+    if excluded:
+        cv2.fillPoly(image, excluded, ink or (0, 0, 100))
+    included = [(zone, points) for zone, points in polygons if zone.kind == 'include']
+    cv2.polylines(image, [points for _, points in included], True, ink or (255, 255, 0), 2)
+    for zone, points in included:
+        x, y = points[np.argmin(points[:, 1])]
+        cv2.putText(image, zone.name.upper(), (int(x) + 5, int(y) - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, ink or (255, 255, 0), 1, cv2.LINE_AA)
+
+
+def draw_count_box(image, ink=None):
+    """Background and title of the unique count box (the number itself changes every frame)."""
+    cv2.rectangle(image, (0, 0), (350, 73), ink or (50, 50, 50), -1)
+    cv2.putText(image, 'UNIQUE SITTING COUNT', (15, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, ink or (255, 255, 255), 1, cv2.LINE_AA)
+
+
+class StaticLayer:
+    """
+    Drawing that is identical on every frame of a given size, rendered once by draw(image, ink)
+    into a layer plus its coverage, and composited into each frame in place.
+
+    The coverage is classified in LAYER_TILE tiles, and runs of neighbouring tiles of the
+    same kind are merged into a few rectangles: fully covered ones are plain copies, the
+    others masked copies, or alpha blends where anti-aliased text leaves partial coverage.
+    Compositing is then a handful of numpy copies over the pixels the layer actually touches.
+    """
+
+    def __init__(self, width, height, draw, tile=LAYER_TILE):
+        self.width = width
+        self.height = height
+        layer = np.zeros((height, width, 3), dtype=np.uint8)
+        coverage = np.zeros((height, width), dtype=np.uint8)
+        draw(layer)
+        draw(coverage, ink=255)
+
+        # Tile kinds: 0 = empty, 1 = fully covered, 2 = partly covered, 3 = anti-aliased
+        rows, cols = -(-height // tile), -(-width // tile)
+        padded = np.zeros((rows * tile, cols * tile), dtype=np.uint8)
+        padded[:height, :width] = coverage
+        tiles = padded.reshape(rows, tile, cols, tile).swapaxes(1, 2).reshape(rows, cols, -1)
+        full = (tiles == 255).all(axis=-1)
+        kinds = np.where(tiles.any(axis=-1), 2, 0)
+        kinds[full] = 1
+        kinds[((tiles != 0) & (tiles != 255)).any(axis=-1)] = 3
+
+        self.copies = []        # (slices, layer)
+        self.masked = []        # (slices, layer, uint8 mask)
+        self.blended = []       # (slices, premultiplied layer, 255 - coverage)
+        for kind, y0, y1, x0, x1 in _merge_tiles(kinds):
+            region = (slice(y0 * tile, min(y1 * tile, height)), slice(x0 * tile, min(x1 * tile, width)))
+            region_layer = layer[region].copy()
+            region_coverage = coverage[region]
+            if kind == 1:
+                self.copies.append((region, region_layer))
+            elif kind == 2:
+                self.masked.append((region, region_layer, (region_coverage == 255).astype(np.uint8)))
+            else:
+                # Drawn on black, anti-aliased pixels already hold colour * coverage / 255
+                inverse = (255 - region_coverage[..., None]).astype(np.uint16)
+                self.blended.append((region, region_layer.astype(np.uint16), inverse))
+
+    def composite(self, frame):
+        for region, region_layer in self.copies:
+            frame[region] = region_layer
+        for region, region_layer, mask in self.masked:
+            # cv2.copyTo writes into the frame view (several times faster than np.copyto(where=))
+            cv2.copyTo(region_layer, mask, frame[region])
+        for region, region_layer, inverse in self.blended:
+            target = frame[region]
+            blended = (target * inverse + 127) // 255 + region_layer
+            np.minimum(blended, 255, out=blended)
+            target[...] = blended
+        return frame
+
+
+def _merge_tiles(kinds):
+    """
+    Rectangles (kind, row0, row1, col0, col1) of tiles covering every non-empty tile: runs
+    of one kind along each row, then identical runs of consecutive rows merged together.
+    """
+    open_runs = {}      # (kind, col0, col1) -> first row
+    rectangles = []
+    for row in range(kinds.shape[0] + 1):
+        runs = set()
+        if row < kinds.shape[0]:
+            line = kinds[row]
+            col = 0
+            while col < len(line):
+                end = col + 1
+                while end < len(line) and line[end] == line[col]:
+                    end += 1
+                if line[col]:
+                    runs.add((int(line[col]), col, end))
+                col = end
+        for run in list(open_runs):
+            if run not in runs:
+                kind, col0, col1 = run
+                rectangles.append((kind, open_runs.pop(run), row, col0, col1))
+        for run in runs:
+            open_runs.setdefault(run, row)
+    return rectangles
+
+
+class FrameRenderer:
+    """
+    Draws the annotated output frames of one video: zones, per-person labels, skeletons and
+    status boxes.
+
+    The static parts (zones, count box) are StaticLayers built once, the skeletons of all
+    people are drawn with utils.draw_skeletons, and everything is drawn straight into the
+    decoded frame, which nothing reads after counting. Only every 'every'-th frame is
+    rendered (default cfg.RENDER_EVERY_N; the output video then plays at fps / every), and
+    with 'preview_width' (default cfg.RENDER_WIDTH) frames are downscaled into a rotating pool
+    of 'num_buffers' preview buffers first, which must cover every rendered frame still
+    waiting to be encoded.
+    """
+
+    def __init__(self, frame_width, frame_height, every=None, preview_width=None, num_buffers=1):
+        self.every = max(1, int(cfg.RENDER_EVERY_N if every is None else every))
+        preview_width = cfg.RENDER_WIDTH if preview_width is None else preview_width
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+        self.width, self.height = output_size(frame_width, frame_height, preview_width)
+        self.scale = np.array([self.width / frame_width, self.height / frame_height])
+        self.resize = (self.width, self.height) != (frame_width, frame_height)
+        self._buffers = [np.empty((self.height, self.width, 3), dtype=np.uint8) for _ in range(num_buffers)] if self.resize else []
+        self._next_buffer = 0
+
+        self.zones = StaticLayer(self.width, self.height, draw_zones)
+        self.count_box = StaticLayer(self.width, self.height, draw_count_box)
+        self.frames_seen = 0
+        self.frames_rendered = 0
+
+    def output_fps(self, fps):
+        return fps / self.every
+
+    def due(self):
+        """Called once per counted frame: whether this one is rendered."""
+        due = self.frames_seen % self.every == 0
+        self.frames_seen += 1
+        return due
+
+    def render(self, frame, people, current_feedback, current_feedback_color, current_count):
+        """Draws the annotations of one frame in place (or into a preview buffer) and returns it."""
+        if self.resize:
+            vis_frame = self._buffers[self._next_buffer]
+            self._next_buffer = (self._next_buffer + 1) % len(self._buffers)
+            self.fit(frame, vis_frame)
+        else:
+            vis_frame = frame
+        return self.draw(vis_frame, people, current_feedback, current_feedback_color, current_count)
+
+    def fit(self, frame, dst):
+        """Copies a decoded frame into dst, an array of the output size (downscaled for a preview)."""
+        if self.resize:
+            # Bilinear: several times cheaper than INTER_AREA, good enough for a preview
+            cv2.resize(frame, (self.width, self.height), dst=dst, interpolation=cv2.INTER_LINEAR)
+        else:
+            np.copyto(dst, frame)
+        return dst
+
+    def draw(self, vis_frame, people, current_feedback, current_feedback_color, current_count):
+        """Draws the annotations in place onto a frame of the output size (people in decoded frame pixels)."""
+        self.frames_rendered += 1
+        self.zones.composite(vis_frame)
+
+        # --- PER-PERSON LABELS ---
+        for person in people:
+            if person.feedback is not None and person.box is not None:
+                x1, y1 = (person.box[:2] * self.scale).astype(int)
+                cv2.putText(vis_frame, person.feedback, (int(x1), int(y1) - 20),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, person.color, 2, cv2.LINE_AA)
+
+        # --- SKELETONS ---
+        if people:
+            keypoints = np.stack([person.kpts_pixel for person in people])
+            if self.resize:
+                # Missing keypoints stay at (0, 0)
+                keypoints = keypoints * self.scale
+            utils.draw_skeletons(vis_frame, keypoints, [person.color for person in people])
+
+        # Draw Status Boxes
+        self.count_box.composite(vis_frame)
+        cv2.putText(vis_frame, str(current_count), (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (255, 255, 255), 2, cv2.LINE_AA)
+
+        cv2.rectangle(vis_frame, (350, 0), (self.width, 73), current_feedback_color, -1)
+        (text_width, _), _ = cv2.getTextSize(current_feedback, cv2.FONT_HERSHEY_SIMPLEX, 1, 2)
+        text_x = 350 + ((self.width - 350) - text_width) // 2
+        cv2.putText(vis_frame, current_feedback, (text_x, 45), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2, cv2.LINE_AA)
+
+        return vis_frame
@@ -0,0 +1,113 @@
+# roi.py - Bench-zone ROI cropping and frame-difference motion gating
+
+import cv2
+import numpy as np
+import config as cfg
+import utils
+import zones
+
+
+def compute_roi(frame_width, frame_height):
+    """
+    Pixel rectangle (x0, y0, x1, y1) that covers the bench zone (or all include zones) plus cfg.ROI_PADDING
+    (left, top, right, bottom as fractions of the frame), so whole bodies of people whose
+    hips are on the bench stay inside the crop. Never extends into the exclusion zone.
+    """
+    pad_left, pad_top, pad_right, pad_bottom = cfg.ROI_PADDING
+    bench_x_min, bench_y_min, bench_x_max, bench_y_max = zones.bench_bounds()
+
+    x_min = max(bench_x_min - pad_left, cfg.MONUMENT_MASK_X_MAX, 0.0)
+    y_min = max(bench_y_min - pad_top, 0.0)
+    x_max = min(bench_x_max + pad_right, 1.0)
+    y_max = min(bench_y_max + pad_bottom, 1.0)
+
+    return (
+        int(x_min * frame_width), int(y_min * frame_height),
+        int(np.ceil(x_max * frame_width)), int(np.ceil(y_max * frame_height))
+    )
+
+
+class RoiGate:
+    """
+    Decides, per frame, what goes through the pose model.
+
+    - crop: only the ROI around the bench zone is sent to the model, and the keypoints
+      are mapped back to full-frame pixel and normalized coordinates.
+    - motion_gate: a cheap grayscale frame difference inside the ROI, against the last
+      frame that was actually inferred. Below cfg.MOTION_THRESHOLD the frame is skipped
+      and the last detections are carried forward, so tracking and counting continue.
+      Inference is forced at least every cfg.MOTION_MAX_SKIPPED_FRAMES frames.
+    """
+
+    def __init__(self, frame_width, frame_height, crop=True, motion_gate=True):
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+        self.crop_enabled = crop
+        self.motion_gate_enabled = motion_gate
+        self.roi = compute_roi(frame_width, frame_height)
+
+        self._reference = None
+        self._skipped_in_a_row = 0
+        self.last_detections = utils.empty_detections()
+
+        self.inferred_frames = 0
+        self.skipped_frames = 0
+
+    def _motion_signature(self, frame):
+        x0, y0, x1, y1 = self.roi
+        region = frame[y0:y1, x0:x1]
+        scale = cfg.MOTION_DOWNSCALE_WIDTH / max(region.shape[1], 1)
+        small = cv2.resize(region, None, fx=min(scale, 1.0), fy=min(scale, 1.0), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def should_infer(self, frame):
+        """True if the frame must go through the model (updates the motion reference)."""
+        if not self.motion_gate_enabled:
+            self.inferred_frames += 1
+            return True
+
+        signature = self._motion_signature(frame)
+        changed = (
+            self._reference is None
+            or self._skipped_in_a_row >= cfg.MOTION_MAX_SKIPPED_FRAMES
+            or float(cv2.absdiff(signature, self._reference).mean()) > cfg.MOTION_THRESHOLD
+        )
+
+        if changed:
+            self._reference = signature
+            self._skipped_in_a_row = 0
+            self.inferred_frames += 1
+        else:
+            self._skipped_in_a_row += 1
+            self.skipped_frames += 1
+        return changed
+
+    def model_input(self, frame):
+        """The image handed to the pose model: the ROI crop, or the full frame."""
+        if not self.crop_enabled:
+            return frame
+        x0, y0, x1, y1 = self.roi
+        return frame[y0:y1, x0:x1]
+
+    def to_frame_coordinates(self, detections):
+        """Maps detections made on the ROI crop back to full-frame coordinates."""
+        if not self.crop_enabled:
+            return detections
+
+        x0, y0, _, _ = self.roi
+        offset = np.array([x0, y0], dtype=np.float32)
+
+        # Missing keypoints stay at (0, 0) so the heuristics still treat them as missing
+        missing = (detections.xy == 0).all(axis=-1, keepdims=True)
+        xy = np.where(missing, 0, detections.xy + offset).astype(np.float32)
+        xyn = (xy / np.array([self.frame_width, self.frame_height], dtype=np.float32)).astype(np.float32)
+        boxes = detections.boxes + np.tile(offset, 2)
+
+        return utils.FrameDetections(xy, xyn, detections.conf, boxes)
+
+    def report(self):
+        total = self.inferred_frames + self.skipped_frames
+        if total:
+            print(f"Motion gate: inferred {self.inferred_frames} of {total} frames "
+                  f"({self.skipped_frames / total:.0%} skipped)")
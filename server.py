@@ -0,0 +1,315 @@
+# server.py - Multi-camera counting server: one shared pose model, dynamic cross-stream batching
+
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import config as cfg
+import metrics
+import utils
+from counter import create_counter
+from event_sink import open_event_sink
+from frame_source import open_frame_source
+from inference_backend import create_backend
+from main_pipeline import count_people, named_zone_counts
+
+
+class Stream:
+    """
+    One camera/video: its reader settings, counting settings (utils.resolve_settings
+    overrides, e.g. its own bench zone and mask), its SittingCounter and its event log.
+    Only the batcher thread counts, so the counting state needs no lock; the status
+    fields read by the HTTP endpoint are plain ints/floats.
+    """
+
+    def __init__(self, name, video_source, settings=None, stride=None, decode_width=None, events_path=None):
+        self.name = name
+        self.video_source = video_source
+        self.settings = utils.resolve_settings(settings)
+        self.stride = cfg.FRAME_STRIDE if stride is None else stride
+        self.decode_width = cfg.DECODE_WIDTH if decode_width is None else decode_width
+        self.events_path = events_path
+
+        self.counter = create_counter(
+            frame_stride=self.stride,
+            proximity=self.settings.TRACKING_PROXIMITY_THRESHOLD,
+            frames_to_confirm=self.settings.FRAMES_TO_CONFIRM_SITTING
+        )
+        self.sink = open_event_sink(events_path) if events_path else None
+
+        self.frames_decoded = 0
+        self.frames_counted = 0
+        self.last_frame_idx = -1
+        self.started_at = None
+        self.finished = False
+        self.error = None
+
+    def count(self, frame_idx, detections):
+        """Counting step for one inferred frame (called from the batcher thread, in frame order)."""
+        people, _, _ = count_people(self.counter, frame_idx, detections, settings=self.settings)
+        if self.sink is not None:
+            tracks = [(p.track_id, p.sitting, p.newly_counted) for p in people if p.track_id is not None]
+            self.sink.write_frame(frame_idx, tracks, self.counter.count)
+        self.frames_counted += 1
+        self.last_frame_idx = frame_idx
+        metrics.count('frames')
+
+    def status(self):
+        elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+        return {
+            'name': self.name,
+            'source': self.video_source,
+            'unique_sitting_count': self.counter.count,
+            'zone_counts': named_zone_counts(self.counter),
+            'frames_counted': self.frames_counted,
+            'last_frame': self.last_frame_idx,
+            'fps': round(self.frames_counted / elapsed, 2) if elapsed else 0.0,
+            'finished': self.finished,
+            'error': self.error,
+        }
+
+    def close(self):
+        if self.sink is not None:
+            self.sink.close()
+
+
+def read_stream(stream, requests, stop_event, realtime=False, num_buffers=8):
+    """
+    Reader thread of one stream: decodes frames and queues (stream, frame_idx, frame) for
+    the batcher; (stream, None, None) marks the end. With realtime=True frames are released
+    at the source frame rate, like a live camera.
+    """
+    source = None
+    try:
+        source = open_frame_source(stream.video_source, stride=stream.stride, target_width=stream.decode_width,
+                                   backend=cfg.DECODER_BACKEND, num_buffers=num_buffers)
+        if not source.isOpened():
+            raise RuntimeError(f"Could not open video source {stream.video_source}")
+
+        stream.started_at = time.perf_counter()
+        while not stop_event.is_set():
+            with metrics.stage('decode'):
+                ret, frame = source.read()
+            if not ret:
+                break
+            if realtime and source.src_fps:
+                delay = stream.started_at + source.frame_index / source.src_fps - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            stream.frames_decoded += 1
+            requests.put((stream, source.frame_index, frame))
+    except Exception as exc:
+        stream.error = str(exc)
+        print(f"Error: Stream '{stream.name}' failed: {exc}")
+    finally:
+        if source is not None:
+            source.release()
+        requests.put((stream, None, None))
+
+
+def gather_batch(requests, max_batch_size, max_wait):
+    """
+    Dynamic batching: blocks for the first pending frame of any stream, then keeps taking
+    frames until max_batch_size frames are gathered or max_wait seconds have passed.
+    """
+    batch = [requests.get()]
+    deadline = time.perf_counter() + max_wait
+    while len(batch) < max_batch_size:
+        remaining = deadline - time.perf_counter()
+        try:
+            batch.append(requests.get(timeout=remaining) if remaining > 0 else requests.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+
+def serve(streams, pose_model, max_batch_size=None, max_wait_ms=None, realtime=False):
+    """
+    Runs all streams to completion through one shared pose model. Each stream is decoded on
+    its own reader thread; this thread gathers pending frames from every stream into dynamic
+    batches, runs the model once per batch and hands each result to its stream's counter.
+    Returns (batches, frames_inferred).
+    """
+    max_batch_size = max_batch_size or cfg.SERVER_MAX_BATCH_SIZE
+    max_wait = (cfg.SERVER_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000.0
+
+    # Readers block once SERVER_QUEUE_SIZE frames are pending. A decoded frame buffer stays
+    # valid until num_buffers more frames of its stream have been read, which must cover
+    # everything that can be queued or batched meanwhile.
+    requests = queue.Queue(maxsize=cfg.SERVER_QUEUE_SIZE)
+    num_buffers = cfg.SERVER_QUEUE_SIZE + max_batch_size + 2
+    stop_event = threading.Event()
+
+    readers = [
+        threading.Thread(target=read_stream, args=(stream, requests, stop_event, realtime, num_buffers),
+                         name=f"reader-{stream.name}", daemon=True)
+        for stream in streams
+    ]
+    for reader in readers:
+        reader.start()
+
+    batches = frames_inferred = 0
+    active = len(streams)
+    try:
+        while active:
+            batch = gather_batch(requests, max_batch_size, max_wait)
+
+            frames = []
+            for stream, frame_idx, frame in batch:
+                if frame_idx is None:
+                    stream.finished = True
+                    active -= 1
+                else:
+                    frames.append((stream, frame_idx, frame))
+            if not frames:
+                continue
+
+            # One model call for the frames of all streams; results go back in queue order,
+            # which is frame order within every stream
+            detections = pose_model.predict([frame for _, _, frame in frames])
+            for (stream, frame_idx, _), frame_detections in zip(frames, detections):
+                stream.count(frame_idx, frame_detections)
+
+            batches += 1
+            frames_inferred += len(frames)
+    finally:
+        stop_event.set()
+        # Unblock readers waiting on a full queue
+        while any(reader.is_alive() for reader in readers):
+            try:
+                requests.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+    return batches, frames_inferred
+
+
+class StatusServer:
+    """
+    Per-stream results over HTTP (background thread):
+      GET /streams         -> JSON list of every stream's status
+      GET /streams/<name>  -> JSON status of one stream
+      GET /metrics         -> stage metrics in Prometheus text format (with --profile)
+    """
+
+    def __init__(self, streams, port):
+        streams_by_name = {stream.name: stream for stream in streams}
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.rstrip('/')
+                if path == '/metrics' and metrics.active() is not None:
+                    metrics.send_prometheus(self, metrics.active())
+                    return
+                if path == '/streams':
+                    body = [stream.status() for stream in streams]
+                elif path.startswith('/streams/') and path[len('/streams/'):] in streams_by_name:
+                    body = streams_by_name[path[len('/streams/'):]].status()
+                else:
+                    self.send_error(404)
+                    return
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('', port), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def load_streams(path, events_dir=None):
+    """
+    Streams from a JSON file: a list of {"name", "source", optional "settings" (keys of
+    utils.SETTING_KEYS), optional "stride" / "decode_width"}. With events_dir, each stream
+    writes its event log to <events_dir>/<name>.<EVENTS_FORMAT>.
+    """
+    with open(path, encoding='utf-8') as f:
+        entries = json.load(f)
+
+    streams = []
+    for i, entry in enumerate(entries):
+        name = entry.get('name') or f"stream{i}"
+        events_path = os.path.join(events_dir, f"{name}.{cfg.EVENTS_FORMAT}") if events_dir else None
+        streams.append(Stream(name, entry['source'], settings=entry.get('settings'),
+                              stride=entry.get('stride'), decode_width=entry.get('decode_width'),
+                              events_path=events_path))
+
+    names = [stream.name for stream in streams]
+    if len(set(names)) != len(names):
+        raise ValueError("Stream names must be unique")
+    return streams
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count unique sitting people on many streams with one shared pose model.")
+    parser.add_argument("streams", help="JSON file listing the streams (name, source, optional settings).")
+    parser.add_argument("--realtime", action="store_true", help="Release frames of local files at their real-time rate.")
+    parser.add_argument("--max-batch", type=int, default=None, help="Max frames per model call (defaults to SERVER_MAX_BATCH_SIZE).")
+    parser.add_argument("--max-wait-ms", type=float, default=None,
+                        help="Max time to wait for a batch to fill (defaults to SERVER_MAX_WAIT_MS).")
+    parser.add_argument("--port", type=int, default=None, help="Port of the per-stream status endpoint (defaults to SERVER_PORT, 0 = off).")
+    parser.add_argument("--backend", choices=['torch', 'onnx'], default=None,
+                        help="Pose inference backend (defaults to INFERENCE_BACKEND).")
+    parser.add_argument("--profile", action="store_true",
+                        help="Time every stage, serve /metrics on the status port and print a per-stage report.")
+    args = parser.parse_args()
+
+    events_dir = os.path.join(cfg.OUTPUT_DIR, datetime.now().strftime("server_%Y%m%d_%H%M%S"))
+    os.makedirs(events_dir, exist_ok=True)
+    try:
+        streams = load_streams(args.streams, events_dir)
+    except (OSError, ValueError, KeyError) as exc:
+        print(f"Error: Could not load streams from {args.streams}: {exc}")
+        sys.exit(1)
+
+    pose_model = create_backend(args.backend)
+    if args.profile or cfg.PROFILE_STAGES:
+        metrics.enable()
+    port = cfg.SERVER_PORT if args.port is None else args.port
+    status_server = StatusServer(streams, port).start() if port else None
+    if status_server is not None:
+        print(f"Per-stream status at http://localhost:{port}/streams")
+
+    start_time = time.perf_counter()
+    try:
+        batches, frames_inferred = serve(streams, pose_model, args.max_batch, args.max_wait_ms, args.realtime)
+    finally:
+        for stream in streams:
+            stream.close()
+        if status_server is not None:
+            status_server.stop()
+    elapsed = time.perf_counter() - start_time
+
+    print(f"\n--- Server Run Complete ---")
+    print(f"{len(streams)} streams, {frames_inferred} frames in {elapsed:.1f}s "
+          f"({frames_inferred / max(elapsed, 1e-9):.1f} FPS total, {frames_inferred / max(batches, 1):.1f} frames/batch)")
+    for stream in streams:
+        status = stream.status()
+        state = f"ERROR: {status['error']}" if status['error'] else f"{status['frames_counted']} frames"
+        print(f"  {status['name']}: {status['unique_sitting_count']} unique sitting ({state})")
+    print(f"Events saved to: {events_dir}")
+    print("-------------------------\n")
+    if metrics.active() is not None:
+        metrics.active().report(elapsed)
+
+
+if __name__ == "__main__":
+    main()
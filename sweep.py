@@ -0,0 +1,256 @@
+# sweep.py - Vectorized parameter sweep over cached keypoints
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from datetime import datetime
+import numpy as np
+import config as cfg
+import utils
+import tracking
+import keypoint_cache
+import zones
+from inference_backend import backend_model_name
+
+# Grid keys and the config.py setting each one overrides
+GRID_KEYS = utils.SETTING_KEYS
+
+# Upper bound on (configurations x people) booleans evaluated at once
+MAX_CELLS_PER_BLOCK = 8_000_000
+
+
+def assign_track_ids(cache, hips, tracked_mask, proximity):
+    """
+    Replays main_pipeline's tracker over the cache frame by frame.
+    Returns one track ID per cached person, -1 for people that are never tracked (masked).
+    """
+    track_ids = np.full(len(hips), -1, dtype=np.int64)
+    tracker = tracking.create_tracker(proximity)
+    frame_stride = int(cache.meta.get('frame_stride', 1))
+
+    for i in range(len(cache)):
+        start, end = cache.offsets[i], cache.offsets[i + 1]
+        people = start + np.flatnonzero(tracked_mask[start:end])
+        track_ids[people], _ = tracker.update(i * frame_stride, hips[people], cache.boxes[people])
+
+    return track_ids
+
+
+def observation_credits(frame_indices, track_starts, frame_stride):
+    """
+    Source frames each observation adds to its track's sitting time, as in an offline
+    counter.SittingCounter: one stride for a track's first observation, then the gap since
+    the track's previous observation, capped at frame_stride.
+    frame_indices are the observations' frame numbers, grouped by track as in max_sitting_runs.
+    """
+    credits = np.clip(np.diff(frame_indices, prepend=0), 1, frame_stride)
+    credits[track_starts] = frame_stride
+    return credits
+
+
+def max_sitting_runs(sitting, track_starts, credits):
+    """
+    Most source frames of sitting (summed observation credits) in one run of consecutive
+    sitting observations per track, for many configurations.
+
+    sitting is (configs, observations) with observations grouped by track (chronological
+    within each track); track_starts holds the first column of every track and credits
+    (observation_credits) the frames each observation covers.
+    Returns a (configs, tracks) array.
+    """
+    num_obs = sitting.shape[1]
+    positions = np.arange(num_obs)
+    is_start = np.zeros(num_obs, dtype=bool)
+    is_start[track_starts] = True
+
+    # A run restarts after every non-sitting observation and at every track start
+    breaks = np.where(~sitting, positions + 1, np.where(is_start, positions, 0))
+    last_break = np.maximum.accumulate(breaks, axis=1)
+    totals = np.concatenate([np.zeros((sitting.shape[0], 1), dtype=np.int64),
+                             np.cumsum(np.where(sitting, credits, 0), axis=1)], axis=1)
+    runs = np.where(sitting, totals[:, 1:] - np.take_along_axis(totals, last_break, axis=1), 0)
+
+    return np.maximum.reduceat(runs, track_starts, axis=1)
+
+
+def run_sweep(cache, grid):
+    """
+    Scores every combination of the grid over a keypoint cache.
+
+    Config-independent work (knee angles, mid-hip X) is done once. Tracking only depends on
+    the mask X and proximity, so it is replayed once per (mask, proximity) pair; posture,
+    bench and confirmation-frame settings are then evaluated for all combinations at once.
+    With cfg.ZONES_CONFIG set, the benches and exclusions are its polygon zones (as in the
+    pipeline) and the bench rectangle is not swept: its columns are left empty.
+    Returns a list of dicts, one per valid combination, with a 'unique_count' column.
+    """
+    xyn = np.asarray(cache.xyn)
+    zone_map = zones.configured_zone_map()
+    classification = utils.classify_keypoints_batch(xyn, zone_map=zone_map)
+    knee_angles = classification.knee_angles
+    mid_hips = utils.mid_hip_batch(xyn)
+    hips = xyn[:, [cfg.LEFT_HIP_IDX, cfg.RIGHT_HIP_IDX], :]
+
+    # Posture (K, P) and bench (B, P) masks for every candidate
+    knee_ranges = np.array([(lo, hi) for lo, hi in itertools.product(grid['min_knee_angle'], grid['max_knee_angle']) if lo <= hi], dtype=np.float64).reshape(-1, 2)
+    confirm_frames = np.array(sorted(grid['frames_to_confirm']), dtype=np.int64)
+    frame_stride = int(cache.meta.get('frame_stride', 1))
+    # Source frame of every cached person
+    person_frames = np.repeat(np.arange(len(cache), dtype=np.int64) * frame_stride, np.diff(cache.offsets))
+
+    posture = (
+        (knee_angles[None] >= knee_ranges[:, 0, None, None]) &
+        (knee_angles[None] <= knee_ranges[:, 1, None, None])
+    ).any(axis=-1)
+    if zone_map is None:
+        benches = np.array([rect for rect in itertools.product(grid['bench_x_min'], grid['bench_x_max'], grid['bench_y_min'], grid['bench_y_max'])
+                            if rect[0] <= rect[1] and rect[2] <= rect[3]], dtype=np.float64).reshape(-1, 4)
+        on_bench = (
+            (hips[None, ..., 0] >= benches[:, 0, None, None]) & (hips[None, ..., 0] <= benches[:, 1, None, None]) &
+            (hips[None, ..., 1] >= benches[:, 2, None, None]) & (hips[None, ..., 1] <= benches[:, 3, None, None])
+        ).all(axis=-1)
+        bench_columns = [dict(zip(utils.BENCH_KEYS, map(float, rect))) for rect in benches]
+        zone_excluded = np.zeros(len(mid_hips), dtype=bool)
+    else:
+        on_bench = classification.bench_mask[None]
+        bench_columns = [dict.fromkeys(utils.BENCH_KEYS)]
+        zone_excluded = zone_map.is_excluded(mid_hips)
+
+    # Every (knee range, bench) pair as one row
+    combos = list(itertools.product(range(len(knee_ranges)), range(len(bench_columns))))
+    rows = []
+
+    for mask_x, proximity in itertools.product(grid['mask_x_max'], grid['tracking_proximity']):
+        tracked = ~((mid_hips[:, 0] < mask_x) | zone_excluded)
+        track_ids = assign_track_ids(cache, mid_hips, tracked, proximity)
+
+        # Group observations by track, keeping them chronological inside each track
+        observed = np.flatnonzero(track_ids >= 0)
+        order = observed[np.argsort(track_ids[observed], kind='stable')]
+        sorted_tracks = track_ids[order]
+        track_starts = np.flatnonzero(np.r_[True, sorted_tracks[1:] != sorted_tracks[:-1]]) if len(order) else None
+        if track_starts is not None:
+            credits = observation_credits(person_frames[order], track_starts, frame_stride)
+
+        block_size = max(1, MAX_CELLS_PER_BLOCK // max(len(order), 1))
+        for block_start in range(0, len(combos), block_size):
+            block = combos[block_start:block_start + block_size]
+
+            if track_starts is None:
+                counts = np.zeros((len(block), len(confirm_frames)), dtype=np.int64)
+            else:
+                knee_idx = np.array([k for k, _ in block])
+                bench_idx = np.array([b for _, b in block])
+                sitting = posture[knee_idx][:, order] & on_bench[bench_idx][:, order]
+                runs = max_sitting_runs(sitting, track_starts, credits)
+                counts = (runs[:, :, None] >= confirm_frames[None, None, :]).sum(axis=1)
+
+            for (k, b), block_counts in zip(block, counts):
+                for frames, count in zip(confirm_frames, block_counts):
+                    rows.append({
+                        'min_knee_angle': float(knee_ranges[k, 0]),
+                        'max_knee_angle': float(knee_ranges[k, 1]),
+                        **bench_columns[b],
+                        'mask_x_max': float(mask_x),
+                        'tracking_proximity': float(proximity),
+                        'frames_to_confirm': int(frames),
+                        'unique_count': int(count),
+                    })
+
+    return rows
+
+
+def load_grid(path=None):
+    """
+    The sweep grid from a JSON file, falling back to cfg.SWEEP_GRID for missing keys.
+    With cfg.ZONES_CONFIG set, the bench rectangle is not swept, and a file sweeping it is
+    a ValueError.
+    """
+    grid = {key: list(values) for key, values in cfg.SWEEP_GRID.items()}
+    if path:
+        with open(path, encoding='utf-8') as f:
+            overrides = json.load(f)
+        bench_overrides = sorted(set(overrides) & set(utils.BENCH_KEYS))
+        if bench_overrides and cfg.ZONES_CONFIG:
+            raise ValueError(f"{path} sweeps the bench rectangle ({', '.join(bench_overrides)}), "
+                             f"which the polygon zones of ZONES_CONFIG replace")
+        grid.update(overrides)
+
+    missing = [key for key in GRID_KEYS if not grid.get(key)]
+    if missing:
+        raise ValueError(f"Sweep grid has no values for: {', '.join(missing)}")
+    return grid
+
+
+def load_ground_truth(path):
+    """Hand-labelled ground truth: a JSON file like {"unique_sitting_count": 7}."""
+    with open(path, encoding='utf-8') as f:
+        return int(json.load(f)['unique_sitting_count'])
+
+
+def write_rows(path, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a grid of config.py values over cached keypoints.")
+    parser.add_argument("--cache", default=None,
+                        help="Keypoint cache directory (defaults to the cache of cfg.VIDEO_SOURCE).")
+    parser.add_argument("--grid", default=None, help="JSON file overriding SWEEP_GRID values.")
+    parser.add_argument("--ground-truth", default=None,
+                        help='JSON file with the hand-labelled count, e.g. {"unique_sitting_count": 7}.')
+    parser.add_argument("--output", default=None, help="CSV file for all results.")
+    parser.add_argument("--top", type=int, default=10, help="Number of results to print.")
+    args = parser.parse_args()
+
+    cache_path = args.cache or keypoint_cache.cache_path_for(cfg.VIDEO_SOURCE, backend_model_name())
+    cache = keypoint_cache.open_cache(cache_path)
+    if cache is None:
+        print(f"Error: No complete keypoint cache at {cache_path}. Run main_pipeline.py --cache-keypoints first.")
+        sys.exit(1)
+
+    try:
+        grid = load_grid(args.grid)
+        zones.configured_zone_map()
+    except (OSError, ValueError) as exc:
+        print(f"Error: {exc}")
+        sys.exit(1)
+
+    start_time = time.perf_counter()
+    rows = run_sweep(cache, grid)
+    elapsed = time.perf_counter() - start_time
+
+    if not rows:
+        print("Error: The sweep grid has no valid combinations (check min <= max values).")
+        sys.exit(1)
+
+    if args.ground_truth:
+        truth = load_ground_truth(args.ground_truth)
+        for row in rows:
+            row['abs_error'] = abs(row['unique_count'] - truth)
+        rows.sort(key=lambda row: row['abs_error'])
+
+    output_path = args.output
+    if output_path is None:
+        os.makedirs(cfg.OUTPUT_DIR, exist_ok=True)
+        output_path = os.path.join(cfg.OUTPUT_DIR, datetime.now().strftime("sweep_%Y%m%d_%H%M%S.csv"))
+    write_rows(output_path, rows)
+
+    print(f"\n--- Sweep Complete ---")
+    print(f"Scored {len(rows)} configurations over {len(cache)} frames in {elapsed:.2f}s "
+          f"({len(rows) / max(elapsed, 1e-9):.0f} configs/s)")
+    print(f"Results saved to: {output_path}")
+    for row in rows[:args.top]:
+        print("  " + ", ".join(f"{key}={value}" for key, value in row.items()))
+    print("-------------------------\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+# tracking.py - Multi-object hip tracker with optimal assignment and stale-track eviction
+
+import numpy as np
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+# Cost used for detection/track pairs that are not allowed to match
+INVALID_COST = 1e6
+
+
+def load_tracker_settings(path):
+    """
+    Reads the ByteTrack-style settings the tracker uses from tracker_config.yaml:
+    track_buffer (frames a lost track is kept) and match_thresh (maximum matching cost).
+    """
+    import yaml
+
+    with open(path, encoding='utf-8') as f:
+        settings = yaml.safe_load(f) or {}
+    return {
+        'track_buffer': int(settings.get('track_buffer', 30)),
+        'match_thresh': float(settings.get('match_thresh', 0.8)),
+    }
+
+
+def create_tracker(proximity=None):
+    """
+    HipTracker configured from config.py and tracker_config.yaml (cfg.TRACKER_CONFIG,
+    relative to this directory unless absolute). config.py is only imported here so
+    main.py can use the tracker without the YOLO configuration.
+    """
+    import os
+    import config as cfg
+
+    config_path = cfg.TRACKER_CONFIG
+    if not os.path.isabs(config_path):
+        config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), config_path)
+
+    return HipTracker(
+        proximity=cfg.TRACKING_PROXIMITY_THRESHOLD if proximity is None else proximity,
+        hip_weight=cfg.TRACKING_HIP_WEIGHT,
+        **load_tracker_settings(config_path)
+    )
+
+
+def box_iou_matrix(boxes_a, boxes_b):
+    """Pairwise IoU of two sets of xyxy boxes, (A, 4) x (B, 4) -> (A, B). NaN boxes give NaN."""
+    boxes_a = np.asarray(boxes_a, dtype=np.float64)[:, None, :]
+    boxes_b = np.asarray(boxes_b, dtype=np.float64)[None, :, :]
+
+    inter_w = np.clip(np.minimum(boxes_a[..., 2], boxes_b[..., 2]) - np.maximum(boxes_a[..., 0], boxes_b[..., 0]), 0, None)
+    inter_h = np.clip(np.minimum(boxes_a[..., 3], boxes_b[..., 3]) - np.maximum(boxes_a[..., 1], boxes_b[..., 1]), 0, None)
+    intersection = inter_w * inter_h
+
+    area_a = (boxes_a[..., 2] - boxes_a[..., 0]) * (boxes_a[..., 3] - boxes_a[..., 1])
+    area_b = (boxes_b[..., 2] - boxes_b[..., 0]) * (boxes_b[..., 3] - boxes_b[..., 1])
+    union = area_a + area_b - intersection
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        iou = np.where(union > 0, intersection / union, 0.0)
+    return np.where(np.isnan(union), np.nan, iou)
+
+
+def _hungarian(cost):
+    """
+    Minimum-cost assignment for a (rows <= cols) matrix using the O(n^2 m) potentials
+    method. Used when scipy is not installed; tracking matrices are tiny.
+    """
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    owner = np.zeros(m + 1, dtype=np.int64)   # owner[j] = row assigned to column j (1-based, 0 = free)
+    way = np.zeros(m + 1, dtype=np.int64)
+
+    for i in range(1, n + 1):
+        owner[0] = i
+        j0 = 0
+        min_v = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = owner[j0]
+
+            free = ~used[1:]
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            improved = free & (reduced < min_v[1:])
+            min_v[1:][improved] = reduced[improved]
+            way[1:][improved] = j0
+
+            candidates = np.where(free, min_v[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+
+            used_cols = np.flatnonzero(used)
+            u[owner[used_cols]] += delta
+            v[used_cols] -= delta
+            min_v[1:][free] -= delta
+
+            j0 = j1
+            if owner[j0] == 0:
+                break
+
+        while j0:
+            j1 = way[j0]
+            owner[j0] = owner[j1]
+            j0 = j1
+
+    cols = np.flatnonzero(owner[1:])
+    rows = owner[1:][cols] - 1
+    order = np.argsort(rows)
+    return rows[order], cols[order]
+
+
+def solve_assignment(cost):
+    """Optimal (row, col) pairs of a rectangular cost matrix."""
+    cost = np.asarray(cost, dtype=np.float64)
+    if cost.size == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    if linear_sum_assignment is not None:
+        rows, cols = linear_sum_assignment(cost)
+        return rows.astype(np.int64), cols.astype(np.int64)
+
+    if cost.shape[0] > cost.shape[1]:
+        cols, rows = _hungarian(cost.T)
+        order = np.argsort(rows)
+        return rows[order], cols[order]
+    return _hungarian(cost)
+
+
+class HipTracker:
+    """
+    Tracks people by their mid-hip position (normalized) and bounding box.
+
+    Every update builds one (detections x tracks) cost matrix, mixing the hip distance to
+    each track's velocity-predicted position (scaled by 'proximity') with 1 - box IoU,
+    and solves it with optimal assignment. Pairs further apart than 'proximity' or
+    costlier than 'match_thresh' never match. Tracks unseen for more than 'track_buffer'
+    frames are evicted, so the per-frame cost depends on the people in view, not on how
+    long the video has been running.
+
+    State is kept in flat NumPy arrays (one row per live track).
+    """
+
+    def __init__(self, proximity=0.1, track_buffer=30, match_thresh=0.8, hip_weight=0.5, velocity_smoothing=0.5):
+        self.proximity = proximity
+        self.track_buffer = track_buffer
+        self.match_thresh = match_thresh
+        self.hip_weight = hip_weight
+        self.velocity_smoothing = velocity_smoothing
+
+        self.next_id = 0
+        self.ids = np.empty(0, dtype=np.int64)
+        self.positions = np.empty((0, 2))
+        self.velocities = np.empty((0, 2))
+        self.boxes = np.empty((0, 4))
+        self.last_seen = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _evict(self, frame_idx):
+        """Drops tracks unseen for more than track_buffer frames. Returns the evicted IDs."""
+        keep = (frame_idx - self.last_seen) <= self.track_buffer
+        evicted = self.ids[~keep].tolist()
+        if evicted:
+            self.ids = self.ids[keep]
+            self.positions = self.positions[keep]
+            self.velocities = self.velocities[keep]
+            self.boxes = self.boxes[keep]
+            self.last_seen = self.last_seen[keep]
+        return evicted
+
+    def cost_matrix(self, frame_idx, hips, boxes):
+        """(detections x tracks) matching cost, INVALID_COST where a pair is gated out."""
+        # Constant-velocity prediction to the current frame
+        elapsed = (frame_idx - self.last_seen)[:, None]
+        predicted = self.positions + self.velocities * elapsed
+
+        hip_cost = np.linalg.norm(hips[:, None, :] - predicted[None, :, :], axis=-1) / self.proximity
+        # No hip on either side: rely on the box overlap only
+        hip_cost = np.where(np.isnan(hip_cost), 1.0, hip_cost)
+
+        iou = box_iou_matrix(boxes, self.boxes)
+        has_boxes = ~np.isnan(iou)
+        cost = np.where(
+            has_boxes,
+            self.hip_weight * hip_cost + (1 - self.hip_weight) * (1 - np.nan_to_num(iou)),
+            hip_cost
+        )
+
+        gated = (hip_cost > 1.0) | (cost > self.match_thresh)
+        return np.where(gated, INVALID_COST, cost)
+
+    def update(self, frame_idx, hips, boxes=None):
+        """
+        Associates one frame of detections with the live tracks.
+
+        hips:  (N, 2) normalized mid-hip positions (NaN rows when both hips are missing)
+        boxes: (N, 4) xyxy boxes (NaN rows when missing), or None
+
+        Returns (track_ids, evicted_ids): one track ID per detection, in input order, and
+        the IDs of tracks dropped for being stale.
+        """
+        hips = np.asarray(hips, dtype=np.float64).reshape(-1, 2)
+        num_detections = len(hips)
+        if boxes is None:
+            boxes = np.full((num_detections, 4), np.nan)
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+
+        evicted = self._evict(frame_idx)
+        track_ids = np.full(num_detections, -1, dtype=np.int64)
+        if num_detections == 0:
+            return track_ids, evicted
+
+        # --- ASSOCIATION ---
+        matched_dets = np.empty(0, dtype=np.int64)
+        if len(self.ids):
+            cost = self.cost_matrix(frame_idx, hips, boxes)
+            rows, cols = solve_assignment(cost)
+            valid = cost[rows, cols] < INVALID_COST
+            matched_dets, matched_tracks = rows[valid], cols[valid]
+
+            # Update matched tracks (velocity from the observed hip displacement)
+            new_hips = hips[matched_dets]
+            has_hip = ~np.isnan(new_hips).any(axis=1)
+            elapsed = np.maximum(frame_idx - self.last_seen[matched_tracks], 1)[:, None]
+            observed_velocity = (new_hips - self.positions[matched_tracks]) / elapsed
+            observed_velocity = np.where(np.isnan(observed_velocity), 0.0, observed_velocity)
+
+            smoothed = (self.velocity_smoothing * self.velocities[matched_tracks] +
+                        (1 - self.velocity_smoothing) * observed_velocity)
+            self.velocities[matched_tracks] = np.where(has_hip[:, None], smoothed, self.velocities[matched_tracks])
+            self.positions[matched_tracks] = np.where(has_hip[:, None], new_hips, self.positions[matched_tracks])
+            self.boxes[matched_tracks] = np.where(np.isnan(boxes[matched_dets]), self.boxes[matched_tracks], boxes[matched_dets])
+            self.last_seen[matched_tracks] = frame_idx
+            track_ids[matched_dets] = self.ids[matched_tracks]
+
+        # --- NEW TRACKS FOR UNMATCHED DETECTIONS ---
+        unmatched = np.setdiff1d(np.arange(num_detections), matched_dets)
+        if len(unmatched):
+            new_ids = np.arange(self.next_id, self.next_id + len(unmatched), dtype=np.int64)
+            self.next_id += len(unmatched)
+
+            self.ids = np.concatenate([self.ids, new_ids])
+            self.positions = np.concatenate([self.positions, hips[unmatched]])
+            self.velocities = np.concatenate([self.velocities, np.zeros((len(unmatched), 2))])
+            self.boxes = np.concatenate([self.boxes, boxes[unmatched]])
+            self.last_seen = np.concatenate([self.last_seen, np.full(len(unmatched), frame_idx, dtype=np.int64)])
+            track_ids[unmatched] = new_ids
+
+        return track_ids, evicted
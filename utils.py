@@ -1,6 +1,45 @@
 import cv2
 import numpy as np
+from collections import namedtuple
+from types import SimpleNamespace
 import config as cfg
+import zones
+
+# Counting settings that can be overridden per stream or swept: key -> config.py name
+SETTING_KEYS = {
+    'min_knee_angle': 'MIN_KNEE_ANGLE_FOR_SITTING',
+    'max_knee_angle': 'MAX_KNEE_ANGLE_FOR_SITTING',
+    'bench_x_min': 'BENCH_X_MIN',
+    'bench_x_max': 'BENCH_X_MAX',
+    'bench_y_min': 'BENCH_Y_MIN',
+    'bench_y_max': 'BENCH_Y_MAX',
+    'mask_x_max': 'MONUMENT_MASK_X_MAX',
+    'tracking_proximity': 'TRACKING_PROXIMITY_THRESHOLD',
+    'frames_to_confirm': 'FRAMES_TO_CONFIRM_SITTING',
+}
+
+# Settings of the BENCH rectangle, which the polygon zones of cfg.ZONES_CONFIG replace
+BENCH_KEYS = ('bench_x_min', 'bench_x_max', 'bench_y_min', 'bench_y_max')
+
+
+def resolve_settings(overrides=None):
+    """
+    The SETTING_KEYS values of config.py as a namespace with config.py attribute names,
+    with 'overrides' (a dict by SETTING_KEYS key) applied on top. Bench overrides raise a
+    ValueError while cfg.ZONES_CONFIG is set, since its zones would silently replace them.
+    """
+    overrides = dict(overrides or {})
+    unknown = sorted(set(overrides) - set(SETTING_KEYS))
+    if unknown:
+        raise ValueError(f"Unknown settings: {', '.join(unknown)} (expected {', '.join(SETTING_KEYS)})")
+    bench_overrides = sorted(set(overrides) & set(BENCH_KEYS))
+    if bench_overrides and cfg.ZONES_CONFIG:
+        raise ValueError(f"Bench settings ({', '.join(bench_overrides)}) cannot be overridden while ZONES_CONFIG "
+                         f"is set; its polygon zones replace the bench rectangle")
+    return SimpleNamespace(**{
+        name: overrides.get(key, getattr(cfg, name)) for key, name in SETTING_KEYS.items()
+    })
+
 
 def calculate_angle(p1, p2, p3):
     """
@@ -121,34 +160,235 @@ def is_sitting_heuristic(kpts_normalized, frame_height):
         return False
 
 
+# Per-frame detections as NumPy arrays, one row per person:
+# xy (N, 17, 2) pixels, xyn (N, 17, 2) normalized, conf (N, 17), boxes (N, 4) xyxy pixels (NaN if missing)
+FrameDetections = namedtuple('FrameDetections', ['xy', 'xyn', 'conf', 'boxes'])
+
+
+def empty_detections(num_keypoints=17):
+    """FrameDetections for a frame without any person."""
+    return FrameDetections(
+        np.zeros((0, num_keypoints, 2), dtype=np.float32),
+        np.zeros((0, num_keypoints, 2), dtype=np.float32),
+        np.zeros((0, num_keypoints), dtype=np.float32),
+        np.zeros((0, 4), dtype=np.float32)
+    )
+
+
+def extract_detections(results):
+    """
+    Moves the keypoints and boxes of one frame's YOLO results to NumPy (the .cpu().numpy()
+    transfer) and stacks them into a single FrameDetections.
+    """
+    xy, xyn, conf, boxes = [], [], [], []
+    for result in results:
+        if result.keypoints is None:
+            continue
+
+        kpts_xy = result.keypoints.xy.cpu().numpy()
+        # Empty results can come back as (1, 0, 2); skip them like a missing detection
+        if kpts_xy.ndim != 3 or kpts_xy.shape[1] == 0:
+            continue
+        num_people = len(kpts_xy)
+
+        xy.append(kpts_xy)
+        xyn.append(result.keypoints.xyn.cpu().numpy())
+
+        if result.keypoints.conf is not None:
+            conf.append(result.keypoints.conf.cpu().numpy())
+        else:
+            conf.append(np.ones(kpts_xy.shape[:2], dtype=np.float32))
+
+        person_boxes = np.full((num_people, 4), np.nan, dtype=np.float32)
+        if result.boxes is not None:
+            boxes_xyxy = result.boxes.xyxy.cpu().numpy()[:num_people]
+            person_boxes[:len(boxes_xyxy)] = boxes_xyxy
+        boxes.append(person_boxes)
+
+    if not xy:
+        return empty_detections()
+
+    return FrameDetections(
+        np.concatenate(xy).astype(np.float32, copy=False),
+        np.concatenate(xyn).astype(np.float32, copy=False),
+        np.concatenate(conf).astype(np.float32, copy=False),
+        np.concatenate(boxes)
+    )
+
+
+def calculate_angles_batch(p1, p2, p3):
+    """
+    Vectorized version of calculate_angle for arrays of points with shape (..., 2).
+    Returns an array of shape (...) with 180 degrees wherever the scalar version would
+    (missing (0, 0) points or zero-length limb vectors).
+    """
+    p1 = np.asarray(p1)
+    p2 = np.asarray(p2)
+    p3 = np.asarray(p3)
+
+    # Same missing-point rule as calculate_angle: a point whose coordinates sum to 0
+    missing = (p1.sum(axis=-1) == 0) | (p2.sum(axis=-1) == 0) | (p3.sum(axis=-1) == 0)
+
+    v1 = p1 - p2
+    v2 = p3 - p2
+
+    dot_product = np.einsum('...i,...i->...', v1, v2)
+    mag_v1 = np.linalg.norm(v1, axis=-1)
+    mag_v2 = np.linalg.norm(v2, axis=-1)
+
+    invalid = missing | (mag_v1 == 0) | (mag_v2 == 0)
+
+    # Use a dummy denominator on invalid entries; they are overwritten with 180 below
+    denominator = np.where(invalid, 1, mag_v1 * mag_v2)
+    cos_angle = np.clip(dot_product / denominator, -1.0, 1.0)
+
+    angle_deg = np.degrees(np.arccos(cos_angle))
+    return np.where(invalid, 180, angle_deg)
+
+
+def mid_hip_batch(kpts_normalized):
+    """
+    Vectorized mid-hip (x, y) used for masking and tracking: the mean of both hips, or
+    whichever hip is present (x > 0, as in is_inside_mask). NaN when both hips are missing,
+    so every '<' comparison on it is False.
+    """
+    kpts = np.asarray(kpts_normalized)
+    l_hip = kpts[..., cfg.LEFT_HIP_IDX, :]
+    r_hip = kpts[..., cfg.RIGHT_HIP_IDX, :]
+    l_present = (l_hip[..., 0] > 0)[..., None]
+    r_present = (r_hip[..., 0] > 0)[..., None]
+
+    return np.where(
+        l_present & r_present, (l_hip + r_hip) / 2,
+        np.where(l_present, l_hip, np.where(r_present, r_hip, np.nan))
+    )
+
+
+BatchClassification = namedtuple(
+    'BatchClassification',
+    ['knee_angles', 'posture_mask', 'bench_mask', 'exclusion_mask', 'sitting_mask', 'zone_ids']
+)
+
+
+def classify_keypoints_batch(kpts_normalized, settings=None, zone_map=None):
+    """
+    Vectorized is_sitting_heuristic / is_inside_mask for every person at once.
+
+    kpts_normalized is a (..., 17, 2) array of normalized (x, y) keypoints, e.g.
+    result.keypoints.xyn for one frame (N, 17, 2) or several stacked frames (F, N, 17, 2).
+    settings (e.g. from resolve_settings) replaces the config.py thresholds and zones.
+    With a zones.ZoneMap (default: the one of cfg.ZONES_CONFIG, if set) the benches and
+    exclusions are its polygon zones instead of the BENCH rectangle; MONUMENT_MASK_X_MAX
+    still applies.
+
+    Returns a BatchClassification with:
+      - knee_angles:    (..., 2) left/right knee angles in degrees
+      - posture_mask:   (...) either knee angle inside the sitting range
+      - bench_mask:     (...) both hips inside the BENCH rectangle (or one include zone)
+      - exclusion_mask: (...) mid-hip inside the monument exclusion zone (or an exclude zone)
+      - sitting_mask:   (...) posture_mask AND bench_mask (same as is_sitting_heuristic)
+      - zone_ids:       (...) index of that bench in zones.zone_names(), zones.NO_ZONE when off-bench
+    """
+    settings = settings or cfg
+    zone_map = zone_map or zones.configured_zone_map()
+    kpts = np.asarray(kpts_normalized)
+    if not np.issubdtype(kpts.dtype, np.floating):
+        kpts = kpts.astype(np.float64)
+
+    batch_shape = kpts.shape[:-2]
+
+    # Not enough keypoints (e.g. an empty result): the scalar code returns False on IndexError
+    if kpts.ndim < 2 or kpts.shape[-2] <= cfg.RIGHT_ANKLE_IDX:
+        empty = np.zeros(batch_shape, dtype=bool)
+        return BatchClassification(
+            np.full(batch_shape + (2,), 180.0), empty, empty.copy(), empty.copy(), empty.copy(),
+            np.full(batch_shape, zones.NO_ZONE, dtype=np.int16)
+        )
+
+    l_hip = kpts[..., cfg.LEFT_HIP_IDX, :]
+    r_hip = kpts[..., cfg.RIGHT_HIP_IDX, :]
+
+    # --- 1. POSTURE CHECK (Knee Angle) ---
+    l_angle = calculate_angles_batch(l_hip, kpts[..., cfg.LEFT_KNEE_IDX, :], kpts[..., cfg.LEFT_ANKLE_IDX, :])
+    r_angle = calculate_angles_batch(r_hip, kpts[..., cfg.RIGHT_KNEE_IDX, :], kpts[..., cfg.RIGHT_ANKLE_IDX, :])
+    knee_angles = np.stack([l_angle, r_angle], axis=-1)
+
+    in_range = (knee_angles >= settings.MIN_KNEE_ANGLE_FOR_SITTING) & (knee_angles <= settings.MAX_KNEE_ANGLE_FOR_SITTING)
+    posture_mask = in_range.any(axis=-1)
+
+    # --- 2. SPATIAL CHECK (Both Hips on Bench Location) ---
+    hips = np.stack([l_hip, r_hip], axis=-2)
+    if zone_map is None:
+        hips_on_bench = (
+            (hips[..., 0] >= settings.BENCH_X_MIN) & (hips[..., 0] <= settings.BENCH_X_MAX) &
+            (hips[..., 1] >= settings.BENCH_Y_MIN) & (hips[..., 1] <= settings.BENCH_Y_MAX)
+        )
+        bench_mask = hips_on_bench.all(axis=-1)
+        zone_ids = np.where(bench_mask, 0, zones.NO_ZONE).astype(np.int16)
+    else:
+        # Both hips in the same include zone, mapped with one raster lookup for all hips
+        hip_zones = zone_map.lookup(hips)
+        bench_mask = (hip_zones[..., 0] == hip_zones[..., 1]) & (hip_zones[..., 0] != zones.NO_ZONE)
+        zone_ids = np.where(bench_mask, hip_zones[..., 0], zones.NO_ZONE).astype(np.int16)
+
+    # --- 3. EXCLUSION MASK (Mid-Hip X, NaN when both hips are missing) ---
+    mid_hips = mid_hip_batch(kpts)
+    exclusion_mask = mid_hips[..., 0] < settings.MONUMENT_MASK_X_MAX
+    if zone_map is not None:
+        exclusion_mask |= zone_map.is_excluded(mid_hips)
+
+    return BatchClassification(
+        knee_angles, posture_mask, bench_mask, exclusion_mask, posture_mask & bench_mask, zone_ids
+    )
+
+
+# COCO 17-keypoint skeleton
+SKELETON = np.array([
+    (0, 1), (0, 2), (1, 3), (2, 4), (5, 6), (5, 7), (7, 9), (6, 8), (8, 10),
+    (5, 11), (6, 12), (11, 12), (11, 13), (13, 15), (12, 14), (14, 16)
+])
+
+# Keypoint colours (fixed for visibility): joints of the sitting heuristic are highlighted
+_HIP_KEYPOINTS = np.array([cfg.LEFT_HIP_IDX, cfg.RIGHT_HIP_IDX])
+_LEG_KEYPOINTS = np.array([cfg.LEFT_KNEE_IDX, cfg.RIGHT_KNEE_IDX, cfg.LEFT_ANKLE_IDX, cfg.RIGHT_ANKLE_IDX])
+KEYPOINT_COLORS = (
+    ((0, 0, 255), np.setdiff1d(np.arange(17), np.concatenate([_HIP_KEYPOINTS, _LEG_KEYPOINTS]))),
+    ((0, 255, 255), _HIP_KEYPOINTS),    # Yellow for Hips
+    ((255, 0, 0), _LEG_KEYPOINTS),      # Leg Joints
+)
+
+
+def draw_skeletons(image, keypoints_xy, colors, thickness=3, radius=5):
+    """
+    Draws the skeletons and keypoints of all people of a frame in place, with one
+    cv2.polylines call per bone colour and per keypoint colour (instead of a cv2.line /
+    cv2.circle call per bone and keypoint). colors holds one bone colour per person.
+    Keypoints at (0, 0) are missing; bones touching them are not drawn.
+    """
+    if len(keypoints_xy) == 0:
+        return image
+    pts = np.asarray(keypoints_xy, dtype=np.float64).reshape(len(keypoints_xy), -1, 2).astype(np.int32)
+    present = pts.any(axis=-1)                      # not (0, 0): the bone rule
+    visible = (pts != 0).all(axis=-1)               # x != 0 and y != 0: the keypoint rule
+
+    groups = {}
+    for i, color in enumerate(colors):
+        groups.setdefault(tuple(color), []).append(i)
+    for color, rows in groups.items():
+        bones = pts[rows][:, SKELETON]              # (people, bones, 2 ends, xy)
+        bones = bones[present[rows][:, SKELETON].all(axis=-1)]
+        if len(bones):
+            cv2.polylines(image, bones, False, color, thickness)
+
+    # A zero-length line of thickness 2r covers exactly the pixels of a filled circle of radius r
+    for color, indexes in KEYPOINT_COLORS:
+        points = pts[:, indexes][visible[:, indexes]]
+        if len(points):
+            cv2.polylines(image, np.repeat(points[:, None], 2, axis=1), False, color, 2 * radius)
+
+    return image
+
+
 def draw_pose(image, keypoints_xy, color=(255, 0, 0), thickness=3):
     """Draws skeleton and keypoints on the image from YOLO keypoints (x, y)."""
-    # COCO 17-keypoint skeleton 
-    skeleton = [
-        (0, 1), (0, 2), (1, 3), (2, 4), (5, 6), (5, 7), (7, 9), (6, 8), (8, 10),
-        (5, 11), (6, 12), (11, 12), (11, 13), (13, 15), (12, 14), (14, 16)
-    ]
-    
-    # Draw logic is simplified for clean separation
-    for kpts in keypoints_xy:
-        # Draw skeleton lines
-        for (start, end) in skeleton:
-            start_pt = (int(kpts[start][0]), int(kpts[start][1]))
-            end_pt = (int(kpts[end][0]), int(kpts[end][1]))
-            if start_pt != (0, 0) and end_pt != (0, 0):
-                cv2.line(image, start_pt, end_pt, color, thickness)
-        
-        # Draw keypoints (Red circles, fixed color for visibility)
-        for i, (x, y) in enumerate(kpts):
-            if x != 0 and y != 0:
-                point_color = (0, 0, 255) # Blue for all points
-                
-                # Highlight key points used in the sitting heuristic
-                if i in [cfg.LEFT_HIP_IDX, cfg.RIGHT_HIP_IDX]:
-                    point_color = (0, 255, 255) # Yellow for Hips
-                elif i in [cfg.LEFT_KNEE_IDX, cfg.RIGHT_KNEE_IDX, cfg.LEFT_ANKLE_IDX, cfg.RIGHT_ANKLE_IDX]:
-                    point_color = (255, 0, 0) # Red for Leg Joints
-                    
-                cv2.circle(image, (int(x), int(y)), 5, point_color, -1)
-    
-    return image
+    return draw_skeletons(image, keypoints_xy, [color] * len(keypoints_xy), thickness)
@@ -0,0 +1,164 @@
+# worker.py - Warm worker: one loaded pose model counting a stream of video jobs (stdin or a local socket)
+
+import time
+
+# Worker startup (imports, model load, warm-up) is measured from here
+_STARTED_AT = time.perf_counter()
+
+import argparse
+import contextlib
+import json
+import os
+import socketserver
+import sys
+from datetime import datetime
+import config as cfg
+from batch_runner import SUMMARY_FIELDS, count_video
+from inference_backend import create_backend
+
+# analyze_video_for_sitting arguments a job may set; everything else is fixed by the worker
+JOB_OPTIONS = ('pipelined', 'stride', 'decode_width', 'decoder', 'roi_crop', 'motion_gate', 'camera', 'recorded_at')
+
+
+class WarmWorker:
+    """
+    One pose model, loaded and warmed up once, that counts videos one job at a time in
+    --no-render mode. A job is a line of text: either a video path, or a JSON object
+      {"video": "a.mp4", "events": "a.jsonl", "options": {"stride": 2}}
+    where 'events' (default <events_dir>/<job number>_<video name>) and 'options'
+    (JOB_OPTIONS) are optional. Every job gets one result: a batch_runner summary row plus
+    the job number, with the time to its first counted frame. With store_path, every video
+    is also added to that event store ('camera' and 'recorded_at', in unix seconds, are job
+    options).
+    """
+
+    def __init__(self, backend=None, events_dir=None, store_path=None):
+        self.events_dir = events_dir or os.path.join(cfg.OUTPUT_DIR, datetime.now().strftime("worker_%Y%m%d_%H%M%S"))
+        self.store_path = store_path
+        self.jobs = 0
+
+        load_start = time.perf_counter()
+        self.pose_model = create_backend(backend)
+        self.model_load_seconds = time.perf_counter() - load_start
+
+        width, height = cfg.WORKER_WARMUP_FRAME_SIZE
+        warmup_start = time.perf_counter()
+        self.pose_model.warmup((height, width, 3), cfg.INFERENCE_BATCH_SIZE)
+        self.warmup_seconds = time.perf_counter() - warmup_start
+        self.startup_seconds = time.perf_counter() - _STARTED_AT
+
+    def run_job(self, line):
+        """Parses and counts one job line. Never raises: failures are returned as the result row."""
+        self.jobs += 1
+        try:
+            job = json.loads(line) if line.startswith('{') else {'video': line}
+            video = job['video']
+            options = job.get('options') or {}
+            unknown = sorted(set(options) - set(JOB_OPTIONS))
+            if unknown:
+                raise ValueError(f"unknown options {', '.join(unknown)} (allowed: {', '.join(JOB_OPTIONS)})")
+            if self.store_path:
+                options = dict(options, store_path=self.store_path)
+        except (ValueError, KeyError, TypeError, AttributeError) as exc:
+            return {'job': self.jobs, 'video': line, 'status': 'failed', 'error': f"Invalid job: {exc}"}
+
+        events_path = job.get('events') or os.path.join(
+            self.events_dir, f"{self.jobs:06d}_{os.path.splitext(os.path.basename(video))[0]}.{cfg.EVENTS_FORMAT}")
+        return dict(count_video(video, events_path, self.pose_model, **options), job=self.jobs)
+
+    def report_ready(self, where):
+        print(f"Worker ready in {self.startup_seconds:.2f}s (model load {self.model_load_seconds:.2f}s, "
+              f"warm-up {self.warmup_seconds:.2f}s); taking jobs from {where}", file=sys.stderr, flush=True)
+
+
+def _job_lines(lines):
+    """Non-empty, non-comment lines of a job stream."""
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+
+def _format_result(row):
+    return json.dumps({key: row[key] for key in ['job'] + SUMMARY_FIELDS if key in row}, separators=(',', ':'))
+
+
+def serve_stdin(worker):
+    """Jobs from stdin, one result line per job on stdout; the pipeline's own output goes to stderr."""
+    worker.report_ready('stdin')
+    for line in _job_lines(sys.stdin):
+        with contextlib.redirect_stdout(sys.stderr):
+            row = worker.run_job(line)
+        print(_format_result(row), flush=True)
+
+
+def serve_socket(worker, socket_path=None, port=None):
+    """
+    Jobs from a Unix socket (socket_path) or a localhost TCP port. Every connection sends
+    job lines and reads one result line per job; connections are served one at a time.
+    """
+    class JobHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in _job_lines(raw.decode('utf-8') for raw in self.rfile):
+                row = worker.run_job(line)
+                self.wfile.write((_format_result(row) + '\n').encode('utf-8'))
+                self.wfile.flush()
+
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = socketserver.UnixStreamServer(socket_path, JobHandler)
+        where = socket_path
+    else:
+        server = socketserver.TCPServer(('127.0.0.1', port), JobHandler)
+        where = f"127.0.0.1:{server.server_address[1]}"
+
+    worker.report_ready(where)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep one pose model loaded and count a stream of video jobs.")
+    parser.add_argument("--socket", default=None,
+                        help="Unix socket to take jobs on (defaults to WORKER_SOCKET; without socket or port, jobs are read from stdin).")
+    parser.add_argument("--port", type=int, default=None, help="Localhost TCP port to take jobs on (defaults to WORKER_PORT).")
+    parser.add_argument("--events-dir", default=None,
+                        help="Directory of the event logs of jobs without 'events' (defaults to OUTPUT_DIR/worker_<timestamp>).")
+    parser.add_argument("--backend", choices=['torch', 'onnx', 'cascade'], default=None,
+                        help="Pose inference backend (defaults to INFERENCE_BACKEND).")
+    parser.add_argument("--store", nargs='?', const=cfg.EVENT_STORE_PATH, default=None,
+                        help="Also add every video to this SQLite event store (defaults to EVENT_STORE_PATH "
+                             "when given without a path).")
+    args = parser.parse_args()
+
+    socket_path = args.socket or cfg.WORKER_SOCKET
+    port = cfg.WORKER_PORT if args.port is None else args.port
+    if socket_path and not hasattr(socketserver, 'UnixStreamServer'):
+        print("Error: Unix sockets are not available on this platform, use --port.")
+        sys.exit(1)
+
+    serve_sockets = bool(socket_path) or port is not None
+    try:
+        # In stdin mode stdout only carries results
+        with contextlib.redirect_stdout(sys.stdout if serve_sockets else sys.stderr):
+            worker = WarmWorker(args.backend, args.events_dir, args.store)
+    except Exception as exc:
+        print(f"Error: Model could not be loaded: {type(exc).__name__}: {exc}")
+        sys.exit(1)
+
+    if serve_sockets:
+        serve_socket(worker, socket_path, port)
+    else:
+        serve_stdin(worker)
+    print(f"Worker stopped after {worker.jobs} jobs.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# zones.py - Named polygon zones (benches and exclusions) compiled into a label raster for vectorized lookups
+
+import os
+from collections import namedtuple
+import cv2
+import numpy as np
+import config as cfg
+
+# Zone index of points outside every include zone (and of missing points)
+NO_ZONE = -1
+
+# Zone kinds: people with both hips in one 'include' zone are on that bench; people whose
+# mid-hip is in an 'exclude' zone are masked out (like MONUMENT_MASK_X_MAX)
+ZONE_KINDS = ('include', 'exclude')
+
+# One zone of the zones file; polygon is a (P, 2) array of normalized (x, y) vertices
+Zone = namedtuple('Zone', ['name', 'kind', 'polygon'])
+
+# Fractional bits of the polygon vertices handed to cv2.fillPoly
+_FILL_SHIFT = 4
+
+# Compiled map of cfg.ZONES_CONFIG, loaded on first use
+_configured = None
+
+
+def load_zones(path):
+    """
+    Reads a zones YAML file (see zones.yaml):
+      zones:
+        - {name: bench_a, type: include, polygon: [[x, y], [x, y], [x, y], ...]}
+    Raises ValueError on an invalid file.
+    """
+    import yaml
+
+    with open(path, encoding='utf-8') as f:
+        data = yaml.safe_load(f) or {}
+
+    zones = []
+    for i, entry in enumerate(data.get('zones') or []):
+        name = str(entry.get('name') or f"zone_{i}")
+        kind = entry.get('type', 'include')
+        if kind not in ZONE_KINDS:
+            raise ValueError(f"Zone '{name}': unknown type '{kind}' (expected {' or '.join(ZONE_KINDS)})")
+        polygon = np.asarray(entry.get('polygon') or [], dtype=np.float64)
+        if polygon.ndim != 2 or polygon.shape[1] != 2 or len(polygon) < 3:
+            raise ValueError(f"Zone '{name}': polygon needs at least 3 [x, y] points")
+        if (polygon < 0).any() or (polygon > 1).any():
+            raise ValueError(f"Zone '{name}': polygon points must be normalized (0.0 to 1.0)")
+        zones.append(Zone(name, kind, polygon))
+
+    if any(zone.name == other.name for i, zone in enumerate(zones) for other in zones[i + 1:]):
+        raise ValueError(f"Zone names in {path} must be unique")
+    if not any(zone.kind == 'include' for zone in zones):
+        raise ValueError(f"{path} has no include zone")
+    return zones
+
+
+class ZoneMap:
+    """
+    Zones compiled once into a grid_size x grid_size raster over the normalized frame
+    (default cfg.ZONE_GRID_SIZE): every cell holds the index of the include zone covering it
+    (NO_ZONE for none; the earlier zone of the file wins where zones overlap) and whether an
+    exclude zone covers it. Mapping any number of points to zones is then a single index
+    lookup, however many zones there are.
+
+    'names' lists the include zones in index order; exclude zones are only masks.
+    """
+
+    def __init__(self, zones, grid_size=None):
+        self.grid_size = int(grid_size or cfg.ZONE_GRID_SIZE)
+        self.zones = list(zones)
+        includes = [zone for zone in self.zones if zone.kind == 'include']
+        self.names = [zone.name for zone in includes]
+
+        self.labels = np.full((self.grid_size, self.grid_size), NO_ZONE, dtype=np.int16)
+        self.excluded = np.zeros((self.grid_size, self.grid_size), dtype=np.uint8)
+        for index in reversed(range(len(includes))):
+            cv2.fillPoly(self.labels, [self._grid_polygon(includes[index])], index, shift=_FILL_SHIFT)
+        for zone in self.zones:
+            if zone.kind == 'exclude':
+                cv2.fillPoly(self.excluded, [self._grid_polygon(zone)], 1, shift=_FILL_SHIFT)
+        self.excluded = self.excluded.astype(bool)
+
+    def _grid_polygon(self, zone):
+        # Cell c covers [c, c + 1) in grid units, while OpenCV puts pixel c's centre at c
+        return np.round((zone.polygon * self.grid_size - 0.5) * (1 << _FILL_SHIFT)).astype(np.int32)
+
+    def _cells(self, points):
+        """Grid cell (row, col) of (..., 2) normalized points, and which points are present."""
+        points = np.asarray(points, dtype=np.float64)
+        x, y = points[..., 0], points[..., 1]
+        # Missing keypoints are (0, 0) or NaN (x > 0 is the presence check used everywhere)
+        present = (x > 0) & np.isfinite(y)
+        cols = np.clip(np.nan_to_num(x * self.grid_size), 0, self.grid_size - 1).astype(np.intp)
+        rows = np.clip(np.nan_to_num(y * self.grid_size), 0, self.grid_size - 1).astype(np.intp)
+        return rows, cols, present
+
+    def lookup(self, points):
+        """Include zone index of every (..., 2) normalized point (NO_ZONE outside / missing)."""
+        rows, cols, present = self._cells(points)
+        return np.where(present, self.labels[rows, cols], NO_ZONE)
+
+    def is_excluded(self, points):
+        """Whether each (..., 2) normalized point lies in an exclude zone."""
+        rows, cols, present = self._cells(points)
+        return present & self.excluded[rows, cols]
+
+    def include_bounds(self):
+        """Normalized (x_min, y_min, x_max, y_max) around all include zones."""
+        vertices = np.concatenate([zone.polygon for zone in self.zones if zone.kind == 'include'])
+        return (*vertices.min(axis=0), *vertices.max(axis=0))
+
+
+def configured_zone_map():
+    """ZoneMap of cfg.ZONES_CONFIG (relative to this directory unless absolute), or None when unset."""
+    global _configured
+    if not cfg.ZONES_CONFIG:
+        return None
+    path = cfg.ZONES_CONFIG
+    if not os.path.isabs(path):
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+    if _configured is None or _configured[0] != (path, cfg.ZONE_GRID_SIZE):
+        _configured = ((path, cfg.ZONE_GRID_SIZE), ZoneMap(load_zones(path)))
+    return _configured[1]
+
+
+def bench_bounds():
+    """Normalized (x_min, y_min, x_max, y_max) of the benches: all include zones, or the BENCH rectangle."""
+    zone_map = configured_zone_map()
+    if zone_map is not None:
+        return zone_map.include_bounds()
+    return cfg.BENCH_X_MIN, cfg.BENCH_Y_MIN, cfg.BENCH_X_MAX, cfg.BENCH_Y_MAX
+
+
+def zone_names(zone_map=None):
+    """Names of the zone indexes reported by classification: the include zones, or the single BENCH rectangle."""
+    zone_map = zone_map or configured_zone_map()
+    return zone_map.names if zone_map is not None else ['bench']